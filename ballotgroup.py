@@ -0,0 +1,254 @@
+import math
+from array import array
+
+class BallotGroup():
+    """
+    A BallotGroup contains Voters who cast identical valid votes, meaning they gave valid rankings
+    to the same Entries in the same order.
+    Contests count a BallotGroup once, weighted by its number of Voters, rather than counting each of
+    its Voters separately. The Voters themselves are kept so their names and rankings can still be
+    written to spreadsheets.
+    """
+
+
+    def __init__(self, ballot, voters, voter_indexes=None):
+        # the Entries that the BallotGroup's Voters gave valid rankings to, sorted from favorite to
+        # least favorite
+        self.ballot = ballot
+        # a list of Voters, or a BallotMatrixVoters if the Contest was populated from a BallotMatrix
+        self.voters = voters
+        # if self.voters is a list, then self.voter_indexes[i] contains the index of self.voters[i]
+        # in the Contest's voters (or this is None if that isn't known), so spreadsheets can list
+        # Voters from different BallotGroups in their original order (see get_snapshot_voters);
+        # a BallotMatrixVoters knows its Voters' ballot numbers instead
+        self.voter_indexes = voter_indexes
+
+        # self._rankings_by_entry[e] contains the position (indexed from 1) of Entry e in the
+        # ballot. Since only the order of a ballot matters when counting, these positions stand in
+        # for the Voters' actual rankings.
+        self._rankings_by_entry = {entry: i + 1 for i, entry in enumerate(ballot)}
+
+        # the index in self.ballot of the next Entry that __next__ should consider
+        self._next_ballot_index = 0
+
+        # the round when the BallotGroup was last allocated to a new Entry
+        self.round_when_last_moved = 0
+        # a tuple of (round, source) pairs, one for every time the BallotGroup was allocated to a
+        # new Entry (most recent first), where source numbers the Entries that BallotGroups were
+        # moved away from in that round; sorting by it lists Voters in the order they arrived at
+        # their current Entry (see get_snapshot_voters)
+        self.arrival_key = ()
+
+        # the fraction of each of its Voters' votes that the BallotGroup carries, which is less than
+        # 1 once part of the BallotGroup has been transferred away as a winner's surplus (see
+        # split_transfer_value)
+        self.transfer_value = 1
+
+
+    @property
+    def weight(self):
+        """
+        The number of Voters in the BallotGroup.
+        """
+
+        return len(self.voters)
+
+
+    @property
+    def num_votes(self):
+        """
+        The number of votes the BallotGroup carries: its weight, scaled by its transfer value.
+        """
+
+        return self.weight * self.transfer_value
+
+
+    @property
+    def cast_valid_vote(self):
+        """
+        True if the BallotGroup's Voters cast at least one valid vote and False otherwise.
+        """
+
+        return bool(self.ballot)
+
+
+    def split(self, voter_indexes):
+        """
+        Remove the Voters at the given indexes of self.voters from the BallotGroup, and return a
+        new BallotGroup containing them. The new BallotGroup picks up where this one left off: it has
+        the same ballot, the same round_when_last_moved, the same transfer_value, and the same next
+        favorite Entry.
+        """
+
+        voter_indexes = set(voter_indexes)
+        remaining_voter_indexes = [i for i in range(len(self.voters)) if i not in voter_indexes]
+
+        split_group = BallotGroup(
+            self.ballot,
+            _select_voters(self.voters, sorted(voter_indexes)),
+            _select_voter_indexes(self.voter_indexes, sorted(voter_indexes))
+        )
+        split_group._rankings_by_entry = self._rankings_by_entry
+        split_group._next_ballot_index = self._next_ballot_index
+        split_group.round_when_last_moved = self.round_when_last_moved
+        split_group.arrival_key = self.arrival_key
+        split_group.transfer_value = self.transfer_value
+
+        self.voters = _select_voters(self.voters, remaining_voter_indexes)
+        self.voter_indexes = _select_voter_indexes(self.voter_indexes, remaining_voter_indexes)
+
+        return split_group
+
+
+    def split_transfer_value(self, fraction):
+        """
+        Split the given fraction of the BallotGroup's transfer value off into a new BallotGroup with
+        the same Voters, and return the new BallotGroup. Like split, the new BallotGroup picks up
+        where this one left off.
+        """
+
+        split_group = BallotGroup(self.ballot, self.voters, self.voter_indexes)
+        split_group._rankings_by_entry = self._rankings_by_entry
+        split_group._next_ballot_index = self._next_ballot_index
+        split_group.round_when_last_moved = self.round_when_last_moved
+        split_group.arrival_key = self.arrival_key
+        split_group.transfer_value = self.transfer_value * fraction
+
+        self.transfer_value -= split_group.transfer_value
+
+        return split_group
+
+
+    def get_ranking_of_entry(self, entry):
+        """
+        Return the position of the given Entry in the BallotGroup's ballot (indexed from 1), or
+        math.inf if it isn't on the ballot.
+        """
+
+        return self._rankings_by_entry.get(entry, math.inf)
+
+
+    def __iter__(self):
+        """
+        Iterator over the Entries still in the running on the BallotGroup's ballot, sorted from
+        favorite to least favorite.
+        """
+
+        self._next_ballot_index = 0
+        return self
+
+
+    def __next__(self):
+        """
+        Return the BallotGroup's next favorite Entry that's still in the race, or None if none
+        remain.
+        """
+
+        while self._next_ballot_index < len(self.ballot):
+            next_favorite_entry = self.ballot[self._next_ballot_index]
+            self._next_ballot_index += 1
+
+            if next_favorite_entry.still_in_race:
+                return next_favorite_entry
+
+        return None
+
+
+def _select_voters(voters, voter_indexes):
+    """
+    Return a sequence of the Voters at the given (sorted) indexes of voters, which is either a list
+    or a BallotMatrixVoters.
+    """
+
+    if isinstance(voters, list):
+        return [voters[i] for i in voter_indexes]
+
+    return voters.select(voter_indexes)
+
+
+def _select_voter_indexes(voter_indexes, indexes):
+    """
+    Return an array of the elements at the given (sorted) indexes of the given BallotGroup's
+    voter_indexes, or None if it's None.
+    """
+
+    if voter_indexes is None:
+        return None
+
+    return array("I", (voter_indexes[i] for i in indexes))
+
+
+def group_voters_by_ballot(voters):
+    """
+    Sort the given Voters into BallotGroups of Voters who cast identical valid votes.
+    Return a list of those BallotGroups, ordered by when each group's first Voter appears in voters.
+    """
+
+    voters_by_ballot = {}
+    # voter_indexes_by_ballot[b] contains the indexes in voters of voters_by_ballot[b]
+    voter_indexes_by_ballot = {}
+    for i, voter in enumerate(voters):
+        ballot = voter.get_ballot()
+        if ballot not in voters_by_ballot:
+            voters_by_ballot[ballot] = []
+            voter_indexes_by_ballot[ballot] = array("I")
+        voters_by_ballot[ballot].append(voter)
+        voter_indexes_by_ballot[ballot].append(i)
+
+    return [
+        BallotGroup(ballot, voters, voter_indexes_by_ballot[ballot])
+        for ballot, voters in voters_by_ballot.items()
+    ]
+
+
+def snapshot_ballot_groups(ballot_groups):
+    """
+    Return a tuple of (voters, round_when_last_moved, transfer_value, arrival_key, voter_indexes)
+    tuples, one for each of the given BallotGroups, recording which Voters are in each group as of
+    now.
+
+    Voters don't change while a Contest is counting, and BallotGroup.split replaces a group's voters
+    rather than modifying them, so the snapshot stays accurate no matter what happens to the
+    BallotGroups afterwards.
+    """
+
+    return tuple(
+        (
+            ballot_group.voters,
+            ballot_group.round_when_last_moved,
+            ballot_group.transfer_value,
+            ballot_group.arrival_key,
+            ballot_group.voter_indexes,
+        )
+        for ballot_group in ballot_groups
+    )
+
+
+def get_snapshot_voters(ballot_group_snapshots):
+    """
+    Return a list of (voter, round_when_last_moved, transfer_value) tuples, one for every Voter in
+    the given BallotGroup snapshots (see snapshot_ballot_groups), listing the Voters in the order
+    they arrived where they are: by when they arrived, then by the order they were in where they
+    came from, and so on, and finally by their order in the Contest's voters. This is the order
+    Contests listed Voters in when they moved them one at a time.
+    """
+
+    voter_tuples = []
+    for voters, round_when_last_moved, transfer_value, arrival_key, voter_indexes in (
+        ballot_group_snapshots
+    ):
+        if not isinstance(voters, list):
+            voter_order_keys = voters.get_ballot_numbers()
+        elif voter_indexes is not None:
+            voter_order_keys = voter_indexes
+        else:
+            # the Voters' original order isn't known, so keep the BallotGroup's order
+            voter_order_keys = [0] * len(voters)
+
+        voter_tuples.extend(
+            (arrival_key, voter_order_key, (voter, round_when_last_moved, transfer_value))
+            for voter_order_key, voter in zip(voter_order_keys, voters)
+        )
+
+    voter_tuples.sort(key=lambda voter_tuple: voter_tuple[:2])
+    return [voter_tuple[2] for voter_tuple in voter_tuples]
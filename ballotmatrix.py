@@ -0,0 +1,347 @@
+import bisect
+import itertools
+from array import array
+from collections.abc import Sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ballotgroup import BallotGroup
+from voter import Voter
+
+class BallotMatrix():
+    """
+    A BallotMatrix stores a whole electorate's valid votes in one contiguous array of Entry ids,
+    with one row per ballot and one column per preference slot.
+    Each ballot can also have a weight (the number of Voters who cast it) and a voter name.
+
+    Ballots are stored in normalized form: only the order of a ballot's valid votes is kept, so the
+    Entry in slot p of a ballot is treated as having ranking p + 1.
+    """
+
+
+    # marks a preference slot that holds no Entry
+    EMPTY = 0xFFFF
+
+
+    def __init__(self, entry_names, num_slots):
+        if len(entry_names) >= BallotMatrix.EMPTY:
+            raise ValueError(
+                f"A BallotMatrix can hold at most {BallotMatrix.EMPTY - 1} entries,"
+                f" but {len(entry_names)} were given."
+            )
+
+        # self.entry_names[i] contains the name of the Entry with id i
+        self.entry_names = list(entry_names)
+        # the most Entries that any ballot can rank
+        self.num_slots = max(1, num_slots)
+        self.num_ballots = 0
+
+        # self.preferences[b * self.num_slots + p] contains the id of the Entry in slot p of ballot
+        # b, or EMPTY if ballot b ranks fewer than p + 1 Entries.
+        # This and the other per-ballot sequences are arrays or lists, except in a BallotMatrix
+        # loaded from a snapshot (see contestsnapshot.read_snapshot), where they're read-only views
+        # of the snapshot until the BallotMatrix is first modified.
+        self.preferences = array("H")
+        # self.weights[b] contains the weight of ballot b, or this is None if every ballot has
+        # weight 1
+        self.weights = None
+        # self.voter_names[b] contains the name of the voter who cast ballot b (or None if they
+        # don't have one), or this is None if no ballot has a voter name
+        self.voter_names = None
+
+
+    def append_ballot(self, entry_ids, weight=1, voter_name=None):
+        """
+        Add a ballot ranking the Entries with the given ids (from favorite to least favorite) to the
+        BallotMatrix.
+        """
+
+        if len(entry_ids) > self.num_slots:
+            raise ValueError(
+                f"This BallotMatrix has room for {self.num_slots} preferences per ballot,"
+                f" but a ballot with {len(entry_ids)} preferences was given."
+            )
+
+        self._make_modifiable()
+
+        if weight != 1 and self.weights is None:
+            self.weights = array("I", itertools.repeat(1, self.num_ballots))
+        if voter_name is not None and self.voter_names is None:
+            self.voter_names = [None] * self.num_ballots
+
+        self.preferences.extend(entry_ids)
+        self.preferences.extend(
+            itertools.repeat(BallotMatrix.EMPTY, self.num_slots - len(entry_ids))
+        )
+        if self.weights is not None:
+            self.weights.append(weight)
+        if self.voter_names is not None:
+            self.voter_names.append(voter_name)
+        self.num_ballots += 1
+
+
+    def widen(self, num_slots):
+        """
+        Give every ballot in the BallotMatrix room for num_slots preferences.
+        """
+
+        if num_slots <= self.num_slots:
+            return
+
+        preferences = array("H")
+        padding = array("H", itertools.repeat(BallotMatrix.EMPTY, num_slots - self.num_slots))
+        for b in range(self.num_ballots):
+            preferences.extend(self.preferences[b * self.num_slots:(b + 1) * self.num_slots])
+            preferences.extend(padding)
+
+        self.preferences = preferences
+        self.num_slots = num_slots
+
+
+    def extend(self, other):
+        """
+        Append all the ballots in another BallotMatrix with the same Entries to this one.
+        """
+
+        if other.entry_names != self.entry_names:
+            raise ValueError("Only BallotMatrices with the same entries can be combined.")
+
+        self.widen(other.num_slots)
+        self._make_modifiable()
+
+        if other.num_slots == self.num_slots:
+            self.preferences.extend(other.preferences)
+        else:
+            padding = array(
+                "H", itertools.repeat(BallotMatrix.EMPTY, self.num_slots - other.num_slots)
+            )
+            for b in range(other.num_ballots):
+                self.preferences.extend(
+                    other.preferences[b * other.num_slots:(b + 1) * other.num_slots]
+                )
+                self.preferences.extend(padding)
+
+        if other.weights is not None and self.weights is None:
+            self.weights = array("I", itertools.repeat(1, self.num_ballots))
+        if self.weights is not None:
+            if other.weights is None:
+                self.weights.extend(itertools.repeat(1, other.num_ballots))
+            else:
+                self.weights.extend(other.weights)
+
+        if other.voter_names is not None and self.voter_names is None:
+            self.voter_names = [None] * self.num_ballots
+        if self.voter_names is not None:
+            if other.voter_names is None:
+                self.voter_names.extend(itertools.repeat(None, other.num_ballots))
+            else:
+                self.voter_names.extend(other.voter_names)
+
+        self.num_ballots += other.num_ballots
+
+
+    def _make_modifiable(self):
+        """
+        Copy any read-only per-ballot sequences (see __init__) into arrays or lists.
+        """
+
+        if not isinstance(self.preferences, array):
+            self.preferences = array("H", self.preferences)
+        if self.weights is not None and not isinstance(self.weights, array):
+            self.weights = array("I", self.weights)
+        if self.voter_names is not None and not isinstance(self.voter_names, list):
+            self.voter_names = list(self.voter_names)
+
+
+    def get_ballot(self, b):
+        """
+        Return a tuple of the ids of the Entries ranked by ballot b, from favorite to least favorite.
+        """
+
+        row = self.preferences[b * self.num_slots:(b + 1) * self.num_slots]
+        return tuple(entry_id for entry_id in row if entry_id != BallotMatrix.EMPTY)
+
+
+    def get_ballot_key(self, b):
+        """
+        Return a hashable key that is the same for two ballots exactly when they rank the same
+        Entries in the same order.
+        """
+
+        return self.preferences[b * self.num_slots:(b + 1) * self.num_slots].tobytes()
+
+
+    def get_weight(self, b):
+        """
+        Return the weight of ballot b.
+        """
+
+        return 1 if self.weights is None else self.weights[b]
+
+
+    def get_voter_name(self, b):
+        """
+        Return the name of the voter who cast ballot b, or a placeholder if they don't have one.
+        """
+
+        if self.voter_names is None or self.voter_names[b] is None:
+            return f"ballot {b + 1}"
+
+        return self.voter_names[b]
+
+
+    def get_total_weight(self):
+        """
+        Return the total weight of every ballot in the BallotMatrix (the number of Voters it
+        represents).
+        """
+
+        return self.num_ballots if self.weights is None else sum(self.weights)
+
+
+    def to_numpy(self):
+        """
+        Return a (number of ballots) x (number of slots) NumPy array viewing the BallotMatrix's
+        preferences. The array shares memory with the BallotMatrix rather than copying it.
+        """
+
+        if numpy is None:
+            raise ImportError("BallotMatrix.to_numpy requires NumPy.")
+
+        return numpy.frombuffer(self.preferences, dtype=numpy.uint16).reshape(
+            self.num_ballots, self.num_slots
+        )
+
+
+class BallotMatrixVoters(Sequence):
+    """
+    A BallotMatrixVoters is a read-only sequence of the Voters behind some of a BallotMatrix's
+    ballots (where a ballot of weight w stands for w Voters).
+    It only stores ballot numbers; each Voter is materialized when it's accessed, so Contests
+    populated from a BallotMatrix never hold a Python object per Voter.
+    """
+
+
+    def __init__(self, ballot_matrix, entries, ballots, counts):
+        """
+        The sequence contains counts[i] Voters who cast ballot ballots[i] of ballot_matrix.
+        entries is the list of the Contest's Entries.
+        """
+
+        self._ballot_matrix = ballot_matrix
+        self._entries = entries
+        self._ballots = ballots
+        self._counts = counts
+        # self._cumulative_counts[i] contains the number of Voters who cast ballots[:i + 1]
+        self._cumulative_counts = array("Q", itertools.accumulate(counts))
+        # False until append_ballot copies self._ballots and self._counts
+        self._owns_arrays = False
+
+
+    def __len__(self):
+        return self._cumulative_counts[-1] if self._cumulative_counts else 0
+
+
+    def __getitem__(self, v):
+        if isinstance(v, slice):
+            return [self[i] for i in range(*v.indices(len(self)))]
+        if v < 0:
+            v += len(self)
+        if not 0 <= v < len(self):
+            raise IndexError("BallotMatrixVoters index out of range")
+
+        b = self._ballots[bisect.bisect_right(self._cumulative_counts, v)]
+
+        voter = Voter(self._ballot_matrix.get_voter_name(b), self._entries)
+        for ranking, entry_id in enumerate(self._ballot_matrix.get_ballot(b), start=1):
+            voter.rank(self._entries[entry_id], ranking)
+        return voter
+
+
+    def append_ballot(self, b, count=1):
+        """
+        Add count Voters who cast ballot b of the BallotMatrix to the end of the sequence.
+        (Despite being read-only for everyone else, a Contest grows its BallotMatrixVoters as
+        ballots are added to it; see Contest.add_voters.)
+        """
+
+        if not self._owns_arrays:
+            # the arrays may be shared with the BallotMatrix (or be read-only views of a snapshot),
+            # so copy them before changing them
+            self._ballots = array("I", self._ballots)
+            self._counts = array("I", self._counts)
+            self._owns_arrays = True
+
+        self._ballots.append(b)
+        self._counts.append(count)
+        self._cumulative_counts.append(len(self) + count)
+
+
+    def get_ballot_numbers(self):
+        """
+        Return an iterator over the number of each Voter's ballot in the BallotMatrix, in order.
+        Since ballots are numbered in the order they were added, this is also the Voters' order in
+        the Contest.
+        """
+
+        return itertools.chain.from_iterable(
+            itertools.repeat(b, count) for b, count in zip(self._ballots, self._counts)
+        )
+
+
+    def select(self, voter_indexes):
+        """
+        Return a BallotMatrixVoters containing just the Voters at the given (sorted) indexes.
+        """
+
+        ballots = array("I")
+        counts = array("I")
+        for v in voter_indexes:
+            b = self._ballots[bisect.bisect_right(self._cumulative_counts, v)]
+            if ballots and ballots[-1] == b:
+                counts[-1] += 1
+            else:
+                ballots.append(b)
+                counts.append(1)
+
+        return BallotMatrixVoters(self._ballot_matrix, self._entries, ballots, counts)
+
+
+def group_ballot_matrix(ballot_matrix, entries):
+    """
+    Sort the ballots in the given BallotMatrix into BallotGroups of identical ballots, without
+    constructing a Voter for each ballot. entries is the list of the Contest's Entries.
+    Return a tuple of the form
+
+    (ballot_groups, voters),
+
+    where ballot_groups is ordered by when each group's first ballot appears in the BallotMatrix and
+    voters is a BallotMatrixVoters containing every Voter in ballot order.
+    """
+
+    ballots_by_key = {}
+    for b in range(ballot_matrix.num_ballots):
+        key = ballot_matrix.get_ballot_key(b)
+        if key not in ballots_by_key:
+            ballots_by_key[key] = array("I")
+        ballots_by_key[key].append(b)
+
+    ballot_groups = []
+    for ballots in ballots_by_key.values():
+        ballot = tuple(entries[entry_id] for entry_id in ballot_matrix.get_ballot(ballots[0]))
+        counts = array("I", (ballot_matrix.get_weight(b) for b in ballots))
+        ballot_groups.append(
+            BallotGroup(ballot, BallotMatrixVoters(ballot_matrix, entries, ballots, counts))
+        )
+
+    all_ballots = array("I", range(ballot_matrix.num_ballots))
+    all_counts = (
+        array("I", itertools.repeat(1, ballot_matrix.num_ballots)) if ballot_matrix.weights is None
+        else ballot_matrix.weights
+    )
+    voters = BallotMatrixVoters(ballot_matrix, entries, all_ballots, all_counts)
+
+    return (ballot_groups, voters)
@@ -0,0 +1,114 @@
+import csv
+
+from ballotmatrix import BallotMatrix
+from entry import Entry
+from reportsink import ReportSink
+from voter import Voter
+
+"""
+A common shape for the voting data that the create_voter_spreadsheet scripts collect, so a Contest
+can be populated from Google Forms or Discourse data directly (see
+Contest.populate_from_ballot_source) instead of through a voter spreadsheet.
+"""
+
+
+class BallotSource():
+    """
+    A BallotSource streams the ballots cast in a contest, one voter at a time.
+
+    entry_names lists every Entry's name, so a ballot can refer to Entry i by its index. Each item of
+    ballots is a tuple of the form
+
+    (voter_name, votes),
+
+    where votes is a dictionary of rankings keyed by Entry index: votes[i] = ranking. These are the
+    same votes that a voter spreadsheet's row would hold (see preprocessing.create_voter_spreadsheet),
+    so they may still include invalid rankings.
+
+    ballots may be a generator, in which case the BallotSource can only be read once.
+    max_ballot_length, if known, is the most Entries that any ballot ranks.
+    """
+
+
+    # how many rows of the voter spreadsheet to_ballot_matrix submits to be written at once
+    NUM_VOTER_SPREADSHEET_ROWS_PER_BATCH = 1000
+
+
+    def __init__(self, entry_names, ballots, max_ballot_length=None):
+        self.entry_names = entry_names
+        self.ballots = ballots
+        self.max_ballot_length = max_ballot_length
+
+
+    def __iter__(self):
+        return iter(self.ballots)
+
+
+    def to_ballot_matrix(
+        self,
+        spreadsheet_file_name=None,
+        write_in_background=True,
+        keep_voter_names=True
+    ):
+        """
+        Read the ballots one at a time into a BallotMatrix and return it.
+        Each ballot's rankings are validated exactly as in Contest.populate_from_spreadsheet.
+
+        If spreadsheet_file_name is given, the voter spreadsheet that
+        preprocessing.create_voter_spreadsheet would have written for the ballots is also written
+        there, on a background thread (see ReportSink) while the ballots are read, unless
+        write_in_background is False.
+
+        If keep_voter_names is False, then the BallotMatrix doesn't store voter names.
+        """
+
+        entries = [Entry(entry_name, i) for i, entry_name in enumerate(self.entry_names)]
+        ballot_matrix = BallotMatrix(self.entry_names, self.max_ballot_length or 1)
+
+        spreadsheet = None
+        if spreadsheet_file_name is not None:
+            spreadsheet = open(spreadsheet_file_name, "w", newline="")
+            writer = csv.writer(spreadsheet, delimiter=",")
+            writer.writerow(["user"] + list(self.entry_names))
+
+        try:
+            with ReportSink(write_in_background) as report_sink:
+                # the voter spreadsheet rows not yet submitted to report_sink
+                rows = []
+
+                for voter_name, votes in self:
+                    # construct a throwaway Voter so rankings are validated exactly as in
+                    # Contest.populate_from_spreadsheet, which ranks Entries in column order
+                    voter = Voter(voter_name, entries)
+                    for i in sorted(votes):
+                        if votes[i] is not None and votes[i] != "":
+                            voter.rank(entries[i], int(votes[i]))
+
+                    ballot = [entry.id for entry in voter.get_ballot()]
+                    ballot_matrix.widen(len(ballot))
+                    ballot_matrix.append_ballot(
+                        ballot, voter_name=voter_name if keep_voter_names else None
+                    )
+
+                    if spreadsheet is not None:
+                        rows.append([voter_name] + [votes.get(i) for i in range(len(entries))])
+                        if len(rows) == BallotSource.NUM_VOTER_SPREADSHEET_ROWS_PER_BATCH:
+                            report_sink.submit(_write_voter_spreadsheet_rows, writer, rows)
+                            rows = []
+
+                if rows:
+                    report_sink.submit(_write_voter_spreadsheet_rows, writer, rows)
+        finally:
+            if spreadsheet is not None:
+                spreadsheet.close()
+
+        return ballot_matrix
+
+
+def _write_voter_spreadsheet_rows(writer, rows):
+    """
+    Write the given rows of a voter spreadsheet with the given CSV writer (see
+    BallotSource.to_ballot_matrix).
+    """
+
+    writer.writerows(rows)
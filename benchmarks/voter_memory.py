@@ -0,0 +1,62 @@
+import argparse
+import random
+import sys
+import tracemalloc
+from pathlib import Path
+
+# let this script be run from anywhere
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from entry import Entry
+from voter import Voter
+
+"""
+Measure how many bytes each Voter (ballot) takes up in memory.
+
+Run with python benchmarks/voter_memory.py. Each synthetic Voter ranks their top few Entries out of
+many, like a typical Google Forms poll.
+"""
+
+def measure_bytes_per_voter(num_voters, num_entries, num_rankings_per_voter, keep_all_votes=False):
+    """
+    Construct num_voters Voters, each of whom ranks num_rankings_per_voter of num_entries Entries.
+    Return the average number of bytes allocated per Voter.
+    """
+
+    entries = [Entry(f"entry {i}", i) for i in range(num_entries)]
+    rankings_by_voter = [
+        random.sample(entries, num_rankings_per_voter) for _ in range(num_voters)
+    ]
+
+    tracemalloc.start()
+    voters = []
+    for i, ranked_entries in enumerate(rankings_by_voter):
+        voter = Voter(f"voter {i}", entries, keep_all_votes)
+        for ranking, entry in enumerate(ranked_entries, start=1):
+            voter.rank(entry, ranking)
+        voters.append(voter)
+    num_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return num_bytes / num_voters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory taken up by each Voter.")
+    parser.add_argument("--voters", type=int, default=100_000)
+    parser.add_argument("--entries", type=int, default=500)
+    parser.add_argument("--rankings", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{args.voters} voters, each ranking {args.rankings} of {args.entries} entries:"
+    )
+    for keep_all_votes in [False, True]:
+        bytes_per_voter = measure_bytes_per_voter(
+            args.voters, args.entries, args.rankings, keep_all_votes
+        )
+        print(f"\tkeep_all_votes={keep_all_votes}: {round(bytes_per_voter)} bytes per voter")
+
+
+if __name__ == "__main__":
+    main()
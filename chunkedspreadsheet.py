@@ -0,0 +1,175 @@
+import csv
+import io
+import locale
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from ballotmatrix import BallotMatrix
+from entry import Entry
+from sparsespreadsheet import is_sparse_spreadsheet, read_voter_spreadsheet
+from voter import Voter
+
+"""
+Helper functions for reading huge voter data spreadsheets (prepared by create_voter_spreadsheet in
+preprocessing.py) into a BallotMatrix, in chunks, across several processes.
+
+NOTE: The spreadsheet is split into chunks at line breaks, so its cells must not contain line
+breaks. (Spreadsheets written by create_voter_spreadsheet never do.)
+
+NOTE: Sparse spreadsheets (see sparsespreadsheet.py) are read in this process, in one pass, since a
+voter's votes can span several rows. They're small enough that this is still fast.
+"""
+
+# how many bytes of the spreadsheet each worker parses at a time
+DEFAULT_NUM_BYTES_PER_CHUNK = 2 ** 24
+
+
+def read_ballot_matrix_from_spreadsheet(
+    input_file_name,
+    num_processes=None,
+    num_bytes_per_chunk=DEFAULT_NUM_BYTES_PER_CHUNK,
+    keep_voter_names=True,
+    progress_callback=None
+):
+    """
+    Read the given voter data spreadsheet into a BallotMatrix with one ballot per row.
+
+    The spreadsheet is memory-mapped and split into chunks of about num_bytes_per_chunk bytes, which
+    are parsed by a pool of num_processes processes (by default, one per CPU; if num_processes is 1,
+    then everything is parsed in this process). Only a few chunks are in flight at once, so memory
+    use is bounded by the size of the final BallotMatrix plus a few chunks.
+
+    Each row's rankings are validated exactly as Voter.rank validates them.
+
+    If keep_voter_names is False, then the BallotMatrix doesn't store voter names.
+    If given, progress_callback is called as progress_callback(num_bytes_read, num_bytes_total)
+    after each chunk is merged into the BallotMatrix.
+    """
+
+    if num_processes is None:
+        num_processes = os.cpu_count() or 1
+
+    if is_sparse_spreadsheet(input_file_name):
+        num_bytes_total = os.path.getsize(input_file_name)
+        ballot_matrix = read_voter_spreadsheet(input_file_name).to_ballot_matrix(
+            keep_voter_names=keep_voter_names
+        )
+        if progress_callback is not None:
+            progress_callback(num_bytes_total, num_bytes_total)
+        return ballot_matrix
+
+    entry_names, chunk_bounds = split_spreadsheet_into_chunks(input_file_name, num_bytes_per_chunk)
+    num_bytes_total = os.path.getsize(input_file_name)
+
+    ballot_matrix = BallotMatrix(entry_names, 1)
+    tasks = [
+        (input_file_name, entry_names, start, end, keep_voter_names)
+        for start, end in chunk_bounds
+    ]
+
+    def merge(chunk_ballot_matrix, end):
+        ballot_matrix.extend(chunk_ballot_matrix)
+        if progress_callback is not None:
+            progress_callback(end, num_bytes_total)
+
+    if num_processes == 1:
+        for task in tasks:
+            merge(read_spreadsheet_chunk(*task), task[3])
+    else:
+        with ProcessPoolExecutor(max_workers=num_processes) as executor:
+            # keep a bounded number of chunks in flight, merging them in order as they finish
+            max_num_chunks_in_flight = 2 * num_processes
+            futures = []
+            for task in tasks:
+                futures.append((executor.submit(read_spreadsheet_chunk, *task), task[3]))
+                if len(futures) >= max_num_chunks_in_flight:
+                    future, end = futures.pop(0)
+                    merge(future.result(), end)
+            for future, end in futures:
+                merge(future.result(), end)
+
+    return ballot_matrix
+
+
+def split_spreadsheet_into_chunks(input_file_name, num_bytes_per_chunk=DEFAULT_NUM_BYTES_PER_CHUNK):
+    """
+    Split the rows of the given (wide) voter data spreadsheet into chunks of about
+    num_bytes_per_chunk bytes that can each be parsed on their own (see read_spreadsheet_chunk).
+    Return a tuple of the form
+
+    (entry_names, chunk_bounds),
+
+    where chunk_bounds is a list of the (start, end) byte offsets of the chunks.
+    """
+
+    with open(input_file_name, "rb") as spreadsheet:
+        header_line = spreadsheet.readline()
+        entry_names = next(csv.reader([_decode(header_line)]))[1:]
+
+        num_bytes_total = os.fstat(spreadsheet.fileno()).st_size
+        chunk_bounds = _get_chunk_bounds(
+            spreadsheet, len(header_line), num_bytes_total, num_bytes_per_chunk
+        )
+
+    return (entry_names, chunk_bounds)
+
+
+def read_spreadsheet_chunk(input_file_name, entry_names, start, end, keep_voter_names=True):
+    """
+    Parse the rows in bytes [start, end) of the given spreadsheet (a chunk from
+    split_spreadsheet_into_chunks), whose Entries have the given names.
+    Return a BallotMatrix containing one ballot per row.
+    """
+
+    with open(input_file_name, "rb") as spreadsheet:
+        with mmap.mmap(spreadsheet.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            text = _decode(data[start:end])
+
+    entries = [Entry(entry_name, i) for i, entry_name in enumerate(entry_names)]
+
+    rows = [row for row in csv.reader(io.StringIO(text, newline=""), delimiter=",") if row]
+    ballots = []
+    for row in rows:
+        # construct a throwaway Voter so rankings are validated exactly as in
+        # Contest.populate_from_spreadsheet
+        voter = Voter(row[0], entries)
+        for i, ranking in enumerate(row[1:]):
+            if ranking:
+                voter.rank(entries[i], int(ranking))
+        ballots.append([entry.id for entry in voter.get_ballot()])
+
+    ballot_matrix = BallotMatrix(entry_names, max((len(ballot) for ballot in ballots), default=1))
+    for row, ballot in zip(rows, ballots):
+        ballot_matrix.append_ballot(ballot, voter_name=row[0] if keep_voter_names else None)
+
+    return ballot_matrix
+
+
+def _decode(data):
+    """
+    Decode the given bytes the same way open() would decode a text file by default.
+    """
+
+    return data.decode(locale.getpreferredencoding(False))
+
+
+def _get_chunk_bounds(spreadsheet, start, num_bytes_total, num_bytes_per_chunk):
+    """
+    Split the given (binary) spreadsheet file, starting at byte start, into chunks of about
+    num_bytes_per_chunk bytes that each end just after a line break.
+    Return a list of (start, end) byte offsets.
+    """
+
+    if num_bytes_total <= start:
+        return []
+
+    chunk_bounds = []
+    with mmap.mmap(spreadsheet.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        while start < num_bytes_total:
+            end = data.find(b"\n", min(start + num_bytes_per_chunk, num_bytes_total) - 1)
+            end = num_bytes_total if end == -1 else end + 1
+            chunk_bounds.append((start, end))
+            start = end
+
+    return chunk_bounds
@@ -1,11 +1,24 @@
 import csv
+import os
 
+from array import array
+
+from ballotgroup import BallotGroup, group_voters_by_ballot
+from ballotmatrix import BallotMatrix, BallotMatrixVoters, group_ballot_matrix
+from chunkedspreadsheet import read_ballot_matrix_from_spreadsheet
+from contestsnapshot import read_snapshot, write_snapshot
 from entry import Entry
+from matchmatrix import add_ballot_to_1v1_match_votes, count_1v1_match_votes
+from roundresult import RoundResult
+from sparsespreadsheet import SPARSE_SPREADSHEET_HEADER, read_voter_spreadsheet
+from spreadsheettail import SpreadsheetTail
 from voter import Voter
 
 class Contest:
     """
     A Contest contains Voters who have assigned rankings (numbers) to various Entries.
+    Voters who cast identical valid votes are also sorted into BallotGroups, which the Contest counts
+    instead of counting each Voter separately.
     It also has a desired number of winners.
     Its get_winners method determines ranked choice voting results and returns the winning Entries.
     """
@@ -15,10 +28,102 @@ class Contest:
     NUM_CHARS_IN_DIVIDER = 100
 
 
-    def __init__(self, verbose=True):
+    # the methods timed as phases when the Contest has a ContestMetrics (see __init__); subclasses
+    # add their own
+    METERED_PHASES = [
+        "populate_from_spreadsheet",
+        "populate_from_ballot_matrix",
+        "populate_from_ballot_source",
+        "populate_from_snapshot",
+        "populate_from_tally",
+        "add_voters",
+        "get_winners",
+        "_flush_reports",
+    ]
+
+
+    def __init__(self, verbose=True, background_reports=True, metrics=None):
         self.verbose = verbose
+        # if True, get_winners writes its spreadsheets on a background thread while it counts
+        # (see ReportSink)
+        self.background_reports = background_reports
+
+        # the ContestMetrics recording how long each phase of the Contest takes, or None.
+        # Each method in METERED_PHASES is timed as a phase named after it (without its leading
+        # underscore) by replacing it with a timed version on this Contest only, so Contests without
+        # metrics run exactly the same code as before.
+        self.metrics = metrics
+        if self.metrics is not None:
+            for method_name in self.METERED_PHASES:
+                setattr(
+                    self,
+                    method_name,
+                    self.metrics.wrap_phase(method_name.lstrip("_"), getattr(self, method_name))
+                )
+
+        # the RoundResult of every round of the last count (see get_winners)
+        self.round_results = []
+
         self.voters = []
         self.entries = []
+        self.ballot_groups = []
+        # 1v1 match vote counts loaded from a snapshot (see populate_from_snapshot), taken from a
+        # ContestTally (see populate_from_tally), or kept up to date as Voters are added (see
+        # add_voters), or None
+        self.precomputed_1v1_match_votes = None
+
+        # the BallotMatrix the Contest was populated from, if any (see populate_from_ballot_matrix)
+        self._ballot_matrix = None
+        # self._ballot_groups_by_ballot[b] contains the BallotGroup with ballot b, or this is None
+        # until Voters are first added with add_voters
+        self._ballot_groups_by_ballot = None
+        # self._first_preference_counts[i] contains the number of Voters who ranked self.entries[i]
+        # first, or this is None until it's first needed
+        self._first_preference_counts = None
+        # self._spreadsheet_tails[f] contains the SpreadsheetTail reading the spreadsheet with file
+        # name f (see add_voters_from_new_spreadsheet_rows)
+        self._spreadsheet_tails = {}
+
+
+    def _flush_reports(self):
+        """
+        Wait until every spreadsheet submitted to self._report_sink has been written.
+        """
+
+        if self.verbose and self.background_reports:
+            print()
+            print("Waiting for spreadsheets to finish writing...", end="", flush=True)
+
+        self._report_sink.flush()
+
+        if self.verbose and self.background_reports:
+            print(" done.")
+
+
+    def _record_report_metrics(self, report_sink):
+        """
+        Record how long the given (closed) ReportSink spent writing spreadsheets, and how many bytes
+        it wrote, in self.metrics.
+        """
+
+        if self.metrics is not None:
+            self.metrics.record_phase(
+                "write_reports", report_sink.num_seconds_writing, report_sink.num_reports_written
+            )
+            self.metrics.add("report_bytes_written", report_sink.num_bytes_written)
+
+
+    def _get_entry_statuses(self):
+        """
+        Return a bytes object whose i-th byte is the status of self.entries[i] (see
+        RoundResult.statuses).
+        """
+
+        return bytes(
+            RoundResult.WON if entry.has_won else RoundResult.LOST if entry.has_lost
+            else RoundResult.IN_RACE
+            for entry in self.entries
+        )
 
 
     def _print_round_name(self):
@@ -27,11 +132,16 @@ class Contest:
         print("#" * Contest.NUM_CHARS_IN_DIVIDER)
 
 
-    def populate_from_spreadsheet(self, input_file_name):
+    def populate_from_spreadsheet(self, input_file_name, keep_all_votes=False):
         """
         Grab voter data from the given spreadsheet
         (prepared by create_spreadsheet_from_voter_dictionary in create-voter-spreadsheet.py)
         and populate the STVContest with the relevant Voters and Entries.
+
+        The spreadsheet can also be sparse, with one row per vote (see sparsespreadsheet.py).
+
+        If keep_all_votes is True, then each Voter also keeps a record of every vote they cast,
+        including invalid ones (see Voter.all_votes).
         """
 
         if self.verbose:
@@ -42,29 +152,29 @@ class Contest:
             reader = csv.reader(spreadsheet, delimiter=",")
 
             header = next(reader)
-            entry_names = header[1:]
-            # If there n Entries, each voter can assign at most n distinct rankings.
-            # (Really the number of Entries may be more than the number of distinct rankings.
-            # For example, a poll could ask users to vote for the top 3 Entries out of 10.
-            # It's fine to overestimate the number of distinct rankings though. It'll just lead to
-            # some wasted space in each Voter, which doesn't really matter.)
-            num_distinct_rankings = len(entry_names)
+            if header == SPARSE_SPREADSHEET_HEADER:
+                ballot_source = read_voter_spreadsheet(input_file_name)
+                entry_names = ballot_source.entry_names
+                # each item is a voter's name and (i, ranking) tuples of their rankings for entry
+                # self.entries[i], in column order
+                voter_rankings = (
+                    (voter_name, sorted(votes.items())) for voter_name, votes in ballot_source
+                )
+            else:
+                entry_names = header[1:]
+                voter_rankings = ((row[0], enumerate(row[1:])) for row in reader)
 
             # construct Entries
-            for entry_name in entry_names:
+            for i, entry_name in enumerate(entry_names):
                 # self.entries[i] contains the entry from column i+1
                 # (not column i because the leftmost column contains user info, not entry info)
-                self.entries.append(Entry(entry_name))
+                self.entries.append(Entry(entry_name, i))
 
             # construct Voters and record their votes
-            for row in reader:
-                voter_name = row[0]
-                # voter_rankings[i] contains the voter's ranking for entry self.entries[i]
-                voter_rankings = row[1:]
+            for voter_name, rankings in voter_rankings:
+                voter = Voter(voter_name, self.entries, keep_all_votes)
 
-                voter = Voter(voter_name, num_distinct_rankings)
-
-                for i, ranking in enumerate(voter_rankings):
+                for i, ranking in rankings:
                     if ranking:
                         # the ranks are stored in user_rankings as a list of strings, so cast them
                         # to ints for use as indexes
@@ -72,10 +182,347 @@ class Contest:
 
                 self.voters.append(voter)
 
+            if header != SPARSE_SPREADSHEET_HEADER:
+                # the file's position is the number of bytes the reader parsed, which may be fewer
+                # than the spreadsheet has now if it's still growing
+                self._mark_spreadsheet_as_read(
+                    input_file_name, os.lseek(spreadsheet.fileno(), 0, os.SEEK_CUR)
+                )
+
+        self.ballot_groups = group_voters_by_ballot(self.voters)
+
+        if self.verbose:
+            print(" done.")
+
+
+    def populate_from_spreadsheet_in_chunks(
+        self,
+        input_file_name,
+        num_processes=None,
+        progress_callback=None
+    ):
+        """
+        Grab voter data from the given spreadsheet and populate the Contest with it, like
+        populate_from_spreadsheet, but parse the spreadsheet in chunks across num_processes
+        processes and store the ballots in a BallotMatrix rather than in Voter objects.
+        This is much faster and uses much less memory for huge spreadsheets.
+        See chunkedspreadsheet.read_ballot_matrix_from_spreadsheet.
+        """
+
+        if self.verbose:
+            print(f"Reading voter data from {input_file_name} in chunks...", end="", flush=True)
+
+        # the number of bytes of the spreadsheet that have been parsed so far
+        num_bytes_read = 0
+
+        def record_progress(chunk_end, num_bytes_total):
+            nonlocal num_bytes_read
+            num_bytes_read = chunk_end
+            if progress_callback is not None:
+                progress_callback(chunk_end, num_bytes_total)
+
+        ballot_matrix = read_ballot_matrix_from_spreadsheet(
+            input_file_name, num_processes=num_processes, progress_callback=record_progress
+        )
+
+        if self.verbose:
+            print(" done.")
+
+        self.populate_from_ballot_matrix(ballot_matrix)
+        self._mark_spreadsheet_as_read(input_file_name, num_bytes_read)
+
+
+    def _mark_spreadsheet_as_read(self, input_file_name, num_bytes_read):
+        """
+        Record that the first num_bytes_read bytes of the given spreadsheet have been read into the
+        Contest, so that add_voters_from_new_spreadsheet_rows only adds the Voters after them.
+        """
+
+        spreadsheet_tail = SpreadsheetTail(input_file_name)
+        spreadsheet_tail.mark_as_read(num_bytes_read)
+        self._spreadsheet_tails[input_file_name] = spreadsheet_tail
+
+
+    def populate_from_ballot_source(self, ballot_source, spreadsheet_file_name=None):
+        """
+        Populate the Contest with the Entries and ballots in the given BallotSource (see
+        ballotsource.py), reading the ballots one at a time into a BallotMatrix (see
+        BallotSource.to_ballot_matrix and populate_from_ballot_matrix) instead of through a votes
+        dictionary and a voter spreadsheet.
+
+        If spreadsheet_file_name is given, the voter spreadsheet that
+        preprocessing.create_voter_spreadsheet would have written for the BallotSource is also
+        written there while the ballots are read (on a background thread if the Contest writes its
+        reports in the background).
+        """
+
+        if self.verbose:
+            print("Reading ballots from a ballot source...")
+
+        ballot_matrix = ballot_source.to_ballot_matrix(
+            spreadsheet_file_name, write_in_background=self.background_reports
+        )
+
+        if self.verbose:
+            print(f"Done reading {ballot_matrix.num_ballots} ballots.")
+
+        self.populate_from_ballot_matrix(ballot_matrix)
+
+
+    def populate_from_ballot_matrix(self, ballot_matrix):
+        """
+        Populate the Contest with the Entries and ballots in the given BallotMatrix.
+        No Voter objects are constructed up front: self.voters is a BallotMatrixVoters that only
+        materializes a Voter when one is needed (for example, when writing a spreadsheet).
+        """
+
+        if self.verbose:
+            print(
+                f"Populating contest with {ballot_matrix.num_ballots} ballots from a ballot matrix...",
+                end="",
+                flush=True
+            )
+
+        for i, entry_name in enumerate(ballot_matrix.entry_names):
+            self.entries.append(Entry(entry_name, i))
+
+        self._ballot_matrix = ballot_matrix
+        self.ballot_groups, self.voters = group_ballot_matrix(ballot_matrix, self.entries)
+
         if self.verbose:
             print(" done.")
 
 
+    def add_voters(self, voters):
+        """
+        Add the given Voters (who voted for self.entries) to the populated Contest.
+
+        Rather than being regrouped and recounted from scratch, each Voter is added to the
+        BallotGroup with their ballot (or a new one), and the first-preference counts (see
+        get_first_preference_counts) and 1v1 match vote counts (see precomputed_1v1_match_votes)
+        are updated in place, which takes time proportional to the number of Entries times the
+        length of the Voter's ballot. The first call also tallies the 1v1 matches of the Voters
+        already in the Contest, if they haven't been tallied yet.
+
+        Voters can only be added between counts: a TidemanContest can then be counted again with
+        get_winners, without revisiting every Voter's ballot.
+        """
+
+        if self._ballot_groups_by_ballot is None:
+            self._ballot_groups_by_ballot = {
+                ballot_group.ballot: ballot_group for ballot_group in self.ballot_groups
+            }
+        if self.precomputed_1v1_match_votes is None:
+            self.precomputed_1v1_match_votes = count_1v1_match_votes(self.ballot_groups, self.entries)
+        first_preference_counts = self.get_first_preference_counts()
+
+        for voter in voters:
+            ballot = voter.get_ballot()
+
+            ballot_group = self._ballot_groups_by_ballot.get(ballot)
+            if self._ballot_matrix is None:
+                self.voters.append(voter)
+                if ballot_group is None:
+                    ballot_group = BallotGroup(ballot, [], array("I"))
+                ballot_group.voters.append(voter)
+                if ballot_group.voter_indexes is not None:
+                    ballot_group.voter_indexes.append(len(self.voters) - 1)
+            else:
+                # store the Voter's ballot in the BallotMatrix, like every other Voter's
+                # (the BallotMatrixVoters are updated first, since they may share the BallotMatrix's
+                # weights until they're first changed)
+                b = self._ballot_matrix.num_ballots
+                self.voters.append_ballot(b)
+                if ballot_group is None:
+                    ballot_group = BallotGroup(
+                        ballot,
+                        BallotMatrixVoters(self._ballot_matrix, self.entries, array("I"), array("I"))
+                    )
+                ballot_group.voters.append_ballot(b)
+
+                self._ballot_matrix.widen(len(ballot))
+                self._ballot_matrix.append_ballot(
+                    [entry.id for entry in ballot], voter_name=voter.name
+                )
+
+            if ballot not in self._ballot_groups_by_ballot:
+                self._ballot_groups_by_ballot[ballot] = ballot_group
+                self.ballot_groups.append(ballot_group)
+
+            if ballot:
+                first_preference_counts[ballot[0].id] += 1
+            add_ballot_to_1v1_match_votes(self.precomputed_1v1_match_votes, ballot, self.entries)
+
+
+    def add_voters_from_new_spreadsheet_rows(self, input_file_name, keep_all_votes=False):
+        """
+        Add Voters from the rows that have been added to the end of the given spreadsheet since the
+        last call, or since the Contest was populated from it with populate_from_spreadsheet or
+        populate_from_spreadsheet_in_chunks (see spreadsheettail.SpreadsheetTail), to the Contest,
+        with add_voters.
+        If the Contest has no Entries yet, they're taken from the spreadsheet's header; otherwise,
+        the header must list the Contest's Entries. Sparse spreadsheets (see sparsespreadsheet.py)
+        aren't supported, since a voter's last row can't be told apart from a row that's only the
+        first of several.
+        Return the number of Voters added.
+
+        This lets a Contest keep up with a spreadsheet that grows while voting is still open,
+        parsing each row only once.
+        """
+
+        if input_file_name not in self._spreadsheet_tails:
+            self._spreadsheet_tails[input_file_name] = SpreadsheetTail(input_file_name)
+        spreadsheet_tail = self._spreadsheet_tails[input_file_name]
+
+        rows = spreadsheet_tail.read_new_rows()
+        if spreadsheet_tail.header is None:
+            return 0
+        if spreadsheet_tail.header == SPARSE_SPREADSHEET_HEADER:
+            raise ValueError(
+                f"{input_file_name} is a sparse spreadsheet, but new voters can only be read from"
+                f" wide spreadsheets."
+            )
+
+        entry_names = spreadsheet_tail.header[1:]
+        if not self.entries:
+            for i, entry_name in enumerate(entry_names):
+                self.entries.append(Entry(entry_name, i))
+        elif entry_names != [entry.name for entry in self.entries]:
+            raise ValueError(f"The entries in {input_file_name} don't match the contest's entries.")
+
+        voters = []
+        for row in rows:
+            voter = Voter(row[0], self.entries, keep_all_votes)
+            for i, ranking in enumerate(row[1:]):
+                if ranking:
+                    voter.rank(self.entries[i], int(ranking))
+            voters.append(voter)
+
+        if voters:
+            if self.verbose:
+                print(f"Adding {len(voters)} new voters from {input_file_name}...",
+                    end="", flush=True)
+
+            self.add_voters(voters)
+
+            if self.verbose:
+                print(" done.")
+
+        return len(voters)
+
+
+    def get_first_preference_counts(self):
+        """
+        Return a list whose i-th element is the number of Voters who ranked self.entries[i] first
+        (with a valid ranking). The counts are kept up to date by add_voters.
+        """
+
+        if self._first_preference_counts is None:
+            self._first_preference_counts = [0 for _ in self.entries]
+            for ballot_group in self.ballot_groups:
+                if ballot_group.ballot:
+                    self._first_preference_counts[ballot_group.ballot[0].id] += ballot_group.weight
+
+        return self._first_preference_counts
+
+
+    def to_ballot_matrix(self, group_ballots=False):
+        """
+        Return a BallotMatrix containing the Contest's Entries and the valid votes of its Voters.
+        If group_ballots is True, then the BallotMatrix has one weighted ballot per BallotGroup;
+        otherwise, it has one ballot per Voter, labeled with the Voter's name.
+        """
+
+        num_slots = max((len(ballot_group.ballot) for ballot_group in self.ballot_groups), default=0)
+        ballot_matrix = BallotMatrix([entry.name for entry in self.entries], num_slots)
+
+        if group_ballots:
+            for ballot_group in self.ballot_groups:
+                ballot_matrix.append_ballot(
+                    [entry.id for entry in ballot_group.ballot], weight=ballot_group.weight
+                )
+        else:
+            for voter in self.voters:
+                ballot_matrix.append_ballot(
+                    [entry.id for entry in voter.get_ballot()], voter_name=voter.name
+                )
+
+        return ballot_matrix
+
+
+    def save_snapshot(self, output_file_name, include_1v1_match_votes=False):
+        """
+        Save the Contest's Entries and the valid votes of its Voters (with their names) to a binary
+        snapshot file, which populate_from_snapshot can load much faster than a spreadsheet.
+        If include_1v1_match_votes is True, then the vote counts of every 1v1 match are computed
+        and saved too, so TidemanContests loaded from the snapshot don't have to count them.
+        See contestsnapshot.py for the file format.
+        """
+
+        if self.verbose:
+            print(f"Saving contest snapshot to {output_file_name}...", end="", flush=True)
+
+        match_votes = None
+        if include_1v1_match_votes:
+            match_votes = self.precomputed_1v1_match_votes
+            if match_votes is None:
+                match_votes = count_1v1_match_votes(self.ballot_groups, self.entries)
+
+        write_snapshot(output_file_name, self.to_ballot_matrix(), match_votes)
+
+        if self.verbose:
+            print(" done.")
+
+
+    def populate_from_snapshot(self, input_file_name, verify_content_hash=True):
+        """
+        Populate the Contest from a snapshot file written by save_snapshot.
+        The snapshot is memory-mapped rather than parsed (see contestsnapshot.read_snapshot), and
+        the Contest is populated as in populate_from_ballot_matrix.
+        """
+
+        if self.verbose:
+            print(f"Loading contest snapshot from {input_file_name}...", end="", flush=True)
+
+        ballot_matrix, self.precomputed_1v1_match_votes = read_snapshot(
+            input_file_name, verify_content_hash
+        )
+
+        if self.verbose:
+            print(" done.")
+
+        self.populate_from_ballot_matrix(ballot_matrix)
+
+
+    def populate_from_tally(self, contest_tally):
+        """
+        Populate the Contest from the given ContestTally (see partialtally.py), such as one merged
+        from shards by shardedtally.tally_spreadsheets.
+
+        The Contest gets one weighted ballot per distinct ballot in the tally's BallotHistogram (see
+        populate_from_ballot_matrix), so its BallotGroups, and the first round of an STVContest,
+        match the tally's first-preference counts. The 1v1 match vote counts (see
+        precomputed_1v1_match_votes) and first-preference counts (see get_first_preference_counts)
+        are taken from the tally instead of being counted again.
+        """
+
+        if self.verbose:
+            print(
+                f"Populating contest from a tally of {contest_tally.num_voters} voters...",
+                end="",
+                flush=True
+            )
+
+        ballot_matrix = contest_tally.ballot_histogram.to_ballot_matrix(contest_tally.entry_names)
+
+        if self.verbose:
+            print(" done.")
+
+        self.populate_from_ballot_matrix(ballot_matrix)
+        self.precomputed_1v1_match_votes = contest_tally.pairwise.get_1v1_match_votes()
+        self._first_preference_counts = list(contest_tally.first_preferences.counts)
+
+
     def get_winners(self):
         """
         Determine and return the Contest's winners.
@@ -0,0 +1,229 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+
+"""
+Helpers for measuring where a Contest spends its time.
+
+A Contest constructed with a ContestMetrics times each of its phases (the methods listed in its
+METERED_PHASES) and tallies counters such as the number of Voters moved between Entries. One phase
+can also be profiled with cProfile, and optionally with tracemalloc.
+
+A Contest constructed without a ContestMetrics doesn't wrap its phases at all, so measuring costs
+nothing unless it's asked for.
+"""
+
+# by default, how many functions (or lines, for memory) the profile of the profiled phase lists
+DEFAULT_NUM_PROFILE_ENTRIES = 20
+
+
+class ContestMetrics():
+    """
+    ContestMetrics record how long each phase of a Contest took, how many times it ran, and how
+    often various things happened while counting.
+
+    Phases can be nested (for instance, a phase that runs a round can call a phase that moves
+    Voters), and each phase's time includes the time of any phases nested inside it.
+    """
+
+
+    def __init__(
+        self,
+        profiled_phase=None,
+        trace_memory=False,
+        num_profile_entries=DEFAULT_NUM_PROFILE_ENTRIES
+    ):
+        """
+        If profiled_phase is the name of a phase, then every run of that phase is profiled with
+        cProfile, and also traced with tracemalloc if trace_memory is True.
+        """
+
+        self.profiled_phase = profiled_phase
+        self.trace_memory = trace_memory
+        self.num_profile_entries = num_profile_entries
+
+        # self.phase_seconds[p] contains the total time (in seconds) spent in phase p, and
+        # self.phase_num_calls[p] contains the number of times it ran
+        self.phase_seconds = {}
+        self.phase_num_calls = {}
+        # self.counters[c] contains the total amount added to counter c
+        self.counters = {}
+
+        # the cProfile profile of the profiled phase, or None until it runs
+        self.profile = None
+        # the peak memory (in bytes) allocated while the profiled phase ran, and the tracemalloc
+        # snapshot taken at the end of its last run, or None if memory isn't being traced
+        self.peak_memory_bytes = None
+        self.memory_snapshot = None
+        # True while tracemalloc is tracing because _start_profiling started it (rather than
+        # whoever is running the Contest), so _stop_profiling knows whether to stop it
+        self._started_tracing = False
+
+
+    def add(self, counter_name, amount=1):
+        """
+        Add the given amount to the given counter.
+        """
+
+        self.counters[counter_name] = self.counters.get(counter_name, 0) + amount
+
+
+    def record_phase(self, phase_name, seconds, num_calls=1):
+        """
+        Record that the given phase ran num_calls times, taking the given number of seconds in all.
+        """
+
+        self.phase_seconds[phase_name] = self.phase_seconds.get(phase_name, 0) + seconds
+        self.phase_num_calls[phase_name] = self.phase_num_calls.get(phase_name, 0) + num_calls
+
+
+    def wrap_phase(self, phase_name, function):
+        """
+        Return a function that calls the given function, recording the time it takes as a run of
+        the given phase (and profiling it, if it's the profiled phase).
+        """
+
+        def run_phase(*args, **kwargs):
+            is_profiled = phase_name == self.profiled_phase
+            if is_profiled:
+                self._start_profiling()
+
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record_phase(phase_name, time.perf_counter() - start_time)
+                if is_profiled:
+                    self._stop_profiling()
+
+        return run_phase
+
+
+    def _start_profiling(self):
+        if self.profile is None:
+            self.profile = cProfile.Profile()
+
+        if self.trace_memory:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                self._started_tracing = True
+
+        self.profile.enable()
+
+
+    def _stop_profiling(self):
+        self.profile.disable()
+
+        if self.trace_memory:
+            _, peak_memory_bytes = tracemalloc.get_traced_memory()
+            self.peak_memory_bytes = max(self.peak_memory_bytes or 0, peak_memory_bytes)
+            self.memory_snapshot = tracemalloc.take_snapshot()
+            # leave tracing on if it was already on before profiling started
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+
+    def get_profile_summary(self):
+        """
+        Return a list describing the self.num_profile_entries functions that took the most
+        cumulative time in the profiled phase, as dictionaries with the keys function, num_calls,
+        total_seconds (time spent in the function itself), and cumulative_seconds (including the
+        functions it called). Return an empty list if no phase has been profiled.
+        """
+
+        if self.profile is None:
+            return []
+
+        stats = pstats.Stats(self.profile, stream=io.StringIO())
+        rows = []
+        for (file_name, line_number, function_name), (_, num_calls, total_seconds, cumulative_seconds, _) in stats.stats.items():
+            rows.append({
+                "function": f"{file_name}:{line_number}({function_name})",
+                "num_calls": num_calls,
+                "total_seconds": total_seconds,
+                "cumulative_seconds": cumulative_seconds,
+            })
+
+        rows.sort(key=lambda row: row["cumulative_seconds"], reverse=True)
+        return rows[:self.num_profile_entries]
+
+
+    def get_memory_summary(self):
+        """
+        Return a list describing the self.num_profile_entries lines of code that had allocated the
+        most memory (and not freed it) by the end of the profiled phase, as dictionaries with the
+        keys line, size_bytes, and num_blocks. Return an empty list if memory wasn't traced.
+        """
+
+        if self.memory_snapshot is None:
+            return []
+
+        return [
+            {
+                "line": str(statistic.traceback),
+                "size_bytes": statistic.size,
+                "num_blocks": statistic.count,
+            }
+            for statistic in self.memory_snapshot.statistics("lineno")[:self.num_profile_entries]
+        ]
+
+
+    def to_dict(self):
+        """
+        Return the metrics as a dictionary of JSON-serializable values.
+        """
+
+        return {
+            "phases": {
+                phase_name: {
+                    "seconds": self.phase_seconds[phase_name],
+                    "num_calls": self.phase_num_calls[phase_name],
+                }
+                for phase_name in self.phase_seconds
+            },
+            "counters": dict(self.counters),
+            "profiled_phase": self.profiled_phase,
+            "profile": self.get_profile_summary(),
+            "peak_memory_bytes": self.peak_memory_bytes,
+            "memory": self.get_memory_summary(),
+        }
+
+
+    def to_json(self, indent=2):
+        """
+        Return the metrics as a JSON string (see to_dict).
+        """
+
+        return json.dumps(self.to_dict(), indent=indent)
+
+
+    def print_summary(self):
+        """
+        Print each phase's time and each counter to the console, from slowest to fastest phase.
+        """
+
+        longest_phase_name_length = max((len(name) for name in self.phase_seconds), default=0)
+
+        print()
+        print("Phase times:")
+        print()
+        for phase_name in sorted(self.phase_seconds, key=self.phase_seconds.get, reverse=True):
+            call_text = "call" if self.phase_num_calls[phase_name] == 1 else "calls"
+            print(
+                f"\t{phase_name.ljust(longest_phase_name_length + 2)}"
+                f"{self.phase_seconds[phase_name]:.3f}s"
+                f" ({self.phase_num_calls[phase_name]} {call_text})"
+            )
+
+        if self.counters:
+            print()
+            print("Counters:")
+            print()
+            for counter_name, amount in self.counters.items():
+                print(f"\t{counter_name}: {amount}")
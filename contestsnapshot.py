@@ -0,0 +1,287 @@
+import hashlib
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+
+from ballotmatrix import BallotMatrix
+
+"""
+Helper functions for saving a Contest's ballots to a binary snapshot file and loading them back
+with mmap, without parsing anything.
+
+A snapshot starts with a fixed-size header:
+
+* the magic bytes SNAPSHOT_MAGIC;
+* the format version (SNAPSHOT_VERSION);
+* flags saying which optional sections are present;
+* the number of Entries, preference slots per ballot, and ballots;
+* the SHA-256 hash of the rest of the header (with the hash itself zeroed) and everything after
+    it.
+
+The header is followed by these sections, each starting at a multiple of 8 bytes:
+
+* the entry table: the length of each Entry's UTF-8 encoded name, then the names themselves;
+* the preference matrix: BallotMatrix.preferences, one unsigned 16-bit Entry id per slot;
+* (optional) the weight of each ballot, as unsigned 32-bit integers;
+* (optional) voter names: num_ballots + 1 unsigned 64-bit offsets into the UTF-8 encoded names
+    that follow them (a ballot with no voter name has an empty one);
+* (optional) the 1v1 match vote counts, as an (number of Entries) x (number of Entries) matrix of
+    unsigned 64-bit integers (see matchmatrix.count_1v1_match_votes).
+
+All numbers are little-endian.
+"""
+
+SNAPSHOT_MAGIC = b"RANKVOTE"
+SNAPSHOT_VERSION = 2
+
+# magic, version, flags, number of Entries, number of slots, number of ballots, content hash
+_HEADER_FORMAT = "<8sIIIIQ32s"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+
+# flags marking which optional sections a snapshot contains
+_HAS_WEIGHTS = 1
+_HAS_VOTER_NAMES = 2
+_HAS_1V1_MATCH_VOTES = 4
+
+# every section starts at a multiple of this many bytes, so its numbers can be read in place
+_SECTION_ALIGNMENT = 8
+
+
+def write_snapshot(output_file_name, ballot_matrix, match_votes=None):
+    """
+    Write the given BallotMatrix to a snapshot file. If given, match_votes (where
+    match_votes[i][j] contains the number of Voters who prefer Entry i to Entry j) is written too.
+    """
+
+    flags = 0
+    if ballot_matrix.weights is not None:
+        flags |= _HAS_WEIGHTS
+    if ballot_matrix.voter_names is not None:
+        flags |= _HAS_VOTER_NAMES
+    if match_votes is not None:
+        flags |= _HAS_1V1_MATCH_VOTES
+
+    num_entries = len(ballot_matrix.entry_names)
+    num_slots = ballot_matrix.num_slots
+    num_ballots = ballot_matrix.num_ballots
+
+    with open(output_file_name, "wb") as snapshot:
+        # leave room for the header, which can only be written once the content hash is known
+        snapshot.write(bytes(_HEADER_SIZE))
+        # the hash covers the header's fields too, so corrupted counts or flags are caught
+        content_hash = hashlib.sha256(
+            _pack_header(flags, num_entries, num_slots, num_ballots, bytes(32))
+        )
+        num_bytes_written = 0
+
+        def write_section(*chunks):
+            nonlocal num_bytes_written
+            for chunk in chunks:
+                snapshot.write(chunk)
+                content_hash.update(chunk)
+                num_bytes_written += len(chunk)
+
+            padding = bytes(-num_bytes_written % _SECTION_ALIGNMENT)
+            snapshot.write(padding)
+            content_hash.update(padding)
+            num_bytes_written += len(padding)
+
+        encoded_entry_names = [entry_name.encode("utf-8") for entry_name in ballot_matrix.entry_names]
+        write_section(
+            _to_little_endian_bytes(array("I", (len(name) for name in encoded_entry_names))),
+            *encoded_entry_names
+        )
+
+        write_section(_to_little_endian_bytes(array("H", ballot_matrix.preferences)))
+
+        if flags & _HAS_WEIGHTS:
+            write_section(_to_little_endian_bytes(array("I", ballot_matrix.weights)))
+
+        if flags & _HAS_VOTER_NAMES:
+            encoded_voter_names = [
+                b"" if voter_name is None else voter_name.encode("utf-8")
+                for voter_name in ballot_matrix.voter_names
+            ]
+            offsets = array("Q", [0])
+            for name in encoded_voter_names:
+                offsets.append(offsets[-1] + len(name))
+            write_section(_to_little_endian_bytes(offsets), *encoded_voter_names)
+
+        if flags & _HAS_1V1_MATCH_VOTES:
+            write_section(_to_little_endian_bytes(
+                array("Q", (num_votes for votes in match_votes for num_votes in votes))
+            ))
+
+        snapshot.seek(0)
+        snapshot.write(
+            _pack_header(flags, num_entries, num_slots, num_ballots, content_hash.digest())
+        )
+
+
+def read_snapshot(input_file_name, verify_content_hash=True):
+    """
+    Load a snapshot file written by write_snapshot. Return a tuple of the form
+
+    (ballot_matrix, match_votes),
+
+    where match_votes is None if the snapshot doesn't contain 1v1 match vote counts.
+
+    The snapshot is memory-mapped, and the BallotMatrix's preferences, weights, and voter names are
+    read straight out of the mapping (on little-endian machines), so loading takes about as long as
+    verifying the content hash. If verify_content_hash is False, the hash isn't checked, and
+    loading takes almost no time at all.
+    """
+
+    with open(input_file_name, "rb") as snapshot:
+        data = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(data)
+    if len(view) < _HEADER_SIZE or bytes(view[:len(SNAPSHOT_MAGIC)]) != SNAPSHOT_MAGIC:
+        raise ValueError(f"{input_file_name} isn't a contest snapshot.")
+
+    magic, version, flags, num_entries, num_slots, num_ballots, content_hash = struct.unpack(
+        _HEADER_FORMAT, view[:_HEADER_SIZE]
+    )
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(
+            f"{input_file_name} is a version {version} contest snapshot,"
+            f" but only version {SNAPSHOT_VERSION} snapshots can be read."
+        )
+    if verify_content_hash:
+        expected_content_hash = hashlib.sha256(
+            _pack_header(flags, num_entries, num_slots, num_ballots, bytes(32))
+        )
+        expected_content_hash.update(view[_HEADER_SIZE:])
+        if expected_content_hash.digest() != content_hash:
+            raise ValueError(f"{input_file_name} is corrupted: its content hash doesn't match.")
+
+    offset = _HEADER_SIZE
+
+    def read_section(typecode, num_items):
+        nonlocal offset
+        item_size = array(typecode).itemsize
+        section = _from_little_endian_bytes(
+            view[offset:offset + num_items * item_size], typecode
+        )
+        offset += num_items * item_size
+        return section
+
+    def skip_padding():
+        nonlocal offset
+        offset += -(offset - _HEADER_SIZE) % _SECTION_ALIGNMENT
+
+    entry_name_lengths = read_section("I", num_entries)
+    entry_names = []
+    for length in entry_name_lengths:
+        entry_names.append(bytes(view[offset:offset + length]).decode("utf-8"))
+        offset += length
+    skip_padding()
+
+    ballot_matrix = BallotMatrix(entry_names, num_slots)
+    ballot_matrix.num_ballots = num_ballots
+    ballot_matrix.preferences = read_section("H", num_ballots * num_slots)
+    skip_padding()
+
+    if flags & _HAS_WEIGHTS:
+        ballot_matrix.weights = read_section("I", num_ballots)
+        skip_padding()
+
+    if flags & _HAS_VOTER_NAMES:
+        offsets = read_section("Q", num_ballots + 1)
+        ballot_matrix.voter_names = _SnapshotVoterNames(view[offset:offset + offsets[-1]], offsets)
+        offset += offsets[-1]
+        skip_padding()
+
+    match_votes = None
+    if flags & _HAS_1V1_MATCH_VOTES:
+        flat_match_votes = read_section("Q", num_entries * num_entries)
+        match_votes = [
+            list(flat_match_votes[i * num_entries:(i + 1) * num_entries])
+            for i in range(num_entries)
+        ]
+
+    return (ballot_matrix, match_votes)
+
+
+def is_snapshot(input_file_name):
+    """
+    Return True if the given file starts like a snapshot file and False otherwise.
+    """
+
+    with open(input_file_name, "rb") as input_file:
+        return input_file.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+
+def _pack_header(flags, num_entries, num_slots, num_ballots, content_hash):
+    """
+    Return a snapshot header with the given fields (see _HEADER_FORMAT).
+    """
+
+    return struct.pack(
+        _HEADER_FORMAT,
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        flags,
+        num_entries,
+        num_slots,
+        num_ballots,
+        content_hash
+    )
+
+
+def _to_little_endian_bytes(numbers):
+    """
+    Return the contents of the given array as little-endian bytes.
+    """
+
+    if sys.byteorder != "little":
+        numbers = array(numbers.typecode, numbers)
+        numbers.byteswap()
+
+    return numbers.tobytes()
+
+
+def _from_little_endian_bytes(data, typecode):
+    """
+    Return a read-only sequence of the little-endian numbers (of the given array typecode) in the
+    given memoryview. On little-endian machines this reads the numbers in place; otherwise, they're
+    copied into an array.
+    """
+
+    if sys.byteorder != "little":
+        numbers = array(typecode, data.tobytes())
+        numbers.byteswap()
+        return numbers
+
+    return data.cast(typecode)
+
+
+class _SnapshotVoterNames(Sequence):
+    """
+    A read-only sequence of the voter names stored in a snapshot, which decodes each name only when
+    it's accessed.
+    """
+
+
+    def __init__(self, data, offsets):
+        # the name of the voter who cast ballot b is data[offsets[b]:offsets[b + 1]]
+        self._data = data
+        self._offsets = offsets
+
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+
+    def __getitem__(self, b):
+        if isinstance(b, slice):
+            return [self[i] for i in range(*b.indices(len(self)))]
+        if b < 0:
+            b += len(self)
+        if not 0 <= b < len(self):
+            raise IndexError("voter name index out of range")
+
+        name = bytes(self._data[self._offsets[b]:self._offsets[b + 1]]).decode("utf-8")
+        return name if name else None
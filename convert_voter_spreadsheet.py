@@ -0,0 +1,26 @@
+from pathlib import Path
+
+from sparsespreadsheet import convert_voter_spreadsheet, is_sparse_spreadsheet
+
+def main():
+    input_spreadsheet_file_name = input("Enter the path to the voter data spreadsheet: ")
+
+    # convert the spreadsheet into the other format
+    sparse = not is_sparse_spreadsheet(input_spreadsheet_file_name)
+    format_name = "sparse" if sparse else "wide"
+    output_spreadsheet_file_name = f"{Path(input_spreadsheet_file_name).stem}_{format_name}.csv"
+
+    print(
+        f"Writing a {format_name} copy of {input_spreadsheet_file_name} to"
+        f" {output_spreadsheet_file_name}...",
+        end="",
+        flush=True
+    )
+
+    convert_voter_spreadsheet(input_spreadsheet_file_name, output_spreadsheet_file_name, sparse)
+
+    print(" done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import math
-import requests
-import time
 
+from ballotsource import BallotSource
+from discoursecache import DiscourseCache
+from discoursefetcher import DiscourseFetcher
 from preprocessing import create_voter_spreadsheet
 
 # In Discourse, voters.json takes in a poll and returns a list of users who voted for each option in
@@ -12,30 +13,51 @@ from preprocessing import create_voter_spreadsheet
 NUM_VOTES_PER_API_REQUEST = 50
 
 
-# how long (in seconds) to wait between API requests (to stay on good terms with the website)
-SECONDS_BETWEEN_API_REQUESTS = 3
+# The Discourse site to request vote info from, and the API path from which to request it.
+# (Requests are rate limited by the DiscourseFetcher; see discoursefetcher.py.)
+DISCOURSE_BASE_URL = "https://board.ttvchannel.com"
+DISCOURSE_VOTES_PATH = "/polls/voters.json"
 
+# The directory in which downloaded API responses are cached (see discoursecache.py), so interrupted
+# downloads can resume and spreadsheets can be rebuilt without connecting to Discourse.
+DISCOURSE_CACHE_DIRECTORY = "discourse_cache"
 
-# The URL from which to request vote info from Discourse
-DISCOURSE_VOTES_LOCATION = "https://board.ttvchannel.com/polls/voters.json"
 
-
-def get_poll_data_from_topic(topic_id, api_headers, verbose=True):
+def get_poll_data_from_topic(topic_id, fetcher, verbose=True, cache=None):
     """
-    Grab data (poll names, option ids and names, vote counts, etc.) for all of the polls in the
-    first post of the given topic. Return the JSON represening the first post.
+    Grab data (poll names, option ids and names, vote counts, etc.) for all of the polls in the
+    first post of the given topic, using the given DiscourseFetcher. Return the JSON represening the
+    first post.
+
+    If a DiscourseCache is given, the data is saved to it. If fetcher is None, the data is read from
+    the cache instead.
 
     Note this output does not include the actual users who voted in each poll.
     """
 
-    topic_url = "https://board.ttvchannel.com/t/" + topic_id + ".json"
+    if fetcher is None:
+        first_post = cache.get_post(topic_id)
+        if first_post is None:
+            raise ValueError(f"The poll data for topic {topic_id} isn't in the download cache.")
+
+        if verbose:
+            print(
+                f"Found {len(first_post['polls'])} polls"
+                f" in the first post of topic {topic_id} (in the download cache)."
+            )
+
+        return first_post
+
+    topic_path = f"/t/{topic_id}.json"
 
     if verbose:
-        print(f"Fetching poll data from {topic_url}....", end="", flush=True)
+        print(f"Fetching poll data from {fetcher.base_url}{topic_path}....", end="", flush=True)
 
-    topic = requests.get(topic_url, headers=api_headers).json()
+    topic = fetcher.get_json(topic_path)
 
     first_post = topic["post_stream"]["posts"][0]
+    if cache is not None:
+        cache.save_post(topic_id, first_post)
 
     if verbose:
         print(" done." )
@@ -47,108 +69,321 @@ def get_poll_data_from_topic(topic_id, api_headers, verbose=True):
     return first_post
 
 
-def get_voter_dictionary(post, api_headers, verbose=True):
+def get_voter_pages(post, fetcher, verbose=True, cache=None):
+    """
+    Grab the pages of voters of all of the given poll data (produced by get_poll_data_from_topic),
+    using the given DiscourseFetcher.
+    Return a dictionary of lists of users keyed by page, where users_by_page[(p, o, n)] contains
+    the users listed on page n of the voters for option o of poll p. (get_voter_dictionary and
+    get_ballot_source turn this into votes.)
+
+    Each page of a poll's voters lists up to NUM_VOTES_PER_API_REQUEST voters for each of its
+    options. Once only one of a poll's options has voters left to fetch, the rest of that option's
+    voters are requested on their own, so a poll with one dominant option doesn't cost a request for
+    every one of its pages. Fetching stops as soon as every option's voters have come back short.
+    The first page of every poll is fetched concurrently, then the second page of every poll that
+    needs one, and so on.
+
+    If a DiscourseCache is given, each page is saved to it as soon as it's fetched, and pages that
+    are already cached (and whose polls' vote counts haven't changed since) aren't fetched again.
+    If fetcher is None, every page is read from the cache instead.
+
+    NOTE: This method assumes that each poll corresponds to a particular ranking and that entries
+    are listed in the same order across all polls.
+
+    NOTE: This method assumes that the poll for rank i is titled poll_i.
+    """
+
+    if verbose:
+        print("Fetching vote data...")
+
+    polls = post["polls"]
+
+    # Grab the users who voted for each option, in batches of size NUM_VOTES_PER_API_REQUEST at a
+    # time (that's the upper limit batch size enforced by the API).
+    # num_pages_by_option[(p, o)] contains the number of pages of voters that option o of poll p
+    # should have, going by its vote count
+    num_pages_by_option = {}
+    # the number of requests that fetching every page of every poll (up to the page count of its
+    # most popular option) would take, to measure how many requests this method saves
+    num_requests_in_full_plan = 0
+
+    for poll_index, poll in enumerate(polls):
+        for option_index, option in enumerate(poll["options"]):
+            num_pages_by_option[(poll_index, option_index)] = math.ceil(
+                option["votes"] / NUM_VOTES_PER_API_REQUEST
+            )
+
+        max_num_votes_to_collect = max(option["votes"] for option in poll["options"])
+        num_requests_in_full_plan += math.ceil(max_num_votes_to_collect / NUM_VOTES_PER_API_REQUEST)
+
+    def get_page_to_fetch(poll_index, option_indexes, page):
+        """
+        Return the (poll index, option index, page number) tuple identifying the next page of voters
+        to fetch for the given options of the given poll, where an option index of None means every
+        option, or None if there are no options left to fetch.
+        """
+
+        if len(option_indexes) == 0:
+            return None
+        if len(option_indexes) == 1:
+            return (poll_index, option_indexes[0], page)
+        return (poll_index, None, page)
+
+    # Start with the first page of every poll.
+    pages_to_fetch = []
+    for poll_index, poll in enumerate(polls):
+        page_to_fetch = get_page_to_fetch(
+            poll_index,
+            [
+                option_index for option_index in range(len(poll["options"]))
+                if num_pages_by_option[(poll_index, option_index)] > 0
+            ],
+            1
+        )
+        if page_to_fetch is not None:
+            pages_to_fetch.append(page_to_fetch)
+
+    def get_request(page_to_fetch):
+        poll_index, option_index, page = page_to_fetch
+        params = {
+            "post_id": post["id"],
+            "poll_name": polls[poll_index]["name"],
+            "limit": NUM_VOTES_PER_API_REQUEST,
+            "page": page
+        }
+        if option_index is not None:
+            # only ask for this option's voters
+            params["option_id"] = polls[poll_index]["options"][option_index]["id"]
+        return (DISCOURSE_VOTES_PATH, params)
+
+    def get_cache_key(page_to_fetch):
+        poll_index, option_index, page = page_to_fetch
+        poll = polls[poll_index]
+        option_id = None if option_index is None else poll["options"][option_index]["id"]
+        return (post["id"], poll, option_id, page)
+
+    # users_by_page[(p, o, n)] contains the users listed on page n of the voters for option o of
+    # poll p
+    users_by_page = {}
+    num_requests = 0
+    num_cached_pages = 0
+
+    while pages_to_fetch:
+        # vote_batches_by_page[p] contains the response for page p (see get_page_to_fetch)
+        vote_batches_by_page = {}
+        if cache is not None:
+            for page_to_fetch in pages_to_fetch:
+                vote_batch = cache.get_page(*get_cache_key(page_to_fetch))
+                if vote_batch is not None:
+                    vote_batches_by_page[page_to_fetch] = vote_batch
+            num_cached_pages += len(vote_batches_by_page)
+
+        uncached_pages_to_fetch = [
+            page_to_fetch for page_to_fetch in pages_to_fetch
+            if page_to_fetch not in vote_batches_by_page
+        ]
+        if fetcher is None and uncached_pages_to_fetch:
+            raise ValueError(
+                f"{len(uncached_pages_to_fetch)} pages of votes aren't in the download cache"
+                " (or their polls' vote counts have changed since they were cached)."
+            )
+
+        def save_page(i, response_json):
+            page_to_fetch = uncached_pages_to_fetch[i]
+            if cache is not None:
+                cache.save_page(*get_cache_key(page_to_fetch), response_json)
+
+            if verbose:
+                poll_index, option_index, page = page_to_fetch
+                poll = polls[poll_index]
+                if option_index is None:
+                    print(f"\tFetched page {page} of votes in poll {poll['name']}.")
+                else:
+                    print(
+                        f"\tFetched page {page} of votes for option"
+                        f" {poll['options'][option_index]['html']} in poll {poll['name']}."
+                    )
+
+        if uncached_pages_to_fetch:
+            vote_batches = fetcher.get_all_json(
+                [get_request(page_to_fetch) for page_to_fetch in uncached_pages_to_fetch],
+                callback=save_page
+            )
+            vote_batches_by_page.update(zip(uncached_pages_to_fetch, vote_batches))
+            num_requests += len(uncached_pages_to_fetch)
+
+        next_pages_to_fetch = []
+        for page_to_fetch in pages_to_fetch:
+            poll_index, fetched_option_index, page = page_to_fetch
+            vote_batch = vote_batches_by_page[page_to_fetch]
+            poll = polls[poll_index]
+            if fetched_option_index is None:
+                fetched_option_indexes = range(len(poll["options"]))
+            else:
+                fetched_option_indexes = [fetched_option_index]
+
+            # the options that should have more voters than this page listed
+            option_indexes_left = []
+            for option_index in fetched_option_indexes:
+                users = vote_batch["voters"].get(poll["options"][option_index]["id"], [])
+                if len(users) > 0:
+                    users_by_page[(poll_index, option_index, page)] = users
+
+                # A page that comes back short is the option's last one, even if its vote count
+                # says otherwise (for instance, if votes were withdrawn after the poll data was
+                # fetched).
+                if (
+                    len(users) == NUM_VOTES_PER_API_REQUEST
+                    and page < num_pages_by_option[(poll_index, option_index)]
+                ):
+                    option_indexes_left.append(option_index)
+
+            page_to_fetch = get_page_to_fetch(poll_index, option_indexes_left, page + 1)
+            if page_to_fetch is not None:
+                next_pages_to_fetch.append(page_to_fetch)
+
+        pages_to_fetch = next_pages_to_fetch
+
+    if verbose:
+        print(
+            f"Done fetching vote data ({num_requests} requests and {num_cached_pages} cached pages;"
+            f" fetching every page of every poll would have taken {num_requests_in_full_plan}"
+            f" requests, so {num_requests_in_full_plan - num_requests} requests were saved)."
+        )
+
+    return users_by_page
+
+
+def get_voter_dictionary(post, fetcher, verbose=True, cache=None):
     """
-    Grab the voter data from all of the given poll data (produced by get_poll_data_from_topic).
+    Grab the voter data from all of the given poll data (produced by get_poll_data_from_topic),
+    using the given DiscourseFetcher (see get_voter_pages).
     Return the data as a dictionary of user votes keyed by username.
     Each vote is a dictionary of rankings (numbers) keyed by entry name.
     So, the voter dictionary follows this format:
     votes[username][entry_name] = ranking
 
+    If a DiscourseCache is given, it's used as in get_voter_pages.
+
     NOTE: This method assumes that each poll corresponds to a particular ranking and that entries
     are listed in the same order across all polls.
 
     NOTE: This method assumes that the poll for rank i is titled poll_i.
     """
 
+    users_by_page = get_voter_pages(post, fetcher, verbose, cache)
+
     if verbose:
-        print("Fetching and processing vote data...")
+        print("Processing it...", end="", flush=True)
 
     votes = {}
+    for username, entry_name, ranking in _get_votes_from_pages(post["polls"], users_by_page):
+        if username not in votes:
+            votes[username] = {}
 
-    for poll_index, poll in enumerate(post["polls"]):
+        votes[username][entry_name] = ranking
 
-        # In the i-th poll (indexed from 1), users vote for which entry should get ranking i.
-        # For instance, in the 3st poll users assign ranking 3 to an entry (users pick their
-        # 3rd-favorite entry).
-        # This assumes that the poll for ranking i has its name attribute set to poll_i.
-        ranking = int(poll["name"][5:])
+    if verbose:
+        print(" done.")
 
-        # In each poll, users select one entry. Each option in the poll corresponds to a particular
-        # entry.
-        # entry_names_keyed_by_id contains the names of the contest entries, each keyed by the id of
-        # their option in this particular poll.
-        entry_names_keyed_by_id = {}
-        for option in poll["options"]:
-            entry_names_keyed_by_id[option["id"]] = option["html"]
+    return votes
 
-        # Grab the users who voted for each option, in batches of size NUM_VOTES_PER_API_REQUEST
-        # at a time (that's the upper limit batch size enforced by the API).
 
-        # the most votes that any of the poll's options received
-        max_num_votes_to_collect = max(option["votes"] for option in poll["options"])
-        # the amount of API requests it takes to gather max_num_votes_to_collect votes in batches of
-        # size NUM_VOTES_PER_API_REQUEST
-        num_api_requests = math.ceil(max_num_votes_to_collect / NUM_VOTES_PER_API_REQUEST)
+def get_ballot_source(post, fetcher, verbose=True, cache=None):
+    """
+    Return a BallotSource (see ballotsource.py) yielding the ballots cast in all of the given poll
+    data (produced by get_poll_data_from_topic), so a Contest can be populated from them without a
+    votes dictionary or a voter spreadsheet (see Contest.populate_from_ballot_source).
+    The votes are fetched (see get_voter_pages) once the ballots are first read.
 
-        if verbose:
-            print(
-                f"\tPoll {poll['name']} (poll {poll_index + 1}/{len(post['polls'])},"
-                f" where users vote for ranking {ranking})"
-            )
+    The BallotSource's entries are the options of the first poll. Voters appear in the same order as
+    in get_voter_dictionary, and votes for options that aren't in the first poll are dropped, as
+    preprocessing.create_voter_spreadsheet drops them.
 
-        for i in range(num_api_requests):
-            params = {
-                "post_id": post["id"],
-                "poll_name": poll["name"],
-                "limit": NUM_VOTES_PER_API_REQUEST,
-                "page": i + 1
-            }
+    NOTE: Each poll lists the voters of one ranking, so a voter's ballot isn't complete until every
+    page has been fetched. The pages are all held in memory until the ballots have been read.
+    """
 
-            if verbose:
-                print(f"\t\tFetching vote data from {DISCOURSE_VOTES_LOCATION}...",
-                    end="", flush=True)
+    polls = post["polls"]
+    entry_names = [option["html"] for option in polls[0]["options"]]
 
-            vote_batch = requests.get(DISCOURSE_VOTES_LOCATION,
-                headers=api_headers, params=params).json()["voters"]
+    def get_ballots():
+        users_by_page = get_voter_pages(post, fetcher, verbose, cache)
 
-            if verbose:
-                print(" processing data...", end="", flush=True)
+        # entry_indexes[n] contains the index of the entry named n
+        entry_indexes = {entry_name: i for i, entry_name in enumerate(entry_names)}
+        # votes_by_username[u] contains the rankings of user u, keyed by entry index
+        votes_by_username = {}
+        for username, entry_name, ranking in _get_votes_from_pages(polls, users_by_page):
+            if username not in votes_by_username:
+                votes_by_username[username] = {}
 
-            for option_id, users in vote_batch.items():
-                entry_name = entry_names_keyed_by_id[option_id]
+            if entry_name in entry_indexes:
+                votes_by_username[username][entry_indexes[entry_name]] = ranking
 
-                for user in users:
-                    username = user["username"]
-                    if username not in votes:
-                        votes[username] = {}
+        # the pages aren't needed any more
+        users_by_page.clear()
 
-                    votes[username][entry_name] = ranking
+        yield from votes_by_username.items()
 
-            if verbose:
-                print(" done.")
+    return BallotSource(entry_names, get_ballots(), len(polls))
 
-            time.sleep(SECONDS_BETWEEN_API_REQUESTS)
 
-    if verbose:
-        print("Done fetching and processing vote data.")
+def _get_votes_from_pages(polls, users_by_page):
+    """
+    Yield a (username, entry name, ranking) tuple for every vote on the given pages of voters (see
+    get_voter_pages) of the given polls.
+    """
 
-    return votes
+    # Process the pages in poll order, then page order, then option order, so users are added to
+    # votes in the same order as if every page of every poll had been fetched.
+    for page_to_fetch in sorted(users_by_page, key=lambda p: (p[0], p[2], p[1])):
+        poll_index, option_index, page = page_to_fetch
+        poll = polls[poll_index]
 
+        # In the i-th poll (indexed from 1), users vote for which entry should get ranking i.
+        # For instance, in the 3st poll users assign ranking 3 to an entry (users pick their
+        # 3rd-favorite entry).
+        # This assumes that the poll for ranking i has its name attribute set to poll_i.
+        ranking = int(poll["name"][5:])
 
-def main():
-    with open("api_credentials.txt") as token_file:
-        api_key, api_username = token_file.read().split()
+        # In each poll, users select one entry. Each option in the poll corresponds to a particular
+        # entry.
+        entry_name = poll["options"][option_index]["html"]
+
+        for user in users_by_page[page_to_fetch]:
+            yield (user["username"], entry_name, ranking)
 
-    api_headers = {"Api-Key": api_key, "Api_Username": api_username}
 
+def main():
     topic_id = input("Enter the topic's id: ")
     output_spreadsheet_file_name = f"raw_vote_data_topic_{topic_id}.csv"
-    post = get_poll_data_from_topic(topic_id, api_headers)
-    votes = get_voter_dictionary(post, api_headers)
+    cache = DiscourseCache(DISCOURSE_CACHE_DIRECTORY)
+
+    if cache.get_post(topic_id) is not None and input(
+        "This topic's votes have been downloaded before. Rebuild the spreadsheet from the download"
+        " cache without connecting to Discourse? (y/n): "
+    ).strip().lower().startswith("y"):
+        post = get_poll_data_from_topic(topic_id, None, cache=cache)
+        votes = get_voter_dictionary(post, None, cache=cache)
+    else:
+        with open("api_credentials.txt") as token_file:
+            api_key, api_username = token_file.read().split()
+
+        api_headers = {"Api-Key": api_key, "Api_Username": api_username}
+
+        with DiscourseFetcher(DISCOURSE_BASE_URL, api_headers) as fetcher:
+            post = get_poll_data_from_topic(topic_id, fetcher, cache=cache)
+            votes = get_voter_dictionary(post, fetcher, cache=cache)
+
     entry_names = [option["html"] for option in post["polls"][0]["options"]]
 
-    create_voter_spreadsheet(votes, entry_names, output_spreadsheet_file_name)
+    sparse = input(
+        "Write a sparse spreadsheet, with one row per vote instead of one column per entry? (y/n): "
+    ).strip().lower().startswith("y")
+
+    create_voter_spreadsheet(votes, entry_names, output_spreadsheet_file_name, sparse=sparse)
 
 
 if __name__ == "__main__":
@@ -1,30 +1,26 @@
 import csv
 from pathlib import Path
 
+from ballotsource import BallotSource
 from preprocessing import create_voter_spreadsheet
 
-def get_votes_dictionary_and_entry_names(input_file_name, verbose=True):
+def get_ballot_source(input_file_name, verbose=True):
     """
-    Grab the voter data from the given spreadsheet and return a tuple of the form
+    Return a BallotSource (see ballotsource.py) streaming the ballots in the given spreadsheet, one
+    row at a time, so a Contest can be populated from it without a votes dictionary or a voter
+    spreadsheet (see Contest.populate_from_ballot_source).
 
-    (votes, entry_names).
-
-    where entry_names is a set of the names of all entries that received at least one vote
-    and votes is a dictionary containing votes stored in the form
-
-    votes[voter_id][entry_name] = ranking,
-
-    where each voter is identified by a voter_id (row number and timestamp).
+    The BallotSource's entries are the entries that received at least one vote, in the order they
+    first appear in the spreadsheet. Finding them takes a quick first pass over the spreadsheet, so
+    the ballots never have to be held in memory. Each voter is identified by their row number and
+    timestamp, and if a voter picked the same entry for several rankings, only the last one is kept.
 
     NOTE: This method assumes that the poll for rank i is question i in the spreadsheet
     (indexed from 1).
     """
 
-    if verbose:
-        print("Processing vote data...")
-
-    votes = {}
-    entry_names = set()
+    # the entry names, in order of first appearance, as the keys of a dictionary
+    entry_names = {}
 
     with open(input_file_name, "r", newline="") as spreadsheet:
         reader = csv.reader(spreadsheet, delimiter=",")
@@ -32,21 +28,63 @@ def get_votes_dictionary_and_entry_names(input_file_name, verbose=True):
         # leftmost column (column 0) contains timestamp, and all others contain rankings
         num_rankings = len(next(reader)) - 1
 
-        for i, row in enumerate(reader):
-            voter_id = f"Voter {i + 1} ({row[0]})"
-            votes[voter_id] = {}
+        for row in reader:
+            for entry_name in row[1:num_rankings + 1]:
+                if entry_name:
+                    entry_names.setdefault(entry_name, len(entry_names))
 
-            for ranking in range(1, num_rankings + 1):
-                entry_name = row[ranking]
+    def get_ballots():
+        if verbose:
+            print("Processing vote data...")
 
-                if entry_name:
-                    entry_names.add(entry_name)
-                    votes[voter_id][entry_name] = ranking
+        with open(input_file_name, "r", newline="") as spreadsheet:
+            reader = csv.reader(spreadsheet, delimiter=",")
+            next(reader)
+
+            for i, row in enumerate(reader):
+                voter_id = f"Voter {i + 1} ({row[0]})"
+                votes = {}
+
+                for ranking in range(1, num_rankings + 1):
+                    entry_name = row[ranking]
+
+                    if entry_name:
+                        votes[entry_names[entry_name]] = ranking
 
-    if verbose:
-        print("Done processing vote data.")
+                yield (voter_id, votes)
 
-    return (votes, list(entry_names))
+        if verbose:
+            print("Done processing vote data.")
+
+    return BallotSource(list(entry_names), get_ballots(), num_rankings)
+
+
+def get_votes_dictionary_and_entry_names(input_file_name, verbose=True):
+    """
+    Grab the voter data from the given spreadsheet and return a tuple of the form
+
+    (votes, entry_names).
+
+    where entry_names is a list of the names of all entries that received at least one vote
+    (in the order they first appear) and votes is a dictionary containing votes stored in the form
+
+    votes[voter_id][entry_name] = ranking,
+
+    where each voter is identified by a voter_id (row number and timestamp).
+
+    NOTE: This method assumes that the poll for rank i is question i in the spreadsheet
+    (indexed from 1).
+    """
+
+    ballot_source = get_ballot_source(input_file_name, verbose)
+    entry_names = ballot_source.entry_names
+
+    votes = {
+        voter_id: {entry_names[i]: ranking for i, ranking in voter_votes.items()}
+        for voter_id, voter_votes in ballot_source
+    }
+
+    return (votes, entry_names)
 
 
 def main():
@@ -54,7 +92,11 @@ def main():
     output_spreadsheet_file_name = f"raw_vote_data_{Path(input_spreadsheet_file_name).stem}.csv"
     votes, entry_names = get_votes_dictionary_and_entry_names(input_spreadsheet_file_name)
 
-    create_voter_spreadsheet(votes, entry_names, output_spreadsheet_file_name)
+    sparse = input(
+        "Write a sparse spreadsheet, with one row per vote instead of one column per entry? (y/n): "
+    ).strip().lower().startswith("y")
+
+    create_voter_spreadsheet(votes, entry_names, output_spreadsheet_file_name, sparse=sparse)
 
 
 if __name__ == "__main__":
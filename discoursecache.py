@@ -0,0 +1,106 @@
+import json
+import os
+import time
+
+"""
+Helpers for keeping the Discourse API responses that create_voter_spreadsheet_discourse.py
+downloads on disk, so a download that crashes or gets rate limited partway through can pick up
+where it stopped, and a spreadsheet can be rebuilt later without connecting to Discourse at all.
+
+A cache is a directory holding one JSON file per response. Each file records when its response was
+fetched. Each page of voters also records the vote counts of its poll when it was fetched, so it's
+only reused while those vote counts stay the same; once anyone votes in a poll, that poll's pages
+are downloaded again, but every other poll's pages are still read from the cache.
+"""
+
+
+class DiscourseCache():
+    """
+    A DiscourseCache stores topics' poll data and pages of poll voters in the given directory.
+    """
+
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+
+    def get_post(self, topic_id):
+        """
+        Return the cached poll data for the given topic (as returned by
+        create_voter_spreadsheet_discourse.get_poll_data_from_topic), or None if it isn't cached.
+        """
+
+        cached = self._read(self._get_topic_file_name(topic_id))
+        return None if cached is None else cached["post"]
+
+
+    def save_post(self, topic_id, post):
+        """
+        Cache the given poll data for the given topic.
+        """
+
+        self._write(self._get_topic_file_name(topic_id), {"fetched_at": time.time(), "post": post})
+
+
+    def get_page(self, post_id, poll, option_id, page):
+        """
+        Return the cached response for the given page of voters of the given poll (as found in a
+        post's poll data) in the given post, or None if it isn't cached or the poll's vote counts
+        have changed since it was fetched. option_id is the id of the option whose voters the page
+        lists, or None if it lists every option's voters.
+        """
+
+        cached = self._read(self._get_page_file_name(post_id, poll["name"], option_id, page))
+        if cached is None or cached["vote_counts"] != _get_vote_counts(poll):
+            return None
+
+        return cached["response"]
+
+
+    def save_page(self, post_id, poll, option_id, page, response):
+        """
+        Cache the given response for the given page of voters (see get_page).
+        """
+
+        self._write(
+            self._get_page_file_name(post_id, poll["name"], option_id, page),
+            {"fetched_at": time.time(), "vote_counts": _get_vote_counts(poll), "response": response}
+        )
+
+
+    def _get_topic_file_name(self, topic_id):
+        return os.path.join(self.directory, f"topic-{topic_id}.json")
+
+
+    def _get_page_file_name(self, post_id, poll_name, option_id, page):
+        option = "all" if option_id is None else f"option-{option_id}"
+        return os.path.join(self.directory, f"post-{post_id}-{poll_name}-{option}-page-{page}.json")
+
+
+    def _read(self, file_name):
+        """
+        Return the JSON in the given file, or None if the file doesn't exist or is incomplete.
+        """
+
+        try:
+            with open(file_name) as cache_file:
+                return json.load(cache_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+
+    def _write(self, file_name, contents):
+        # write to a temporary file first, so an interrupted write never leaves half a file behind
+        temporary_file_name = f"{file_name}.{os.getpid()}.tmp"
+        with open(temporary_file_name, "w") as cache_file:
+            json.dump(contents, cache_file)
+        os.replace(temporary_file_name, file_name)
+
+
+def _get_vote_counts(poll):
+    """
+    Return the number of votes received by each option of the given poll, keyed by option id.
+    """
+
+    return {option["id"]: option["votes"] for option in poll["options"]}
@@ -0,0 +1,219 @@
+import email.utils
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+"""
+Helpers for fetching JSON from the Discourse API quickly without upsetting the server: requests share
+one pooled HTTP session, run several at a time, and are spaced out by a token bucket rather than a
+fixed sleep. Responses asking us to slow down (HTTP 429, with or without a Retry-After header) pause
+every request until the server is ready again.
+"""
+
+# by default, how many requests per second to make on average (Discourse allows 60 admin API
+# requests per minute by default)
+DEFAULT_MAX_REQUESTS_PER_SECOND = 1
+# by default, how many requests can be made back to back before the average rate kicks in
+DEFAULT_MAX_REQUEST_BURST = 5
+# by default, how many requests can be in flight at once
+DEFAULT_NUM_CONCURRENT_REQUESTS = 4
+# by default, how many times to retry a request that failed in a way that might be temporary
+DEFAULT_MAX_NUM_RETRIES = 5
+
+# how long (in seconds) to wait for the server to respond before giving up on a request
+REQUEST_TIMEOUT_SECONDS = 30
+# how long (in seconds) to wait before the first retry of a failed request, if the server doesn't
+# say; each further retry waits twice as long, up to MAX_RETRY_DELAY_SECONDS
+BASE_RETRY_DELAY_SECONDS = 2
+MAX_RETRY_DELAY_SECONDS = 120
+
+# HTTP status codes that mean a request might succeed if it's retried later
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+
+class TokenBucket():
+    """
+    A TokenBucket limits how often something happens: up to capacity times back to back, and rate
+    times per second on average. It's safe to share between threads.
+    """
+
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+
+        self._num_tokens = capacity
+        self._last_refill_time = time.monotonic()
+        # no tokens are handed out before this time (see pause)
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+
+    def acquire(self):
+        """
+        Take a token from the bucket, waiting until one is available.
+        """
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._num_tokens = min(
+                    self.capacity, self._num_tokens + (now - self._last_refill_time) * self.rate
+                )
+                self._last_refill_time = now
+
+                if now < self._paused_until:
+                    seconds_to_wait = self._paused_until - now
+                elif self._num_tokens >= 1:
+                    self._num_tokens -= 1
+                    return
+                else:
+                    seconds_to_wait = (1 - self._num_tokens) / self.rate
+
+            time.sleep(seconds_to_wait)
+
+
+    def pause(self, seconds):
+        """
+        Hand out no tokens for the given number of seconds, and empty the bucket so requests resume
+        gradually afterwards.
+        """
+
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._num_tokens = 0
+
+
+class DiscourseFetcher():
+    """
+    A DiscourseFetcher fetches JSON from a Discourse site's API, authenticated with the given API
+    headers.
+    """
+
+
+    def __init__(
+        self,
+        base_url,
+        api_headers,
+        max_requests_per_second=DEFAULT_MAX_REQUESTS_PER_SECOND,
+        max_request_burst=DEFAULT_MAX_REQUEST_BURST,
+        num_concurrent_requests=DEFAULT_NUM_CONCURRENT_REQUESTS,
+        max_num_retries=DEFAULT_MAX_NUM_RETRIES
+    ):
+        # the site's URL, without a trailing slash (for example, https://board.ttvchannel.com)
+        self.base_url = base_url.rstrip("/")
+        self.num_concurrent_requests = num_concurrent_requests
+        self.max_num_retries = max_num_retries
+
+        # one session, with enough pooled connections for every concurrent request, so connections
+        # are reused rather than opened for every request
+        self._session = requests.Session()
+        self._session.headers.update(api_headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=num_concurrent_requests)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+        self._rate_limiter = TokenBucket(max_requests_per_second, max_request_burst)
+
+        # the number of requests made so far, including retries
+        self.num_requests = 0
+        self._num_requests_lock = threading.Lock()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.close()
+
+
+    def close(self):
+        """
+        Close the DiscourseFetcher's HTTP connections.
+        """
+
+        self._session.close()
+
+
+    def get_json(self, path, params=None):
+        """
+        Request the given path (for example, /polls/voters.json) with the given query parameters,
+        and return the JSON response. Requests that fail in ways that might be temporary are retried
+        up to self.max_num_retries times, after waiting as long as the server asks (or, if it
+        doesn't say, an exponentially growing delay).
+        """
+
+        url = self.base_url + path
+
+        for num_retries in range(self.max_num_retries + 1):
+            self._rate_limiter.acquire()
+            with self._num_requests_lock:
+                self.num_requests += 1
+
+            try:
+                response = self._session.get(url, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
+            except (requests.ConnectionError, requests.Timeout):
+                if num_retries == self.max_num_retries:
+                    raise
+                time.sleep(_get_retry_delay(None, num_retries))
+                continue
+
+            if response.status_code in RETRYABLE_STATUS_CODES and num_retries < self.max_num_retries:
+                retry_delay = _get_retry_delay(response, num_retries)
+                if response.status_code == 429:
+                    # the server is rate limiting us, so slow down every request, not just this one
+                    self._rate_limiter.pause(retry_delay)
+                else:
+                    time.sleep(retry_delay)
+                continue
+
+            response.raise_for_status()
+            return response.json()
+
+
+    def get_all_json(self, requests_to_make, callback=None):
+        """
+        Make several requests concurrently. requests_to_make is a list of (path, params) tuples.
+        Return a list of their JSON responses, in the same order.
+        If given, callback is called as callback(i, response_json) as each request i finishes.
+        """
+
+        def make_request(i):
+            path, params = requests_to_make[i]
+            response_json = self.get_json(path, params)
+            if callback is not None:
+                callback(i, response_json)
+            return response_json
+
+        with ThreadPoolExecutor(max_workers=self.num_concurrent_requests) as executor:
+            return list(executor.map(make_request, range(len(requests_to_make))))
+
+
+def _get_retry_delay(response, num_retries):
+    """
+    Return how long (in seconds) to wait before retrying a request that got the given response (or
+    None if it got no response) after being retried num_retries times.
+    """
+
+    if response is not None and "Retry-After" in response.headers:
+        retry_after = response.headers["Retry-After"]
+        try:
+            return min(MAX_RETRY_DELAY_SECONDS, max(0, float(retry_after)))
+        except ValueError:
+            pass
+        try:
+            # Retry-After can also be an HTTP date
+            retry_time = email.utils.parsedate_to_datetime(retry_after)
+            return min(MAX_RETRY_DELAY_SECONDS, max(0, retry_time.timestamp() - time.time()))
+        except (TypeError, ValueError):
+            # the header is malformed, so ignore it
+            pass
+
+    # back off exponentially, with some jitter so concurrent requests don't retry in lockstep
+    delay = min(MAX_RETRY_DELAY_SECONDS, BASE_RETRY_DELAY_SECONDS * 2 ** num_retries)
+    return delay * random.uniform(0.5, 1)
@@ -0,0 +1,106 @@
+"""
+Helper functions for finding dominating sets of Entries from the results of their 1v1 matches.
+
+A dominating set is a non-empty subset of Entries with a special property: if you take two
+Entries, one that's in the set and one that's not, then the one in the set would win in a 1v1
+match.
+"""
+
+def get_smallest_dominating_set(entries, min_size):
+    """
+    Given a list of Entries (whose remaining_beatable_1v1_match_opponents have been filled in),
+    return a list of the Entries in the smallest dominating set among them that contains at least
+    min_size Entries.
+
+    Consider the graph with an edge from Entry a to Entry b whenever b would not beat a in a 1v1
+    match. A set is dominating exactly when no edge enters it from outside. Every pair of Entries
+    has an edge in at least one direction, so condensing the graph's strongly connected components
+    orders them in a line, and the dominating sets are exactly the prefixes of that line. So the
+    answer is the shortest prefix with at least min_size Entries.
+    This takes O(n^2) time for n Entries.
+    """
+
+    def has_edge(a, b):
+        return entries[a] not in entries[b].remaining_beatable_1v1_match_opponents
+
+    components = _get_strongly_connected_components(len(entries), has_edge)
+
+    # Tarjan's algorithm finds the components in reverse topological order, so the components that
+    # no edge enters come last
+    dominating_set = []
+    for component in reversed(components):
+        dominating_set += [entries[i] for i in component]
+        if len(dominating_set) >= min_size:
+            break
+
+    return dominating_set
+
+
+def _get_strongly_connected_components(num_vertices, has_edge):
+    """
+    Return the strongly connected components of the directed graph with the given number of
+    vertices, where has_edge(a, b) is True if there's an edge from vertex a to vertex b.
+    Each component is a list of vertices, and the components are listed in reverse topological
+    order.
+
+    This is Tarjan's algorithm, run iteratively so that large graphs don't hit Python's recursion
+    limit.
+    """
+
+    # index[v] contains the order in which vertex v was discovered, or None if it hasn't been
+    index = [None] * num_vertices
+    # lowlink[v] contains the smallest index of any vertex known to be reachable from v that's still
+    # on the stack
+    lowlink = [0] * num_vertices
+    on_stack = [False] * num_vertices
+    stack = []
+    components = []
+    next_index = 0
+
+    for root in range(num_vertices):
+        if index[root] is not None:
+            continue
+
+        index[root] = lowlink[root] = next_index
+        next_index += 1
+        stack.append(root)
+        on_stack[root] = True
+
+        # each frame contains a vertex and the next vertex to check for an edge to
+        work = [[root, 0]]
+        while work:
+            frame = work[-1]
+            v = frame[0]
+
+            if frame[1] < num_vertices:
+                w = frame[1]
+                frame[1] += 1
+
+                if w == v or not has_edge(v, w):
+                    continue
+
+                if index[w] is None:
+                    index[w] = lowlink[w] = next_index
+                    next_index += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append([w, 0])
+                elif on_stack[w]:
+                    lowlink[v] = min(lowlink[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[v])
+
+                if lowlink[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(component)
+
+    return components
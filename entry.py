@@ -1,12 +1,27 @@
 class Entry:
     """
-    An Entry into a Contest has a name and a group of Voters who voted for it.
+    An Entry into a Contest has a name and the BallotGroups of Voters who voted for it.
     """
 
 
-    def __init__(self, name):
+    def __init__(self, name, id):
         self.name = name
-        self.instant_runoff_voters = []
+        # the Entry's index in its Contest's list of Entries
+        self.id = id
+        self.reset_count()
+
+
+    def reset_count(self):
+        """
+        Forget everything that counting a Contest recorded in the Entry, so the Contest can be
+        counted again (for instance, after more Voters have been added to it).
+        """
+
+        # the BallotGroups currently backing the Entry, stored as the keys of a dictionary (with
+        # values of None) so that they stay in insertion order but can be removed in constant time
+        self.instant_runoff_ballot_groups = {}
+        # the total weight (number of Voters) of self.instant_runoff_ballot_groups
+        self.num_instant_runoff_voters = 0
         # still_in_race is False once the entry has removed from the polls (when it has either
         # gotten enough wins to guarantee a win, or when it has been eliminated since it's in last
         # place)
@@ -20,6 +35,7 @@ class Entry:
         # the Entry's Borda count if currently tied for last place, and None otherwise
         self.borda_count = None
 
+
     @property
     def still_in_race(self):
         return not (self.has_won or self.has_lost)
\ No newline at end of file
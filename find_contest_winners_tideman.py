@@ -1,9 +1,13 @@
+from contestsnapshot import is_snapshot
 from tidemancontest import TidemanContest
 
 def main():
-    input_file_name = input("Enter the path to the voting data spreadsheet (made by one of the create_voter_spreadsheet scripts): ")
+    input_file_name = input("Enter the path to the voting data spreadsheet (made by one of the create_voter_spreadsheet scripts) or contest snapshot: ")
     contest = TidemanContest()
-    contest.populate_from_spreadsheet(input_file_name)
+    if is_snapshot(input_file_name):
+        contest.populate_from_snapshot(input_file_name)
+    else:
+        contest.populate_from_spreadsheet(input_file_name)
     output_file_name_prefix = input("Enter the prefix that the output spreadsheets will start with: ")
     num_winners = int(input("Enter the desired number of winners for the contest: "))
     contest.get_winners(num_winners, output_file_name_prefix)
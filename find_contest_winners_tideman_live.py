@@ -0,0 +1,22 @@
+import time
+
+from tidemancontest import TidemanContest
+
+def main():
+    input_file_name = input("Enter the path to the voting data spreadsheet (made by one of the create_voter_spreadsheet scripts), which will be checked for new rows as voting continues: ")
+    num_winners = int(input("Enter the desired number of winners for the contest: "))
+    seconds_between_checks = float(input("Enter how many seconds to wait between checks for new votes: "))
+
+    # the spreadsheets for every count would pile up, so counts only print their winners
+    contest = TidemanContest(verbose=False)
+    while True:
+        num_new_voters = contest.add_voters_from_new_spreadsheet_rows(input_file_name)
+        if num_new_voters > 0 and len(contest.entries) > num_winners:
+            print(f"Counting {len(contest.voters)} voters ({num_new_voters} new)...")
+            contest.get_winners(num_winners, None)
+
+        time.sleep(seconds_between_checks)
+
+
+if __name__ == "__main__":
+    main()
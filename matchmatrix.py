@@ -0,0 +1,164 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+"""
+Helper functions for tallying the votes in every 1v1 match between a Contest's Entries at once.
+"""
+
+
+def count_1v1_match_votes(ballot_groups, entries, use_numpy=True):
+    """
+    Tally the votes in every 1v1 match between the given Entries.
+    Return a matrix (a list of lists) in which votes[i][j] contains the number of Voters in the
+    given BallotGroups who prefer entries[i] to entries[j].
+
+    A Voter prefers Entry a to Entry b if they gave a a better (smaller) valid ranking than b.
+    Unranked Entries count as worse than every ranked Entry, and a Voter who gave neither Entry a
+    valid ranking prefers neither.
+
+    Only the pairs of Entries on the same ballot are ever looked at, so this takes time proportional
+    to the number of BallotGroups times the square of their ballots' length, plus the square of the
+    number of Entries, rather than the number of BallotGroups times the square of the number of
+    Entries. That's because a Voter who ranked Entry a prefers it to every Entry except the ones
+    they ranked higher, so
+
+    votes[i][j] = (number of Voters who ranked entries[i])
+        - (number of Voters who ranked entries[j] higher than entries[i]),
+
+    and both of those only involve the Entries that each Voter actually ranked.
+
+    If NumPy is installed and use_numpy is True, then the BallotGroups' ballots are tallied one
+    ballot position at a time across all of them at once. Otherwise, they are tallied one
+    BallotGroup at a time in pure Python.
+    """
+
+    if use_numpy and numpy is not None:
+        return _count_1v1_match_votes_with_numpy(ballot_groups, entries)
+
+    return _count_1v1_match_votes_in_python(ballot_groups, entries)
+
+
+def add_ballot_to_1v1_match_votes(votes, ballot, entries, weight=1):
+    """
+    Add weight Voters who cast the given ballot (a tuple of Entries, from favorite to least
+    favorite) to the given matrix of 1v1 match votes (produced by count_1v1_match_votes), in place.
+    This takes time proportional to the number of Entries times the length of the ballot, rather
+    than recounting every ballot.
+    """
+
+    entry_indexes = {entry: i for i, entry in enumerate(entries)}
+    ranked_indexes = [entry_indexes[entry] for entry in ballot if entry in entry_indexes]
+    unranked_indexes = set(range(len(entries))).difference(ranked_indexes)
+
+    for position, i in enumerate(ranked_indexes):
+        # the Voters prefer each ranked Entry to every Entry they ranked lower or didn't rank
+        votes_for_entry = votes[i]
+        for j in ranked_indexes[position + 1:]:
+            votes_for_entry[j] += weight
+        for j in unranked_indexes:
+            votes_for_entry[j] += weight
+
+
+def get_borda_counts(votes, entry_indexes):
+    """
+    Given a matrix of 1v1 match votes (produced by count_1v1_match_votes) and a list of Entry
+    indexes, return a list whose i-th element is the total Borda count of the Entry with index
+    entry_indexes[i] in a hypothetical contest only featuring the Entries with the given indexes.
+
+    In that hypothetical contest, each Voter gives an Entry one point for every other Entry that
+    they rank lower (see Voter.get_borda_counts_of_entries). That is exactly one point for every 1v1
+    match against those Entries in which the Voter votes for the Entry. So an Entry's total Borda
+    count is its total number of votes in those 1v1 matches, which the matrix already holds, and no
+    pass over the Voters is needed.
+    """
+
+    return [sum(votes[i][j] for j in entry_indexes) for i in entry_indexes]
+
+
+def _count_1v1_match_votes_in_python(ballot_groups, entries):
+    """
+    Tally the votes in every 1v1 match between the given Entries, one BallotGroup at a time.
+    See count_1v1_match_votes.
+    """
+
+    entry_indexes = {entry: i for i, entry in enumerate(entries)}
+
+    # num_voters_who_ranked[i] contains the number of Voters who ranked entries[i], and
+    # num_votes_lost[i][j] contains the number of Voters who ranked entries[j] higher than
+    # entries[i]
+    num_voters_who_ranked = [0 for _ in entries]
+    num_votes_lost = [[0 for _ in entries] for _ in entries]
+
+    for ballot_group in ballot_groups:
+        weight = ballot_group.weight
+        ranked_indexes = [
+            entry_indexes[entry] for entry in ballot_group.ballot if entry in entry_indexes
+        ]
+
+        for position, i in enumerate(ranked_indexes):
+            num_voters_who_ranked[i] += weight
+            num_votes_lost_by_entry = num_votes_lost[i]
+            for j in ranked_indexes[:position]:
+                num_votes_lost_by_entry[j] += weight
+
+    return [
+        [
+            0 if i == j else num_voters_who_ranked[i] - num_votes_lost_by_entry[j]
+            for j in range(len(entries))
+        ]
+        for i, num_votes_lost_by_entry in enumerate(num_votes_lost)
+    ]
+
+
+def _count_1v1_match_votes_with_numpy(ballot_groups, entries):
+    """
+    Tally the votes in every 1v1 match between the given Entries using NumPy.
+    See count_1v1_match_votes.
+    """
+
+    entry_indexes = {entry: i for i, entry in enumerate(entries)}
+    num_entries = len(entries)
+
+    # ballots[g, p] contains the index of the Entry in position p of ballot_groups[g]'s ballot, or
+    # num_entries if the ballot is shorter than that (so the tallies for those positions land in an
+    # extra row and column of the matrices below, which are then dropped)
+    group_indexes = []
+    positions = []
+    entry_indexes_of_votes = []
+    for g, ballot_group in enumerate(ballot_groups):
+        ranked_indexes = [
+            entry_indexes[entry] for entry in ballot_group.ballot if entry in entry_indexes
+        ]
+        group_indexes.extend([g] * len(ranked_indexes))
+        positions.extend(range(len(ranked_indexes)))
+        entry_indexes_of_votes.extend(ranked_indexes)
+
+    ballot_length = max(positions, default=-1) + 1
+    ballots = numpy.full((len(ballot_groups), ballot_length), num_entries, dtype=numpy.int64)
+    ballots[group_indexes, positions] = entry_indexes_of_votes
+    weights = numpy.array([ballot_group.weight for ballot_group in ballot_groups], dtype=numpy.int64)
+
+    # see _count_1v1_match_votes_in_python (numpy.bincount tallies weights as floats, which are exact
+    # for any realistic number of Voters)
+    num_voters_who_ranked = numpy.bincount(
+        ballots.ravel(), numpy.repeat(weights, ballot_length), num_entries + 1
+    )
+    num_votes_lost = numpy.zeros((num_entries + 1) ** 2, dtype=numpy.int64)
+    for position in range(1, ballot_length):
+        # the Entry in this position loses the votes of each Entry ranked higher on its ballot
+        num_votes_lost += numpy.bincount(
+            (ballots[:, position, numpy.newaxis] * (num_entries + 1) + ballots[:, :position]).ravel(),
+            numpy.repeat(weights, position),
+            (num_entries + 1) ** 2
+        ).astype(numpy.int64)
+    num_votes_lost = num_votes_lost.reshape((num_entries + 1, num_entries + 1))
+
+    votes = (
+        num_voters_who_ranked[:num_entries, numpy.newaxis].astype(numpy.int64)
+        - num_votes_lost[:num_entries, :num_entries]
+    )
+    numpy.fill_diagonal(votes, 0)
+
+    return votes.tolist()
@@ -0,0 +1,255 @@
+import math
+import os
+import random
+import statistics
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from ballotgroup import BallotGroup
+from contestsnapshot import write_snapshot
+from entry import Entry
+from stvcontest import STVContest
+
+"""
+Helper functions for estimating how likely each Entry is to win an STVContest.
+
+An STVContest picks surplus Voters and breaks ties at random, so each run of get_winners is just
+one sample from a distribution of outcomes. estimate_stv_win_probabilities runs many independently
+seeded counts (trials) across a pool of processes and reports how often each Entry won.
+
+The ballots are shared with the worker processes through a snapshot file (see contestsnapshot.py)
+holding one weighted ballot per BallotGroup, which every worker memory-maps once. Tasks only carry
+seeds, so no ballots are pickled after the workers start.
+"""
+
+# how many batches of trials each worker process gets, on average (more batches balance the load
+# better, but each batch has some overhead)
+NUM_BATCHES_PER_PROCESS = 4
+
+
+class MonteCarloResults():
+    """
+    MonteCarloResults record the winners of each trial of a Monte Carlo run of an STVContest.
+    """
+
+
+    def __init__(self, entry_names, winner_sets, confidence_level):
+        """
+        entry_names contains the name of every Entry, and winner_sets contains a frozenset of the
+        names of the winning Entries for each trial.
+        """
+
+        self.entry_names = entry_names
+        self.num_trials = len(winner_sets)
+        # the confidence level of the intervals returned by get_confidence_interval
+        self.confidence_level = confidence_level
+
+        # self.num_wins_by_entry_name[n] contains the number of trials won by the Entry named n
+        self.num_wins_by_entry_name = {entry_name: 0 for entry_name in entry_names}
+        # self.num_trials_by_winner_set[s] contains the number of trials whose winners were exactly
+        # the Entries named in s
+        self.num_trials_by_winner_set = {}
+        for winner_set in winner_sets:
+            for entry_name in winner_set:
+                self.num_wins_by_entry_name[entry_name] += 1
+            self.num_trials_by_winner_set[winner_set] = (
+                self.num_trials_by_winner_set.get(winner_set, 0) + 1
+            )
+
+
+    def get_win_frequency(self, entry_name):
+        """
+        Return the fraction of trials won by the Entry with the given name.
+        """
+
+        return self.num_wins_by_entry_name[entry_name] / self.num_trials
+
+
+    def get_confidence_interval(self, entry_name):
+        """
+        Return a (low, high) tuple bounding the probability that the Entry with the given name wins,
+        at self.confidence_level. This is the Wilson score interval, which stays sensible even when
+        an Entry won all or none of the trials.
+        """
+
+        z = statistics.NormalDist().inv_cdf((1 + self.confidence_level) / 2)
+        n = self.num_trials
+        p = self.get_win_frequency(entry_name)
+
+        center = (p + z * z / (2 * n)) / (1 + z * z / n)
+        half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+
+        return (max(0.0, center - half_width), min(1.0, center + half_width))
+
+
+    def print_summary(self):
+        """
+        Print each Entry's win frequency and confidence interval to the console, from most to least
+        frequent winner.
+        """
+
+        longest_entry_name_length = max(len(entry_name) for entry_name in self.entry_names)
+
+        print()
+        print(
+            f"Win frequencies over {self.num_trials} trials"
+            f" ({round(100 * self.confidence_level)}% confidence intervals):"
+        )
+        print()
+        for entry_name in sorted(self.entry_names, key=self.get_win_frequency, reverse=True):
+            low, high = self.get_confidence_interval(entry_name)
+            print(
+                f"\t{entry_name.ljust(longest_entry_name_length + 2)}"
+                f"{round(100 * self.get_win_frequency(entry_name), 1)}%"
+                f" ({round(100 * low, 1)}% to {round(100 * high, 1)}%)"
+            )
+
+
+def estimate_stv_win_probabilities(
+    contest,
+    num_winners,
+    num_trials,
+    num_processes=None,
+    seed=None,
+    confidence_level=0.95
+):
+    """
+    Run num_trials independently seeded counts of the given (populated, but not yet counted)
+    STVContest, across num_processes processes (by default, one per CPU; if num_processes is 1,
+    then every trial runs in this process). Trials write no spreadsheets.
+    Return MonteCarloResults recording the winners of each trial.
+
+    Each trial's seed is drawn from a random.Random seeded with seed, so the results only depend on
+    seed, not on the number of processes. Each trial gives the same winners as
+    STVContest(seed=s, surplus_transfer=contest.surplus_transfer).get_winners(num_winners, None),
+    where s is its seed.
+    """
+
+    if num_winners >= len(contest.entries):
+        raise ValueError(
+            "A STVContest must have fewer winners then entries."
+            f" This STVContest seeks to produce {num_winners} winners"
+            f" but has only {len(contest.entries)} entries."
+        )
+    if sum(ballot_group.weight for ballot_group in contest.ballot_groups) != len(contest.voters):
+        raise ValueError("Win probabilities can only be estimated before the contest is counted.")
+
+    if num_processes is None:
+        num_processes = os.cpu_count() or 1
+
+    seed_generator = random.Random(seed)
+    seeds = [seed_generator.getrandbits(64) for _ in range(num_trials)]
+
+    if contest.verbose:
+        print(
+            f"Running {num_trials} trials of the contest across {num_processes} processes...",
+            end="",
+            flush=True
+        )
+
+    entry_names = [entry.name for entry in contest.entries]
+
+    if num_processes == 1:
+        _set_up_trials(
+            entry_names,
+            [
+                ([entry.id for entry in ballot_group.ballot], ballot_group.voters)
+                for ballot_group in contest.ballot_groups
+            ],
+            contest.voters
+        )
+        winner_id_sets = _run_trials(num_winners, contest.surplus_transfer, seeds)
+    else:
+        batch_size = max(1, math.ceil(num_trials / (NUM_BATCHES_PER_PROCESS * num_processes)))
+        with tempfile.TemporaryDirectory() as snapshot_directory:
+            snapshot_file_name = os.path.join(snapshot_directory, "contest.snapshot")
+            write_snapshot(snapshot_file_name, contest.to_ballot_matrix(group_ballots=True))
+
+            with ProcessPoolExecutor(
+                max_workers=num_processes,
+                initializer=_set_up_trials_from_snapshot,
+                initargs=(snapshot_file_name,)
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        _run_trials, num_winners, contest.surplus_transfer, seeds[i:i + batch_size]
+                    )
+                    for i in range(0, num_trials, batch_size)
+                ]
+                winner_id_sets = [
+                    winner_ids for future in futures for winner_ids in future.result()
+                ]
+
+    results = MonteCarloResults(
+        entry_names,
+        [frozenset(entry_names[i] for i in winner_ids) for winner_ids in winner_id_sets],
+        confidence_level
+    )
+
+    if contest.verbose:
+        print(" done.")
+        results.print_summary()
+
+    return results
+
+
+# the state that _run_trials counts from in this process, set up by _set_up_trials:
+# the names of the Entries, a (list of Entry ids, voters) tuple for each BallotGroup, and every Voter
+_trial_entry_names = None
+_trial_ballot_groups = None
+_trial_voters = None
+
+
+def _set_up_trials(entry_names, ballot_groups, voters):
+    """
+    Store what _run_trials needs to count (see above).
+    """
+
+    global _trial_entry_names, _trial_ballot_groups, _trial_voters
+    _trial_entry_names = entry_names
+    _trial_ballot_groups = ballot_groups
+    _trial_voters = voters
+
+
+def _set_up_trials_from_snapshot(snapshot_file_name):
+    """
+    Set up a worker process to run trials on the contest in the given snapshot (written by
+    estimate_stv_win_probabilities, so its hash isn't checked again).
+    """
+
+    contest = STVContest(verbose=False, background_reports=False)
+    contest.populate_from_snapshot(snapshot_file_name, verify_content_hash=False)
+    _set_up_trials(
+        [entry.name for entry in contest.entries],
+        [
+            ([entry.id for entry in ballot_group.ballot], ballot_group.voters)
+            for ballot_group in contest.ballot_groups
+        ],
+        contest.voters
+    )
+
+
+def _run_trials(num_winners, surplus_transfer, seeds):
+    """
+    Count the contest set up by _set_up_trials once per seed, transferring surpluses with the given
+    method (see STVContest.surplus_transfer).
+    Return a list containing a tuple of the winning Entries' ids for each trial.
+    """
+
+    winner_id_sets = []
+    for seed in seeds:
+        # counting changes the Entries and BallotGroups, so each trial gets fresh ones
+        contest = STVContest(
+            verbose=False, background_reports=False, seed=seed, surplus_transfer=surplus_transfer
+        )
+        contest.entries = [Entry(entry_name, i) for i, entry_name in enumerate(_trial_entry_names)]
+        contest.ballot_groups = [
+            BallotGroup(tuple(contest.entries[i] for i in entry_ids), voters)
+            for entry_ids, voters in _trial_ballot_groups
+        ]
+        contest.voters = _trial_voters
+
+        winners = contest.get_winners(num_winners, None)
+        winner_id_sets.append(tuple(winner.id for winner in winners))
+
+    return winner_id_sets
@@ -0,0 +1,476 @@
+import struct
+import sys
+from array import array
+
+from ballotmatrix import BallotMatrix
+
+"""
+Mergeable partial tallies of a Contest's ballots.
+
+A huge electorate can be split into shards (for instance, chunks of a voter data spreadsheet, or
+spreadsheets collected on different machines), each shard tallied on its own, and the tallies
+merged. Every tally's merge is associative and commutative in the numbers it holds, so shards can be
+merged in any grouping. (A BallotHistogram also remembers the order in which ballots first
+appeared, which follows the order of the merges.)
+
+Each tally can be serialized with to_bytes and read back with from_bytes, to be shipped between
+processes or machines. The serialized form is a magic string followed by a series of arrays, each
+stored as its typecode, its length, and its little-endian items.
+
+Tallies refer to Entries by id (their index in the Contest's entries); a ContestTally bundles every
+kind of tally with the Entries' names. See shardedtally.py for tallying spreadsheets in parallel,
+and Contest.populate_from_tally for counting the result.
+"""
+
+# magic strings at the start of each kind of serialized tally
+_PAIRWISE_TALLY_MAGIC = b"RVPAIRS1"
+_FIRST_PREFERENCE_TALLY_MAGIC = b"RVFIRST1"
+_BALLOT_HISTOGRAM_MAGIC = b"RVHISTO1"
+_BORDA_TALLY_MAGIC = b"RVBORDA1"
+_CONTEST_TALLY_MAGIC = b"RVTALLY1"
+
+# typecode and length of each serialized array
+_ARRAY_HEADER_FORMAT = "<cQ"
+_ARRAY_HEADER_SIZE = struct.calcsize(_ARRAY_HEADER_FORMAT)
+
+
+class PairwiseTally():
+    """
+    A PairwiseTally counts the votes in every 1v1 match between the Entries (see
+    matchmatrix.count_1v1_match_votes). Like matchmatrix, it only stores what it learns from the
+    pairs of Entries on the same ballot:
+
+    * num_voters_who_ranked[i]: the number of Voters who ranked Entry i;
+    * num_votes_lost[i * num_entries + j]: the number of Voters who ranked Entry j higher than Entry
+        i (a dictionary that only holds the pairs that some Voter ranked).
+    """
+
+
+    def __init__(self, num_entries):
+        self.num_entries = num_entries
+        self.num_voters_who_ranked = array("Q", bytes(8 * num_entries))
+        self.num_votes_lost = {}
+
+
+    def add_ballot(self, entry_ids, weight=1):
+        """
+        Add weight Voters who ranked the Entries with the given ids (from favorite to least
+        favorite).
+        """
+
+        for position, i in enumerate(entry_ids):
+            self.num_voters_who_ranked[i] += weight
+            for j in entry_ids[:position]:
+                key = i * self.num_entries + j
+                self.num_votes_lost[key] = self.num_votes_lost.get(key, 0) + weight
+
+
+    def merge(self, other):
+        """
+        Add the votes tallied in another PairwiseTally to this one, in place.
+        """
+
+        _check_num_entries(self, other)
+
+        for i, num_voters in enumerate(other.num_voters_who_ranked):
+            self.num_voters_who_ranked[i] += num_voters
+        for key, num_votes in other.num_votes_lost.items():
+            self.num_votes_lost[key] = self.num_votes_lost.get(key, 0) + num_votes
+
+
+    def get_1v1_match_votes(self):
+        """
+        Return a matrix (a list of lists) in which votes[i][j] contains the number of Voters who
+        prefer Entry i to Entry j, as returned by matchmatrix.count_1v1_match_votes.
+        """
+
+        votes = [
+            [0 if i == j else num_voters for j in range(self.num_entries)]
+            for i, num_voters in enumerate(self.num_voters_who_ranked)
+        ]
+        for key, num_votes in self.num_votes_lost.items():
+            i, j = divmod(key, self.num_entries)
+            votes[i][j] -= num_votes
+
+        return votes
+
+
+    def to_bytes(self):
+        return _pack_arrays(
+            _PAIRWISE_TALLY_MAGIC,
+            array("Q", [self.num_entries]),
+            self.num_voters_who_ranked,
+            array("Q", self.num_votes_lost.keys()),
+            array("Q", self.num_votes_lost.values()),
+        )
+
+
+    @classmethod
+    def from_bytes(cls, data):
+        (num_entries,), num_voters_who_ranked, keys, values = _unpack_arrays(
+            _PAIRWISE_TALLY_MAGIC, data
+        )
+
+        pairwise_tally = cls(num_entries)
+        pairwise_tally.num_voters_who_ranked = num_voters_who_ranked
+        pairwise_tally.num_votes_lost = dict(zip(keys, values))
+        return pairwise_tally
+
+
+class FirstPreferenceTally():
+    """
+    A FirstPreferenceTally counts the Voters who ranked each Entry first (counts[i] for Entry i),
+    and the Voters who cast no valid votes (num_voters_with_no_valid_votes). These are the first
+    round's tallies in an STVContest.
+    """
+
+
+    def __init__(self, num_entries):
+        self.num_entries = num_entries
+        self.counts = array("Q", bytes(8 * num_entries))
+        self.num_voters_with_no_valid_votes = 0
+
+
+    def add_ballot(self, entry_ids, weight=1):
+        """
+        Add weight Voters who ranked the Entries with the given ids (from favorite to least
+        favorite).
+        """
+
+        if entry_ids:
+            self.counts[entry_ids[0]] += weight
+        else:
+            self.num_voters_with_no_valid_votes += weight
+
+
+    def merge(self, other):
+        """
+        Add the Voters tallied in another FirstPreferenceTally to this one, in place.
+        """
+
+        _check_num_entries(self, other)
+
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.num_voters_with_no_valid_votes += other.num_voters_with_no_valid_votes
+
+
+    def to_bytes(self):
+        return _pack_arrays(
+            _FIRST_PREFERENCE_TALLY_MAGIC,
+            array("Q", [self.num_entries, self.num_voters_with_no_valid_votes]),
+            self.counts,
+        )
+
+
+    @classmethod
+    def from_bytes(cls, data):
+        (num_entries, num_voters_with_no_valid_votes), counts = _unpack_arrays(
+            _FIRST_PREFERENCE_TALLY_MAGIC, data
+        )
+
+        first_preference_tally = cls(num_entries)
+        first_preference_tally.counts = counts
+        first_preference_tally.num_voters_with_no_valid_votes = num_voters_with_no_valid_votes
+        return first_preference_tally
+
+
+class BallotHistogram():
+    """
+    A BallotHistogram counts the Voters who cast each distinct ballot: weights[b] contains the
+    number of Voters who cast ballot b (a tuple of Entry ids, from favorite to least favorite).
+    Ballots are kept in the order they first appeared, so a Contest populated from the histogram
+    has its BallotGroups in the same order as one populated from the ballots themselves.
+    """
+
+
+    def __init__(self, num_entries):
+        self.num_entries = num_entries
+        self.weights = {}
+
+
+    def add_ballot(self, entry_ids, weight=1):
+        """
+        Add weight Voters who ranked the Entries with the given ids (from favorite to least
+        favorite).
+        """
+
+        ballot = tuple(entry_ids)
+        self.weights[ballot] = self.weights.get(ballot, 0) + weight
+
+
+    def merge(self, other):
+        """
+        Add the Voters tallied in another BallotHistogram to this one, in place.
+        """
+
+        _check_num_entries(self, other)
+
+        for ballot, weight in other.weights.items():
+            self.weights[ballot] = self.weights.get(ballot, 0) + weight
+
+
+    def to_ballot_matrix(self, entry_names):
+        """
+        Return a BallotMatrix (for Entries with the given names) with one weighted ballot per
+        distinct ballot in the histogram.
+        """
+
+        ballot_matrix = BallotMatrix(
+            entry_names, max((len(ballot) for ballot in self.weights), default=1)
+        )
+        for ballot, weight in self.weights.items():
+            ballot_matrix.append_ballot(ballot, weight=weight)
+
+        return ballot_matrix
+
+
+    def to_bytes(self):
+        # the ballots are stored one after another, each preceded by its length
+        ballots = array("H")
+        for ballot in self.weights:
+            ballots.append(len(ballot))
+            ballots.extend(ballot)
+
+        return _pack_arrays(
+            _BALLOT_HISTOGRAM_MAGIC,
+            array("Q", [self.num_entries]),
+            ballots,
+            array("Q", self.weights.values()),
+        )
+
+
+    @classmethod
+    def from_bytes(cls, data):
+        (num_entries,), ballots, weights = _unpack_arrays(_BALLOT_HISTOGRAM_MAGIC, data)
+
+        ballot_histogram = cls(num_entries)
+        start = 0
+        for weight in weights:
+            end = start + 1 + ballots[start]
+            ballot_histogram.weights[tuple(ballots[start + 1:end])] = weight
+            start = end
+        return ballot_histogram
+
+
+class BordaTally():
+    """
+    A BordaTally adds up each Entry's Borda count across all of the Entries: points[i] contains the
+    total number of points given to Entry i, where each Voter gives an Entry one point for every
+    other Entry that they rank lower or don't rank (see Voter.get_borda_counts_of_entries).
+    """
+
+
+    def __init__(self, num_entries):
+        self.num_entries = num_entries
+        self.points = array("Q", bytes(8 * num_entries))
+
+
+    def add_ballot(self, entry_ids, weight=1):
+        """
+        Add weight Voters who ranked the Entries with the given ids (from favorite to least
+        favorite).
+        """
+
+        for position, i in enumerate(entry_ids):
+            self.points[i] += weight * (self.num_entries - 1 - position)
+
+
+    def merge(self, other):
+        """
+        Add the points tallied in another BordaTally to this one, in place.
+        """
+
+        _check_num_entries(self, other)
+
+        for i, num_points in enumerate(other.points):
+            self.points[i] += num_points
+
+
+    def to_bytes(self):
+        return _pack_arrays(_BORDA_TALLY_MAGIC, array("Q", [self.num_entries]), self.points)
+
+
+    @classmethod
+    def from_bytes(cls, data):
+        (num_entries,), points = _unpack_arrays(_BORDA_TALLY_MAGIC, data)
+
+        borda_tally = cls(num_entries)
+        borda_tally.points = points
+        return borda_tally
+
+
+class ContestTally():
+    """
+    A ContestTally bundles every kind of tally of the same ballots (pairwise, first_preferences,
+    ballot_histogram, and borda) with the names of the Entries they refer to.
+    """
+
+
+    def __init__(self, entry_names):
+        self.entry_names = list(entry_names)
+
+        num_entries = len(self.entry_names)
+        self.pairwise = PairwiseTally(num_entries)
+        self.first_preferences = FirstPreferenceTally(num_entries)
+        self.ballot_histogram = BallotHistogram(num_entries)
+        self.borda = BordaTally(num_entries)
+
+
+    def _get_tallies(self):
+        # the tallies, in the order they're serialized
+        return [self.pairwise, self.first_preferences, self.ballot_histogram, self.borda]
+
+
+    @property
+    def num_voters(self):
+        return sum(self.ballot_histogram.weights.values())
+
+
+    def add_ballot(self, entry_ids, weight=1):
+        """
+        Add weight Voters who ranked the Entries with the given ids (from favorite to least
+        favorite) to every tally.
+        """
+
+        for tally in self._get_tallies():
+            tally.add_ballot(entry_ids, weight)
+
+
+    def add_ballot_matrix(self, ballot_matrix):
+        """
+        Add every ballot in the given BallotMatrix (which must have the same Entries) to every
+        tally. Identical ballots are grouped first, so each distinct ballot is only tallied once.
+        """
+
+        if ballot_matrix.entry_names != self.entry_names:
+            raise ValueError("Only ballots for the same entries can be tallied together.")
+
+        ballot_histogram = BallotHistogram(len(self.entry_names))
+        for b in range(ballot_matrix.num_ballots):
+            ballot_histogram.add_ballot(
+                ballot_matrix.get_ballot(b),
+                1 if ballot_matrix.weights is None else ballot_matrix.weights[b]
+            )
+
+        for ballot, weight in ballot_histogram.weights.items():
+            self.add_ballot(ballot, weight)
+
+
+    def merge(self, other):
+        """
+        Add the tallies in another ContestTally (of the same Entries) to this one, in place.
+        """
+
+        if other.entry_names != self.entry_names:
+            raise ValueError("Only tallies of the same entries can be merged.")
+
+        for tally, other_tally in zip(self._get_tallies(), other._get_tallies()):
+            tally.merge(other_tally)
+
+
+    def to_bytes(self):
+        encoded_entry_names = [entry_name.encode("utf-8") for entry_name in self.entry_names]
+        tallies = [tally.to_bytes() for tally in self._get_tallies()]
+
+        return _pack_arrays(
+            _CONTEST_TALLY_MAGIC,
+            array("Q", [len(encoded_entry_name) for encoded_entry_name in encoded_entry_names]),
+            array("B", b"".join(encoded_entry_names)),
+            array("Q", [len(tally) for tally in tallies]),
+            array("B", b"".join(tallies)),
+        )
+
+
+    @classmethod
+    def from_bytes(cls, data):
+        entry_name_lengths, encoded_entry_names, tally_lengths, tallies = _unpack_arrays(
+            _CONTEST_TALLY_MAGIC, data
+        )
+        encoded_entry_names = encoded_entry_names.tobytes()
+        tallies = tallies.tobytes()
+
+        entry_names = []
+        start = 0
+        for length in entry_name_lengths:
+            entry_names.append(encoded_entry_names[start:start + length].decode("utf-8"))
+            start += length
+
+        # tally_data[t] contains the serialized t-th tally (see _get_tallies)
+        tally_data = []
+        start = 0
+        for length in tally_lengths:
+            tally_data.append(tallies[start:start + length])
+            start += length
+
+        contest_tally = cls(entry_names)
+        contest_tally.pairwise = PairwiseTally.from_bytes(tally_data[0])
+        contest_tally.first_preferences = FirstPreferenceTally.from_bytes(tally_data[1])
+        contest_tally.ballot_histogram = BallotHistogram.from_bytes(tally_data[2])
+        contest_tally.borda = BordaTally.from_bytes(tally_data[3])
+        return contest_tally
+
+
+def merge_tallies(tallies):
+    """
+    Return a new ContestTally holding the sum of the given ContestTallies (which must all be of the
+    same Entries), without changing any of them. There must be at least one.
+    """
+
+    tallies = iter(tallies)
+    merged_tally = ContestTally.from_bytes(next(tallies).to_bytes())
+    for tally in tallies:
+        merged_tally.merge(tally)
+    return merged_tally
+
+
+def _check_num_entries(tally, other):
+    if other.num_entries != tally.num_entries:
+        raise ValueError(
+            f"A tally of {other.num_entries} entries can't be merged into a tally of"
+            f" {tally.num_entries} entries."
+        )
+
+
+def _pack_arrays(magic, *arrays):
+    """
+    Return the given magic bytes followed by each of the given arrays (see the module docstring).
+    """
+
+    chunks = [magic]
+    for numbers in arrays:
+        if sys.byteorder != "little":
+            numbers = array(numbers.typecode, numbers)
+            numbers.byteswap()
+
+        chunks.append(struct.pack(_ARRAY_HEADER_FORMAT, numbers.typecode.encode(), len(numbers)))
+        chunks.append(numbers.tobytes())
+
+    return b"".join(chunks)
+
+
+def _unpack_arrays(magic, data):
+    """
+    Return a list of the arrays serialized (with _pack_arrays) in the given bytes, after checking
+    that they start with the given magic bytes.
+    """
+
+    if data[:len(magic)] != magic:
+        raise ValueError("The data isn't a serialized tally of the expected kind.")
+
+    arrays = []
+    start = len(magic)
+    while start < len(data):
+        typecode, length = struct.unpack_from(_ARRAY_HEADER_FORMAT, data, start)
+        start += _ARRAY_HEADER_SIZE
+
+        numbers = array(typecode.decode())
+        end = start + length * numbers.itemsize
+        numbers.frombytes(data[start:end])
+        if sys.byteorder != "little":
+            numbers.byteswap()
+
+        arrays.append(numbers)
+        start = end
+
+    return arrays
@@ -1,10 +1,19 @@
 import csv
 
+from ballotsource import BallotSource
+from sparsespreadsheet import write_sparse_spreadsheet
+
 """
 Helper functions for preprocessing voter data.
 """
 
-def create_voter_spreadsheet(votes, entry_names, output_spreadsheet_file_name, verbose=True):
+def create_voter_spreadsheet(
+    votes,
+    entry_names,
+    output_spreadsheet_file_name,
+    verbose=True,
+    sparse=False
+):
     """
     Given a votes dictionary of the form
 
@@ -13,11 +22,34 @@ def create_voter_spreadsheet(votes, entry_names, output_spreadsheet_file_name, v
     and a list containing the entry names,
     construct a spreadsheet at the given path where every row is a user, every column is a contest
     entry, and each cell is the ranking that the row's user assigned to the column's contest entry.
+
+    If sparse is True, then construct a sparse spreadsheet with one row per vote instead (see
+    sparsespreadsheet.py), which is much smaller when each user only ranks a few of many entries.
     """
 
     if verbose:
         print(f"Writing data to {output_spreadsheet_file_name}...", end="", flush=True)
 
+    if sparse:
+        # entry_indexes[n] contains the index of the entry named n
+        entry_indexes = {entry_name: i for i, entry_name in enumerate(entry_names)}
+        ballots = (
+            (
+                username,
+                {
+                    entry_indexes[entry_name]: ranking
+                    for entry_name, ranking in user_votes.items()
+                    if entry_name in entry_indexes
+                },
+            )
+            for username, user_votes in votes.items()
+        )
+        write_sparse_spreadsheet(BallotSource(entry_names, ballots), output_spreadsheet_file_name)
+
+        if verbose:
+            print(" done.")
+        return
+
     with open(output_spreadsheet_file_name, "w", newline="") as spreadsheet:
         writer = csv.writer(spreadsheet, delimiter=",")
 
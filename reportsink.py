@@ -0,0 +1,160 @@
+import os
+import queue
+import threading
+import time
+
+class ReportSink():
+    """
+    A ReportSink writes a Contest's reports (its spreadsheets) so that counting never has to wait
+    for them.
+
+    A report is submitted as a function along with the arguments to call it with. Those arguments
+    are a snapshot of whatever the report needs; they must not change after the report is
+    submitted, since the report may be written at any time until the ReportSink is flushed.
+
+    Reports are written in the order they were submitted, on a single background thread. At most
+    max_num_pending_reports reports wait to be written at once; submitting another one blocks
+    until there's room, so a slow disk can't make snapshots pile up in memory.
+
+    If writing a report raises an exception, no further reports are written, and the exception is
+    raised back to the caller from the next call to submit, flush, or close.
+
+    A ReportSink also keeps track of how many reports it wrote, how long writing them took, and (if
+    track_output is True) how many bytes they added up to, for ContestMetrics.
+    """
+
+
+    # the default number of reports that can wait to be written at once
+    DEFAULT_MAX_NUM_PENDING_REPORTS = 4
+
+
+    def __init__(
+        self,
+        in_background=True,
+        max_num_pending_reports=DEFAULT_MAX_NUM_PENDING_REPORTS,
+        track_output=False
+    ):
+        """
+        If in_background is False, then each report is written as soon as it's submitted, on the
+        caller's thread.
+
+        If track_output is True, then the size of each report's output file (always the first
+        argument of the function that writes it) is added to num_bytes_written once it's written.
+        """
+
+        self.in_background = in_background
+        self.track_output = track_output
+
+        # the number of reports written, the total time spent writing them (in seconds), and the
+        # total size of their output files (if self.track_output is True)
+        self.num_reports_written = 0
+        self.num_seconds_writing = 0
+        self.num_bytes_written = 0
+
+        # the exception raised while writing a report, or None if there hasn't been one (or it
+        # has been raised to the caller already)
+        self._error = None
+        # True if writing a report has raised an exception
+        self._has_failed = False
+        self._is_closed = False
+
+        if self.in_background:
+            # each item is a (write_report, args) tuple, or None to tell the thread to stop
+            self._pending_reports = queue.Queue(maxsize=max_num_pending_reports)
+            self._thread = threading.Thread(target=self._write_pending_reports, daemon=True)
+            self._thread.start()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exception_type, exception, traceback):
+        # if the caller is already failing, let its exception through rather than a writer's
+        self.close(raise_error=exception is None)
+
+
+    def submit(self, write_report, *args):
+        """
+        Write a report by calling write_report(*args).
+        """
+
+        if self._is_closed:
+            raise ValueError("Reports can't be submitted to a closed ReportSink.")
+
+        self._raise_error()
+
+        if self.in_background:
+            self._pending_reports.put((write_report, args))
+        else:
+            self._write_report(write_report, args)
+
+
+    def flush(self):
+        """
+        Wait until every submitted report has been written.
+        """
+
+        if self.in_background and not self._is_closed:
+            self._pending_reports.join()
+
+        self._raise_error()
+
+
+    def close(self, raise_error=True):
+        """
+        Wait until every submitted report has been written, then stop the background thread.
+        If raise_error is False, then any exception raised while writing a report is discarded.
+        """
+
+        if not self._is_closed:
+            self._is_closed = True
+            if self.in_background:
+                self._pending_reports.put(None)
+                self._thread.join()
+
+        if raise_error:
+            self._raise_error()
+
+
+    def _write_pending_reports(self):
+        """
+        Write reports as they're submitted until told to stop. Runs on the background thread.
+        """
+
+        while True:
+            report = self._pending_reports.get()
+            try:
+                if report is None:
+                    return
+
+                # once a report has failed, skip the rest so the caller sees the first failure
+                if not self._has_failed:
+                    write_report, args = report
+                    self._write_report(write_report, args)
+            except Exception as error:
+                self._error = error
+                self._has_failed = True
+            finally:
+                self._pending_reports.task_done()
+
+
+    def _write_report(self, write_report, args):
+        start_time = time.perf_counter()
+        write_report(*args)
+        self.num_seconds_writing += time.perf_counter() - start_time
+        self.num_reports_written += 1
+
+        if self.track_output:
+            self.num_bytes_written += os.path.getsize(args[0])
+
+
+    def _raise_error(self):
+        """
+        Raise the exception raised while writing a report, if there was one.
+        """
+
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
@@ -0,0 +1,207 @@
+from array import array
+
+"""
+Records of what happened in each round of a Contest.
+
+Every round of a TidemanContest or STVContest emits a RoundResult, which get_winners collects in the
+Contest's round_results. RoundResults refer to Entries by id (their index in the Contest's entries)
+and store per-Entry values in compact arrays, so they're cheap to keep and easy to serialize; the
+console charts are drawn from them, and services can read them instead of scraping the console.
+"""
+
+
+class RoundResult():
+    """
+    A RoundResult is an immutable record of one round of a Contest. Its attributes are:
+
+    * round_number;
+    * statuses: a bytes object whose i-th byte is IN_RACE, WON, or LOST, the status of Entry i at
+        the end of the round;
+    * tallies: a sequence whose i-th element is the number of votes held by Entry i (a read-only
+        memoryview of integers, or a tuple when votes are fractional), or None if the round
+        counted no votes;
+    * tally_changes: like tallies, but the number of votes that each Entry gained (or lost) in the
+        round;
+    * elected and eliminated: tuples of the ids of the Entries that won or were eliminated in the
+        round, in order;
+    * transfers: a tuple of (Entry id, number of votes) tuples, one for each Entry whose Voters were
+        moved to their next choices in the round;
+    * num_valid_voters: the number of Voters who cast valid votes;
+    * num_voters_with_no_valid_votes: the number of Voters who didn't;
+    * num_exhausted_voters and num_exhausted_voters_in_round: the number of Voters whose valid votes
+        have all gone to Entries that left the race, in total and in this round alone;
+    * borda_counts: a tuple of (Entry id, Borda count) tuples for the Entries whose Borda counts
+        were computed in the round, or None;
+    * remaining_1v1_match_wins: for TidemanContests, a tuple whose i-th element is a bitmask of the
+        Entries that Entry i would beat in a 1v1 match at the start of the round (bit j is set if
+        it beats Entry j), or None if Entry i wasn't in the race; None for other Contests;
+    * dominating_set: for TidemanContests, a tuple of the ids of the Entries in the round's
+        smallest dominating set; None for other Contests.
+    """
+
+
+    # Entry statuses in RoundResult.statuses
+    IN_RACE = 0
+    WON = 1
+    LOST = 2
+
+
+    __slots__ = (
+        "round_number",
+        "statuses",
+        "tallies",
+        "tally_changes",
+        "elected",
+        "eliminated",
+        "transfers",
+        "num_valid_voters",
+        "num_voters_with_no_valid_votes",
+        "num_exhausted_voters",
+        "num_exhausted_voters_in_round",
+        "borda_counts",
+        "remaining_1v1_match_wins",
+        "dominating_set",
+    )
+
+
+    def __init__(
+        self,
+        round_number,
+        statuses,
+        tallies=None,
+        tally_changes=None,
+        elected=(),
+        eliminated=(),
+        transfers=(),
+        num_valid_voters=0,
+        num_voters_with_no_valid_votes=0,
+        num_exhausted_voters=0,
+        num_exhausted_voters_in_round=0,
+        borda_counts=None,
+        remaining_1v1_match_wins=None,
+        dominating_set=None
+    ):
+        # RoundResults can't be changed, so set attributes the way the base class would
+        for name, value in [
+            ("round_number", round_number),
+            ("statuses", bytes(statuses)),
+            ("tallies", _to_compact_sequence(tallies)),
+            ("tally_changes", _to_compact_sequence(tally_changes)),
+            ("elected", tuple(elected)),
+            ("eliminated", tuple(eliminated)),
+            ("transfers", tuple(transfers)),
+            ("num_valid_voters", num_valid_voters),
+            ("num_voters_with_no_valid_votes", num_voters_with_no_valid_votes),
+            ("num_exhausted_voters", num_exhausted_voters),
+            ("num_exhausted_voters_in_round", num_exhausted_voters_in_round),
+            ("borda_counts", None if borda_counts is None else tuple(borda_counts)),
+            (
+                "remaining_1v1_match_wins",
+                None if remaining_1v1_match_wins is None else tuple(remaining_1v1_match_wins)
+            ),
+            ("dominating_set", None if dominating_set is None else tuple(dominating_set)),
+        ]:
+            object.__setattr__(self, name, value)
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RoundResults can't be changed.")
+
+
+    def __reduce__(self):
+        # RoundResults can't be changed, and memoryviews can't be pickled, so copies and pickles
+        # rebuild the RoundResult through its constructor (whose arguments are in the same order as
+        # __slots__) from tuples of its tallies
+        return (RoundResult, tuple(
+            tuple(value) if isinstance(value, memoryview) else value
+            for value in (getattr(self, name) for name in RoundResult.__slots__)
+        ))
+
+
+    def __repr__(self):
+        return (
+            f"RoundResult(round_number={self.round_number}, elected={self.elected},"
+            f" eliminated={self.eliminated})"
+        )
+
+
+    def to_dict(self, entry_names=None):
+        """
+        Return the RoundResult as a dictionary of JSON-serializable values. If entry_names is given
+        (entry_names[i] being the name of Entry i), then Entries are listed by name instead of id.
+        Fractional numbers of votes are converted to floats.
+        """
+
+        def name(entry_id):
+            return entry_id if entry_names is None else entry_names[entry_id]
+
+        def by_entry(values):
+            if values is None:
+                return None
+            return {name(i): _to_json_number(value) for i, value in enumerate(values)}
+
+        return {
+            "round_number": self.round_number,
+            "statuses": {
+                name(i): _STATUS_NAMES[status] for i, status in enumerate(self.statuses)
+            },
+            "tallies": by_entry(self.tallies),
+            "tally_changes": by_entry(self.tally_changes),
+            "elected": [name(i) for i in self.elected],
+            "eliminated": [name(i) for i in self.eliminated],
+            "transfers": [
+                {"from": name(i), "votes": _to_json_number(num_votes)}
+                for i, num_votes in self.transfers
+            ],
+            "num_valid_voters": _to_json_number(self.num_valid_voters),
+            "num_voters_with_no_valid_votes": _to_json_number(self.num_voters_with_no_valid_votes),
+            "num_exhausted_voters": _to_json_number(self.num_exhausted_voters),
+            "num_exhausted_voters_in_round": _to_json_number(self.num_exhausted_voters_in_round),
+            "borda_counts": None if self.borda_counts is None else {
+                name(i): borda_count for i, borda_count in self.borda_counts
+            },
+            "remaining_1v1_match_wins": None if self.remaining_1v1_match_wins is None else {
+                name(i): [name(j) for j in get_bitmask_ids(wins)]
+                for i, wins in enumerate(self.remaining_1v1_match_wins)
+                if wins is not None
+            },
+            "dominating_set": None if self.dominating_set is None else [
+                name(i) for i in self.dominating_set
+            ],
+        }
+
+
+def get_bitmask_ids(bitmask):
+    """
+    Return a list of the positions of the set bits in the given bitmask, from lowest to highest.
+    """
+
+    ids = []
+    while bitmask:
+        lowest_bit = bitmask & -bitmask
+        ids.append(lowest_bit.bit_length() - 1)
+        bitmask ^= lowest_bit
+    return ids
+
+
+_STATUS_NAMES = {RoundResult.IN_RACE: "in race", RoundResult.WON: "won", RoundResult.LOST: "lost"}
+
+
+def _to_compact_sequence(values):
+    """
+    Return the given numbers of votes as a read-only memoryview of an array of signed 64-bit
+    integers if they're all whole numbers that fit, and as a tuple otherwise (for instance, if some
+    are Fractions). Either way, the sequence can't be changed once the RoundResult is published.
+    """
+
+    if values is None:
+        return None
+
+    values = tuple(values)
+    if all(type(value) is int and -2 ** 63 <= value < 2 ** 63 for value in values):
+        return memoryview(array("q", values)).toreadonly()
+    return values
+
+
+def _to_json_number(value):
+    return value if isinstance(value, int) else float(value)
@@ -0,0 +1,299 @@
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, where peak memory isn't recorded
+    resource = None
+
+from stvcontest import STVContest
+from syntheticelectorates import ELECTORATE_KINDS, generate_ballots, write_electorate_spreadsheet
+from tidemancontest import TidemanContest
+
+"""
+Benchmarks for reading voting data and counting TidemanContests and STVContests, across a grid of
+synthetic electorates (see syntheticelectorates.py).
+
+For each kind of electorate, number of voters, and number of entries in the grid, a voting data
+spreadsheet is generated, then each contest engine reads and counts it in a fresh process, recording
+the wall time of each phase and the process's peak memory. Results are saved as JSON, and can be
+compared against a saved baseline to spot changes that make things slower.
+"""
+
+# the (numbers of voters, numbers of entries) to benchmark
+QUICK_GRID = ([1_000, 10_000], [5, 20])
+FULL_GRID = ([1_000, 10_000, 100_000, 1_000_000, 10_000_000], [5, 20, 100, 1_000])
+
+# grid points whose spreadsheets would have more than this many cells (voters times entries) are
+# skipped, since they'd take hours to generate and count
+MAX_NUM_CELLS = 10 ** 8
+
+# the contest engines to benchmark
+TIDEMAN = "tideman"
+STV = "stv"
+ENGINES = [TIDEMAN, STV]
+
+# a benchmark that takes more than this many times as long as in the baseline is reported as a
+# regression
+REGRESSION_THRESHOLD = 1.2
+
+# phases that take less time than this (in seconds) in the baseline vary too much from run to run
+# to be reported as regressions
+MIN_SECONDS_TO_COMPARE = 0.1
+
+# the seed for every generated electorate and every STV count, so runs are comparable
+SEED = 0
+
+
+def run_benchmarks(
+    voter_counts,
+    entry_counts,
+    electorate_kinds=ELECTORATE_KINDS,
+    engines=ENGINES,
+    max_num_cells=MAX_NUM_CELLS,
+    verbose=True
+):
+    """
+    Benchmark every engine on every kind of electorate, for every combination of the given voter and
+    entry counts (skipping those with more than max_num_cells spreadsheet cells).
+    Return a list of results, one dictionary per benchmark, with the keys:
+
+    * electorate, num_voters, num_entries, and engine, identifying the benchmark;
+    * generate_seconds, the time taken to generate and write the spreadsheet;
+    * ingest_seconds, the time taken to populate the contest from the spreadsheet;
+    * count_seconds, the time taken by get_winners (writing no spreadsheets);
+    * peak_memory_mib, the peak memory of the process that ran the benchmark, in MiB (or None if it
+        can't be measured on this platform).
+    """
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as spreadsheet_directory:
+        for electorate_kind in electorate_kinds:
+            for num_voters in voter_counts:
+                for num_entries in entry_counts:
+                    if num_voters * num_entries > max_num_cells:
+                        if verbose:
+                            print(
+                                f"Skipping {electorate_kind} electorate with {num_voters} voters"
+                                f" and {num_entries} entries (too many cells)."
+                            )
+                        continue
+
+                    if verbose:
+                        print(
+                            f"Generating {electorate_kind} electorate with {num_voters} voters"
+                            f" and {num_entries} entries...",
+                            end="",
+                            flush=True
+                        )
+
+                    spreadsheet_file_name = os.path.join(spreadsheet_directory, "electorate.csv")
+                    start_time = time.perf_counter()
+                    write_electorate_spreadsheet(
+                        spreadsheet_file_name,
+                        num_entries,
+                        generate_ballots(electorate_kind, num_voters, num_entries, seed=SEED)
+                    )
+                    generate_seconds = time.perf_counter() - start_time
+
+                    if verbose:
+                        print(f" done ({generate_seconds:.2f}s).")
+
+                    for engine in engines:
+                        if verbose:
+                            print(f"\tRunning {engine}...", end="", flush=True)
+
+                        # each benchmark runs in a fresh process, so its peak memory is its own
+                        with ProcessPoolExecutor(max_workers=1) as executor:
+                            result = executor.submit(
+                                _run_benchmark,
+                                spreadsheet_file_name,
+                                engine,
+                                min(3, num_entries - 1)
+                            ).result()
+
+                        result.update({
+                            "electorate": electorate_kind,
+                            "num_voters": num_voters,
+                            "num_entries": num_entries,
+                            "engine": engine,
+                            "generate_seconds": generate_seconds,
+                        })
+                        results.append(result)
+
+                        if verbose:
+                            print(
+                                f" done (ingest {result['ingest_seconds']:.2f}s,"
+                                f" count {result['count_seconds']:.2f}s,"
+                                f" peak memory {_format_memory(result['peak_memory_mib'])})."
+                            )
+
+                    os.remove(spreadsheet_file_name)
+
+    return results
+
+
+def save_results(output_file_name, results):
+    """
+    Save the given benchmark results (made by run_benchmarks) to a JSON file, along with a
+    description of the machine they were run on.
+    """
+
+    with open(output_file_name, "w") as output_file:
+        json.dump(
+            {
+                "python_version": platform.python_version(),
+                "platform": platform.platform(),
+                "num_cpus": os.cpu_count(),
+                "results": results,
+            },
+            output_file,
+            indent=2
+        )
+
+
+def load_results(input_file_name):
+    """
+    Return the benchmark results saved to the given file by save_results.
+    """
+
+    with open(input_file_name) as input_file:
+        return json.load(input_file)["results"]
+
+
+def compare_to_baseline(results, baseline_results, regression_threshold=REGRESSION_THRESHOLD):
+    """
+    Print how long each of the given benchmark results took, and how much memory it used, relative
+    to the matching benchmark in baseline_results (if there is one).
+    Return a list of the results whose ingest or count took more than regression_threshold times
+    as long as in the baseline, or whose peak memory was more than regression_threshold times as
+    high. Phases that took less than MIN_SECONDS_TO_COMPARE in the baseline are too noisy to count
+    as regressions.
+    """
+
+    baseline_results_by_key = {_get_key(result): result for result in baseline_results}
+    regressions = []
+
+    print()
+    print("Compared to baseline (relative to baseline; above 1 is slower or bigger):")
+    print()
+    for result in results:
+        baseline_result = baseline_results_by_key.get(_get_key(result))
+        if baseline_result is None:
+            continue
+
+        comparisons = []
+        is_regression = False
+        for phase, label in [
+            ("ingest_seconds", "ingest"), ("count_seconds", "count"), ("peak_memory_mib", "memory")
+        ]:
+            if result[phase] is None or baseline_result[phase] is None:
+                continue
+
+            ratio = result[phase] / max(baseline_result[phase], 1e-9)
+            comparisons.append(f"{label} {ratio:.2f}x")
+            if ratio > regression_threshold and (
+                phase == "peak_memory_mib" or baseline_result[phase] >= MIN_SECONDS_TO_COMPARE
+            ):
+                is_regression = True
+
+        if is_regression:
+            regressions.append(result)
+
+        print(
+            f"\t{result['engine']:8} {result['electorate']:10}"
+            f" {result['num_voters']:>10} voters {result['num_entries']:>5} entries: "
+            + ", ".join(comparisons)
+            + (" (REGRESSION)" if is_regression else "")
+        )
+
+    return regressions
+
+
+def _get_key(result):
+    """
+    Return a tuple identifying the benchmark that produced the given result.
+    """
+
+    return (result["electorate"], result["num_voters"], result["num_entries"], result["engine"])
+
+
+def _run_benchmark(spreadsheet_file_name, engine, num_winners):
+    """
+    Populate a contest of the given engine from the given spreadsheet and count it.
+    Return a dictionary of its timings and peak memory (see run_benchmarks).
+    """
+
+    if engine == TIDEMAN:
+        contest = TidemanContest(verbose=False, background_reports=False)
+    elif engine == STV:
+        contest = STVContest(verbose=False, background_reports=False, seed=SEED)
+    else:
+        raise ValueError(f"Unknown contest engine {engine}.")
+
+    start_time = time.perf_counter()
+    contest.populate_from_spreadsheet(spreadsheet_file_name)
+    ingest_seconds = time.perf_counter() - start_time
+
+    # get_winners prints its winners even when it isn't verbose
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start_time = time.perf_counter()
+        contest.get_winners(num_winners, None)
+        count_seconds = time.perf_counter() - start_time
+
+    return {
+        "ingest_seconds": ingest_seconds,
+        "count_seconds": count_seconds,
+        "peak_memory_mib": _get_peak_memory_mib(),
+    }
+
+
+def _get_peak_memory_mib():
+    """
+    Return the peak memory (resident set size) of this process so far in MiB, or None if it can't
+    be measured on this platform.
+    """
+
+    if resource is None:
+        return None
+
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB everywhere else
+    if sys.platform == "darwin":
+        return peak_memory / 2 ** 20
+    return peak_memory / 2 ** 10
+
+
+def _format_memory(memory_mib):
+    return "unknown" if memory_mib is None else f"{memory_mib:.1f} MiB"
+
+
+def main():
+    run_full_grid = input("Run the full benchmark grid (up to 10M voters and 1000 entries; this takes hours)? (y/n): ")
+    output_file_name = input("Enter the path to save the benchmark results to: ")
+    baseline_file_name = input("Enter the path to baseline results to compare against (or leave blank): ")
+
+    if run_full_grid.strip().lower().startswith("y"):
+        voter_counts, entry_counts = FULL_GRID
+    else:
+        voter_counts, entry_counts = QUICK_GRID
+
+    results = run_benchmarks(voter_counts, entry_counts)
+    save_results(output_file_name, results)
+
+    if baseline_file_name:
+        regressions = compare_to_baseline(results, load_results(baseline_file_name))
+        print()
+        print(f"{len(regressions)} regressions found.")
+
+
+if __name__ == "__main__":
+    main()
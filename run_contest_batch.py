@@ -0,0 +1,403 @@
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from chunkedspreadsheet import read_ballot_matrix_from_spreadsheet
+from contest import Contest
+from contestsnapshot import is_snapshot, write_snapshot
+from matchmatrix import count_1v1_match_votes
+from stvcontest import STVContest
+from tidemancontest import TidemanContest
+
+"""
+Runs a batch of contests listed in a manifest, without prompting for anything:
+
+    python run_contest_batch.py manifest.json
+
+The manifest is a JSON file like this one:
+
+    {
+        "num_processes": 4,
+        "summary_file": "results/summary.json",
+        "contests": [
+            {
+                "name": "art (Tideman)",
+                "input_file": "art.csv",
+                "method": "tideman",
+                "num_winners": 3,
+                "output_prefix": "results/art-tideman"
+            },
+            {
+                "input_file": "art.csv",
+                "method": "stv",
+                "num_winners": 3,
+                "output_prefix": "results/art-stv",
+                "seed": 1,
+                "surplus_transfer": "gregory"
+            }
+        ]
+    }
+
+Every contest needs an input_file (a voting data spreadsheet made by one of the
+create_voter_spreadsheet scripts, or a contest snapshot), a method ("tideman" or "stv"), and a
+number of winners. The rest is optional:
+
+* name labels the contest in the summary (by default, its output prefix or its position);
+* output_prefix is the prefix of the spreadsheets the contest writes, and its console output is
+    written to {output_prefix}-log.txt; without one, nothing is written;
+* seed seeds an STV count, so it can be repeated exactly;
+* surplus_transfer is "random" or "gregory" (see STVContest.surplus_transfer).
+
+Relative paths are relative to the manifest's directory. num_processes defaults to one per CPU, and
+summary_file defaults to the manifest's path with -summary.json in place of .json.
+
+Each spreadsheet is parsed only once, however many contests count it: it's read into a snapshot
+(including its 1v1 match vote counts if any Tideman contest needs them), which every contest using
+it then memory-maps. Spreadsheets are parsed and contests are counted concurrently across a pool of
+processes. Once they're all done, a summary of every contest's winners and timings is printed and
+saved as JSON.
+As with any contest loaded from a snapshot, only valid votes are kept, so the spreadsheets written
+show each voter's valid rankings numbered from 1.
+
+The exit code is EXIT_SUCCESS if every contest was counted, EXIT_CONTEST_FAILED if any failed (the
+rest are still counted), and EXIT_INVALID_MANIFEST if the manifest couldn't be read.
+"""
+
+# exit codes
+EXIT_SUCCESS = 0
+EXIT_CONTEST_FAILED = 1
+EXIT_INVALID_MANIFEST = 2
+
+# the contest methods a manifest can ask for
+TIDEMAN = "tideman"
+STV = "stv"
+METHODS = [TIDEMAN, STV]
+
+
+def load_manifest(manifest_file_name):
+    """
+    Read and validate the manifest at the given path (see above).
+    Return a dictionary with the keys num_processes, summary_file, and contests, a list of
+    dictionaries (one per contest) with every optional key filled in and every path resolved.
+    Raise a ValueError if the manifest is invalid.
+    """
+
+    try:
+        with open(manifest_file_name) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, json.JSONDecodeError) as error:
+        raise ValueError(f"The manifest {manifest_file_name} couldn't be read: {error}")
+
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("contests"), list):
+        raise ValueError(f"The manifest {manifest_file_name} must have a list of contests.")
+
+    manifest_directory = os.path.dirname(os.path.abspath(manifest_file_name))
+
+    def resolve(path):
+        return None if path is None else os.path.join(manifest_directory, path)
+
+    contests = []
+    for i, contest in enumerate(manifest["contests"]):
+        if not isinstance(contest, dict):
+            raise ValueError(f"Contest {i + 1} in the manifest must be a JSON object.")
+
+        for key in ["input_file", "method", "num_winners"]:
+            if key not in contest:
+                raise ValueError(f"Contest {i + 1} in the manifest has no {key}.")
+        if contest["method"] not in METHODS:
+            raise ValueError(
+                f"Contest {i + 1} in the manifest has the unknown method {contest['method']}"
+                f" (expected one of {METHODS})."
+            )
+        if not isinstance(contest["num_winners"], int) or contest["num_winners"] < 1:
+            raise ValueError(f"Contest {i + 1} in the manifest must have a positive num_winners.")
+
+        surplus_transfer = contest.get("surplus_transfer", STVContest.RANDOM_SURPLUS_TRANSFER)
+        if surplus_transfer not in [
+            STVContest.RANDOM_SURPLUS_TRANSFER, STVContest.GREGORY_SURPLUS_TRANSFER
+        ]:
+            raise ValueError(
+                f"Contest {i + 1} in the manifest has the unknown surplus transfer method"
+                f" {surplus_transfer}."
+            )
+
+        contests.append({
+            "name": contest.get("name", contest.get("output_prefix") or f"contest {i + 1}"),
+            "input_file": resolve(contest["input_file"]),
+            "method": contest["method"],
+            "num_winners": contest["num_winners"],
+            "output_prefix": resolve(contest.get("output_prefix")),
+            "seed": contest.get("seed"),
+            "surplus_transfer": surplus_transfer,
+        })
+
+    summary_file_name = manifest.get("summary_file")
+    if summary_file_name is None:
+        summary_file_name = f"{os.path.splitext(manifest_file_name)[0]}-summary.json"
+    else:
+        summary_file_name = resolve(summary_file_name)
+
+    return {
+        "num_processes": manifest.get("num_processes") or os.cpu_count() or 1,
+        "summary_file": summary_file_name,
+        "contests": contests,
+    }
+
+
+def run_contest_batch(contests, num_processes=None, verbose=True):
+    """
+    Count the given contests (as listed by load_manifest) across a pool of num_processes processes
+    (by default, one per CPU), parsing each input spreadsheet only once.
+    Return a list of results, one dictionary per contest (in the same order), with the keys of the
+    contest plus:
+
+    * status, "ok" or "failed";
+    * winners, a list of the winners' names (or None if the contest failed);
+    * error, a description of what went wrong (or None if the contest was counted);
+    * parse_seconds, the time taken to parse the contest's input spreadsheet into a snapshot (shared
+        by every contest using that spreadsheet; 0 if the input was a snapshot already);
+    * load_seconds, the time taken to populate the contest from the snapshot;
+    * count_seconds, the time taken by get_winners, including writing its spreadsheets.
+    """
+
+    results = [None for _ in contests]
+
+    # contest_indexes_by_input_file[f] contains the indexes of the contests that count input file f
+    contest_indexes_by_input_file = {}
+    for c, contest in enumerate(contests):
+        contest_indexes_by_input_file.setdefault(contest["input_file"], []).append(c)
+
+    with tempfile.TemporaryDirectory() as snapshot_directory, \
+        ProcessPoolExecutor(max_workers=num_processes) as executor:
+
+        def submit_contests(input_file_name, snapshot_file_name, parse_seconds):
+            for c in contest_indexes_by_input_file[input_file_name]:
+                future = executor.submit(_run_contest, contests[c], snapshot_file_name)
+                contest_indexes_by_future[future] = (c, parse_seconds)
+                pending_futures.add(future)
+
+        # input_files_by_future[f] contains the input file being parsed by future f, and
+        # contest_indexes_by_future[f] contains the index of the contest being counted by future f
+        # (and the time it took to parse its input file)
+        input_files_by_future = {}
+        contest_indexes_by_future = {}
+        pending_futures = set()
+
+        for i, input_file_name in enumerate(contest_indexes_by_input_file):
+            try:
+                input_is_snapshot = is_snapshot(input_file_name)
+            except OSError as error:
+                for c in contest_indexes_by_input_file[input_file_name]:
+                    results[c] = _get_failed_result(contests[c], f"{error}", 0)
+                continue
+
+            if input_is_snapshot:
+                submit_contests(input_file_name, input_file_name, 0)
+            else:
+                if verbose:
+                    print(f"Parsing {input_file_name}...")
+
+                snapshot_file_name = os.path.join(snapshot_directory, f"input-{i}.snapshot")
+                include_1v1_match_votes = any(
+                    contests[c]["method"] == TIDEMAN
+                    for c in contest_indexes_by_input_file[input_file_name]
+                )
+                future = executor.submit(
+                    _parse_input_file, input_file_name, snapshot_file_name, include_1v1_match_votes
+                )
+                input_files_by_future[future] = (input_file_name, snapshot_file_name)
+                pending_futures.add(future)
+
+        while pending_futures:
+            done_futures, pending_futures = wait(pending_futures, return_when=FIRST_COMPLETED)
+            for future in done_futures:
+                if future in input_files_by_future:
+                    input_file_name, snapshot_file_name = input_files_by_future[future]
+                    try:
+                        parse_seconds = future.result()
+                    except Exception as error:
+                        for c in contest_indexes_by_input_file[input_file_name]:
+                            results[c] = _get_failed_result(
+                                contests[c], f"{input_file_name} couldn't be parsed: {error}", 0
+                            )
+                    else:
+                        submit_contests(input_file_name, snapshot_file_name, parse_seconds)
+                else:
+                    c, parse_seconds = contest_indexes_by_future[future]
+                    try:
+                        results[c] = future.result()
+                    except Exception as error:
+                        # the worker process itself died
+                        results[c] = _get_failed_result(contests[c], f"{error}", 0)
+                    results[c]["parse_seconds"] = parse_seconds
+
+                    if verbose:
+                        print(f"\t{_get_result_text(results[c])}")
+
+    return results
+
+
+def save_summary(output_file_name, results, wall_seconds):
+    """
+    Save the given batch results (made by run_contest_batch) to a JSON file, along with the time the
+    whole batch took.
+    """
+
+    with open(output_file_name, "w") as output_file:
+        json.dump(
+            {
+                "num_contests": len(results),
+                "num_failed": sum(1 for result in results if result["status"] != "ok"),
+                "wall_seconds": wall_seconds,
+                "contests": results,
+            },
+            output_file,
+            indent=2
+        )
+
+
+def print_timing_report(results, wall_seconds):
+    """
+    Print each contest's status, winners, and timings to the console.
+    """
+
+    longest_name_length = max((len(result["name"]) for result in results), default=0)
+
+    print()
+    print("Contest timings (parse, load, count):")
+    print()
+    for result in results:
+        print(
+            f"\t{result['name'].ljust(longest_name_length + 2)}"
+            f"{result['parse_seconds']:8.2f}s {result['load_seconds']:8.2f}s"
+            f" {result['count_seconds']:8.2f}s  {_get_result_text(result, include_name=False)}"
+        )
+    print()
+    num_failed = sum(1 for result in results if result["status"] != "ok")
+    print(f"{len(results) - num_failed}/{len(results)} contests counted in {wall_seconds:.2f}s.")
+
+
+def _get_result_text(result, include_name=True):
+    name_text = f"{result['name']}: " if include_name else ""
+    if result["status"] == "ok":
+        return f"{name_text}WINNERS: {result['winners']}"
+    return f"{name_text}FAILED ({result['error']})"
+
+
+def _get_failed_result(contest, error, load_seconds):
+    return {
+        **contest,
+        "status": "failed",
+        "winners": None,
+        "error": error,
+        "parse_seconds": 0,
+        "load_seconds": load_seconds,
+        "count_seconds": 0,
+    }
+
+
+def _parse_input_file(input_file_name, snapshot_file_name, include_1v1_match_votes):
+    """
+    Parse the given voting data spreadsheet into a snapshot at the given path, including its 1v1
+    match vote counts if include_1v1_match_votes is True. Return the time it took, in seconds.
+    """
+
+    start_time = time.perf_counter()
+
+    # each input file is parsed by one worker, so the pool parses several files at once
+    ballot_matrix = read_ballot_matrix_from_spreadsheet(input_file_name, num_processes=1)
+
+    match_votes = None
+    if include_1v1_match_votes:
+        contest = Contest(verbose=False)
+        contest.populate_from_ballot_matrix(ballot_matrix)
+        match_votes = count_1v1_match_votes(contest.ballot_groups, contest.entries)
+
+    write_snapshot(snapshot_file_name, ballot_matrix, match_votes)
+
+    return time.perf_counter() - start_time
+
+
+def _run_contest(contest, snapshot_file_name):
+    """
+    Populate the given contest (as listed by load_manifest) from the given snapshot and count it,
+    writing its console output to {output_prefix}-log.txt if it has an output prefix.
+    Return its result (see run_contest_batch). Errors are returned as failed results, not raised.
+    """
+
+    output_prefix = contest["output_prefix"]
+    load_seconds = 0
+    try:
+        if output_prefix is not None:
+            output_directory = os.path.dirname(output_prefix)
+            if output_directory:
+                os.makedirs(output_directory, exist_ok=True)
+            log_file_name = f"{output_prefix}-log.txt"
+        else:
+            log_file_name = os.devnull
+
+        with open(log_file_name, "w") as log_file, contextlib.redirect_stdout(log_file):
+            verbose = output_prefix is not None
+            if contest["method"] == TIDEMAN:
+                counted_contest = TidemanContest(verbose=verbose)
+            else:
+                counted_contest = STVContest(
+                    verbose=verbose,
+                    seed=contest["seed"],
+                    surplus_transfer=contest["surplus_transfer"]
+                )
+
+            start_time = time.perf_counter()
+            counted_contest.populate_from_snapshot(snapshot_file_name, verify_content_hash=False)
+            load_seconds = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            winners = counted_contest.get_winners(contest["num_winners"], output_prefix)
+            count_seconds = time.perf_counter() - start_time
+    except Exception as error:
+        return _get_failed_result(
+            contest, "".join(traceback.format_exception_only(type(error), error)).strip(), load_seconds
+        )
+
+    return {
+        **contest,
+        "status": "ok",
+        "winners": [winner.name for winner in winners],
+        "error": None,
+        "parse_seconds": 0,
+        "load_seconds": load_seconds,
+        "count_seconds": count_seconds,
+    }
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python run_contest_batch.py <manifest.json>", file=sys.stderr)
+        return EXIT_INVALID_MANIFEST
+
+    try:
+        manifest = load_manifest(sys.argv[1])
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return EXIT_INVALID_MANIFEST
+
+    start_time = time.perf_counter()
+    results = run_contest_batch(manifest["contests"], manifest["num_processes"])
+    wall_seconds = time.perf_counter() - start_time
+
+    print_timing_report(results, wall_seconds)
+    save_summary(manifest["summary_file"], results, wall_seconds)
+    print(f"Summary saved to {manifest['summary_file']}.")
+
+    if any(result["status"] != "ok" for result in results):
+        return EXIT_CONTEST_FAILED
+    return EXIT_SUCCESS
+
+
+if __name__ == "__main__":
+    sys.exit(main())
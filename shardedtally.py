@@ -0,0 +1,116 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from chunkedspreadsheet import (
+    DEFAULT_NUM_BYTES_PER_CHUNK,
+    read_ballot_matrix_from_spreadsheet,
+    read_spreadsheet_chunk,
+    split_spreadsheet_into_chunks,
+)
+from partialtally import ContestTally
+from sparsespreadsheet import is_sparse_spreadsheet, read_voter_spreadsheet
+
+"""
+Helpers for tallying huge voter data spreadsheets in shards, in parallel (see partialtally.py).
+
+Each wide spreadsheet is split into shards of about num_bytes_per_shard bytes at line breaks (see
+chunkedspreadsheet.split_spreadsheet_into_chunks); a sparse spreadsheet (see sparsespreadsheet.py)
+is a single shard. Every shard is parsed and tallied by a worker process, which sends its
+ContestTally back serialized, and the tallies are merged as they arrive.
+
+To tally shards on other machines, run tally_shard there (for instance, on a whole spreadsheet with
+start and end left as None) and send the bytes it returns back to be merged with
+partialtally.merge_tallies or ContestTally.merge.
+"""
+
+
+def tally_spreadsheets(
+    input_file_names,
+    num_processes=None,
+    num_bytes_per_shard=DEFAULT_NUM_BYTES_PER_CHUNK,
+    progress_callback=None
+):
+    """
+    Tally the ballots in the given voter data spreadsheets (which must all list the same Entries)
+    in shards across a pool of num_processes processes (by default, one per CPU; if num_processes
+    is 1, then every shard is tallied in this process). Return the merged ContestTally, in which
+    ballots appear in the same order as in the spreadsheets.
+
+    If given, progress_callback is called as progress_callback(num_shards_tallied, num_shards)
+    after each shard's tally is merged.
+    """
+
+    if num_processes is None:
+        num_processes = os.cpu_count() or 1
+
+    # each shard is a tuple of tally_shard's arguments
+    shards = []
+    entry_names = None
+    for input_file_name in input_file_names:
+        if is_sparse_spreadsheet(input_file_name):
+            file_entry_names = read_voter_spreadsheet(input_file_name).entry_names
+            shards.append((input_file_name, file_entry_names, None, None))
+        else:
+            file_entry_names, chunk_bounds = split_spreadsheet_into_chunks(
+                input_file_name, num_bytes_per_shard
+            )
+            shards.extend(
+                (input_file_name, file_entry_names, start, end) for start, end in chunk_bounds
+            )
+
+        if entry_names is None:
+            entry_names = file_entry_names
+        elif file_entry_names != entry_names:
+            raise ValueError(
+                f"The entries in {input_file_name} don't match the entries in"
+                f" {input_file_names[0]}."
+            )
+
+    contest_tally = ContestTally(entry_names or [])
+    num_shards_tallied = 0
+
+    def merge(shard_tally):
+        nonlocal num_shards_tallied
+        contest_tally.merge(ContestTally.from_bytes(shard_tally))
+        num_shards_tallied += 1
+        if progress_callback is not None:
+            progress_callback(num_shards_tallied, len(shards))
+
+    if num_processes == 1:
+        for shard in shards:
+            merge(tally_shard(*shard))
+    else:
+        with ProcessPoolExecutor(max_workers=num_processes) as executor:
+            # keep a bounded number of shards in flight, merging them in order as they finish
+            max_num_shards_in_flight = 2 * num_processes
+            futures = []
+            for shard in shards:
+                futures.append(executor.submit(tally_shard, *shard))
+                if len(futures) >= max_num_shards_in_flight:
+                    merge(futures.pop(0).result())
+            for future in futures:
+                merge(future.result())
+
+    return contest_tally
+
+
+def tally_shard(input_file_name, entry_names, start=None, end=None):
+    """
+    Tally the rows in bytes [start, end) of the given voter data spreadsheet (a shard from
+    chunkedspreadsheet.split_spreadsheet_into_chunks), whose Entries have the given names, or the
+    whole spreadsheet if start and end are None.
+    Return the serialized ContestTally (see ContestTally.to_bytes).
+    """
+
+    if start is None:
+        ballot_matrix = read_ballot_matrix_from_spreadsheet(
+            input_file_name, num_processes=1, keep_voter_names=False
+        )
+    else:
+        ballot_matrix = read_spreadsheet_chunk(
+            input_file_name, entry_names, start, end, keep_voter_names=False
+        )
+
+    contest_tally = ContestTally(entry_names)
+    contest_tally.add_ballot_matrix(ballot_matrix)
+    return contest_tally.to_bytes()
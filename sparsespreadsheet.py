@@ -0,0 +1,184 @@
+import csv
+
+from ballotsource import BallotSource
+
+"""
+Helpers for reading and writing sparse voter data spreadsheets.
+
+A wide voter data spreadsheet (written by preprocessing.create_voter_spreadsheet) has a row for
+every voter and a column for every entry, so when voters only rank a few of many entries, almost
+every cell is empty. A sparse voter data spreadsheet holds the same votes with one row per vote
+instead:
+
+ballot,voter,entry,rank
+,,Entry A,
+,,Entry B,
+,,Entry C,
+1,alice,Entry A,1
+1,alice,Entry C,2
+2,bob,Entry B,1
+3,carol,,
+
+Its header row is always SPARSE_SPREADSHEET_HEADER, which is how it's told apart from a wide
+spreadsheet (whose header row starts with "user"). Next come the entries, one per row with no ballot,
+voter, or rank, in the order of a wide spreadsheet's columns. Then come the votes: every row of a
+vote is numbered with its ballot, counting up from 1 in the order of a wide spreadsheet's rows, and a
+ballot's rows are next to each other, in the same order as the voter's rankings in a wide
+spreadsheet's row. A voter who cast no votes gets a single row with no entry or rank. Since ballots
+are told apart by their numbers rather than their voters' names, voters' names can be empty, and
+two voters in a row can have the same name.
+
+Either kind of spreadsheet can be read into a BallotSource with read_voter_spreadsheet, and
+converted into the other kind with convert_voter_spreadsheet.
+"""
+
+# the header row of a sparse voter data spreadsheet
+SPARSE_SPREADSHEET_HEADER = ["ballot", "voter", "entry", "rank"]
+
+
+def is_sparse_spreadsheet(input_file_name):
+    """
+    Return True if the given voter data spreadsheet is sparse, and False if it's wide.
+    """
+
+    with open(input_file_name, "r", newline="") as spreadsheet:
+        return next(csv.reader(spreadsheet, delimiter=","), None) == SPARSE_SPREADSHEET_HEADER
+
+
+def read_voter_spreadsheet(input_file_name):
+    """
+    Return a BallotSource (see ballotsource.py) streaming the ballots in the given voter data
+    spreadsheet, which may be sparse or wide. The rankings are the spreadsheet's cells, as strings.
+    """
+
+    if is_sparse_spreadsheet(input_file_name):
+        return _read_sparse_spreadsheet(input_file_name)
+    return _read_wide_spreadsheet(input_file_name)
+
+
+def write_sparse_spreadsheet(ballot_source, output_file_name):
+    """
+    Write the ballots in the given BallotSource to a sparse voter data spreadsheet at the given path.
+    """
+
+    with open(output_file_name, "w", newline="") as spreadsheet:
+        writer = csv.writer(spreadsheet, delimiter=",")
+
+        writer.writerow(SPARSE_SPREADSHEET_HEADER)
+        for entry_name in ballot_source.entry_names:
+            writer.writerow(["", "", entry_name, ""])
+
+        for ballot_number, (voter_name, votes) in enumerate(ballot_source, 1):
+            rows = [
+                [ballot_number, voter_name, ballot_source.entry_names[i], votes[i]]
+                for i in sorted(votes)
+                if votes[i] is not None and votes[i] != ""
+            ]
+            writer.writerows(rows or [[ballot_number, voter_name, "", ""]])
+
+
+def write_wide_spreadsheet(ballot_source, output_file_name):
+    """
+    Write the ballots in the given BallotSource to a wide voter data spreadsheet at the given path,
+    like preprocessing.create_voter_spreadsheet.
+    """
+
+    with open(output_file_name, "w", newline="") as spreadsheet:
+        writer = csv.writer(spreadsheet, delimiter=",")
+
+        writer.writerow(["user"] + list(ballot_source.entry_names))
+
+        num_entries = len(ballot_source.entry_names)
+        for voter_name, votes in ballot_source:
+            writer.writerow([voter_name] + [votes.get(i) for i in range(num_entries)])
+
+
+def convert_voter_spreadsheet(input_file_name, output_file_name, sparse):
+    """
+    Write the votes in the given voter data spreadsheet (sparse or wide) to a new spreadsheet at
+    the given path, which is sparse if sparse is True and wide otherwise.
+    """
+
+    ballot_source = read_voter_spreadsheet(input_file_name)
+    if sparse:
+        write_sparse_spreadsheet(ballot_source, output_file_name)
+    else:
+        write_wide_spreadsheet(ballot_source, output_file_name)
+
+
+def _read_sparse_spreadsheet(input_file_name):
+    # the entries are listed before any votes, so read them right away
+    entry_names = []
+    with open(input_file_name, "r", newline="") as spreadsheet:
+        reader = csv.reader(spreadsheet, delimiter=",")
+        next(reader)
+
+        for row in reader:
+            if not row:
+                continue
+            if row[0]:
+                break
+            entry_names.append(row[2])
+
+    # entry_indexes[n] contains the index of the entry named n
+    entry_indexes = {entry_name: i for i, entry_name in enumerate(entry_names)}
+
+    def get_ballots():
+        with open(input_file_name, "r", newline="") as spreadsheet:
+            reader = csv.reader(spreadsheet, delimiter=",")
+            next(reader)
+
+            # the ballot whose rows are being read, or None before the first ballot
+            ballot_number = None
+            voter_name = None
+            votes = None
+            num_entries_left_to_skip = len(entry_names)
+
+            for row in reader:
+                if not row:
+                    continue
+                if num_entries_left_to_skip:
+                    num_entries_left_to_skip -= 1
+                    continue
+
+                row_ballot_number, row_voter_name, entry_name, ranking = row
+                if row_ballot_number != ballot_number:
+                    if votes is not None:
+                        if int(row_ballot_number) <= int(ballot_number):
+                            raise ValueError(
+                                f"Ballot {row_ballot_number} in {input_file_name} comes after"
+                                f" ballot {ballot_number}, but ballots must be numbered in order,"
+                                f" with each ballot's rows next to each other."
+                            )
+                        yield (voter_name, votes)
+                    ballot_number = row_ballot_number
+                    voter_name = row_voter_name
+                    votes = {}
+
+                if entry_name:
+                    if entry_name not in entry_indexes:
+                        raise ValueError(
+                            f"{voter_name} voted for {entry_name} in {input_file_name},"
+                            f" but it isn't listed as an entry."
+                        )
+                    votes[entry_indexes[entry_name]] = ranking
+
+            if votes is not None:
+                yield (voter_name, votes)
+
+    return BallotSource(entry_names, get_ballots())
+
+
+def _read_wide_spreadsheet(input_file_name):
+    with open(input_file_name, "r", newline="") as spreadsheet:
+        entry_names = next(csv.reader(spreadsheet, delimiter=","))[1:]
+
+    def get_ballots():
+        with open(input_file_name, "r", newline="") as spreadsheet:
+            reader = csv.reader(spreadsheet, delimiter=",")
+            next(reader)
+
+            for row in reader:
+                yield (row[0], {i: ranking for i, ranking in enumerate(row[1:]) if ranking})
+
+    return BallotSource(entry_names, get_ballots())
@@ -0,0 +1,110 @@
+import csv
+import io
+import locale
+import os
+
+"""
+Helpers for reading a voter data spreadsheet (prepared by create_voter_spreadsheet in
+preprocessing.py) that keeps growing while it's read, such as one that's re-exported every few
+minutes while voting is still open. Only rows added since the last read are parsed.
+"""
+
+
+class SpreadsheetTail():
+    """
+    A SpreadsheetTail reads the rows that have been added to the end of a spreadsheet since it last
+    read it.
+
+    It assumes that rows are only ever added to the end of the spreadsheet. As a sanity check, it
+    makes sure the last row it read is still where it was, and raises an error if not, rather than
+    guessing which rows are new.
+    """
+
+
+    def __init__(self, input_file_name):
+        self.input_file_name = input_file_name
+        # the spreadsheet's header row, or None until it has been read
+        self.header = None
+        # the number of bytes of the spreadsheet read so far (read_new_rows always stops just after
+        # a line break, so a row that's still being written is never read half-finished)
+        self._num_bytes_read = 0
+        # the last line read, which is checked on every read to make sure the spreadsheet hasn't
+        # obviously been rewritten
+        self._last_line_read = b""
+
+
+    def mark_as_read(self, num_bytes_read):
+        """
+        Treat the header row and the first num_bytes_read bytes of the spreadsheet as already read
+        (for instance, by Contest.populate_from_spreadsheet), so that the next call to read_new_rows
+        only returns the rows after them.
+        """
+
+        with open(self.input_file_name, "rb") as spreadsheet:
+            header_line = spreadsheet.readline()
+            num_bytes_read = max(num_bytes_read, len(header_line))
+
+            # find the start of the last line read, a block at a time from the end, skipping the
+            # line break at the end of the line itself
+            line_start = 0
+            search_end = num_bytes_read - 1
+            while search_end > 0:
+                block_start = max(0, search_end - 2 ** 16)
+                spreadsheet.seek(block_start)
+                i = spreadsheet.read(search_end - block_start).rfind(b"\n")
+                if i != -1:
+                    line_start = block_start + i + 1
+                    break
+                search_end = block_start
+
+            spreadsheet.seek(line_start)
+            self._last_line_read = spreadsheet.read(num_bytes_read - line_start)
+
+        self._num_bytes_read = num_bytes_read
+        self.header = next(self._parse_rows(header_line), None)
+
+
+    def read_new_rows(self):
+        """
+        Return a list of the rows (lists of cells, not including the header row) that have been
+        added to the spreadsheet since the last call.
+        """
+
+        with open(self.input_file_name, "rb") as spreadsheet:
+            num_bytes_total = os.fstat(spreadsheet.fileno()).st_size
+            if num_bytes_total < self._num_bytes_read:
+                raise ValueError(f"{self.input_file_name} has shrunk since it was last read.")
+
+            spreadsheet.seek(self._num_bytes_read - len(self._last_line_read))
+            if spreadsheet.read(len(self._last_line_read)) != self._last_line_read:
+                raise ValueError(
+                    f"The rows of {self.input_file_name} that were read already have changed."
+                )
+
+            new_data = spreadsheet.read(num_bytes_total - self._num_bytes_read)
+
+        # only read complete lines; the last one may still be being written
+        end = new_data.rfind(b"\n") + 1
+        if end == 0:
+            return []
+        new_data = new_data[:end]
+
+        self._num_bytes_read += end
+        self._last_line_read = new_data[new_data.rfind(b"\n", 0, end - 1) + 1:]
+
+        rows = list(self._parse_rows(new_data))
+
+        if self.header is None and rows:
+            self.header = rows.pop(0)
+
+        return rows
+
+
+    def _parse_rows(self, data):
+        """
+        Return an iterator over the (non-empty) rows in the given bytes from the spreadsheet.
+        """
+
+        # decode the rows the same way open() would decode a text file by default
+        text = data.decode(locale.getpreferredencoding(False))
+        return (row for row in csv.reader(io.StringIO(text, newline=""), delimiter=",") if row)
@@ -1,20 +1,26 @@
+import bisect
 import csv
 import itertools
 import math
 import random
+from fractions import Fraction
 
+from ballotgroup import get_snapshot_voters, snapshot_ballot_groups
 from contest import Contest
 from entry import Entry
+from reportsink import ReportSink
+from roundresult import RoundResult
 from voter import Voter
 
 class STVContest(Contest):
     """
     An STVContest contains Voters who have assigned rankings (numbers) to various Entries.
     It also has a desired number of winners.
+    Votes are counted and transferred one BallotGroup at a time.
     """
 
 
-    # how wide in characters the vote bars printed by _print_instant_runoff_chart should be
+    # how wide in characters the vote bars printed by _print_round_chart should be
     # if the bar represents 100%
     NUM_CHARS_IN_FULL_VOTE_BAR = 100
 
@@ -27,6 +33,52 @@ class STVContest(Contest):
     ELIMINATED_VOTER_COLUMN_NAME = "voters who stopped as all their remaining picks left the race"
 
 
+    # ways a winner's surplus can be transferred (see __init__)
+    RANDOM_SURPLUS_TRANSFER = "random"
+    GREGORY_SURPLUS_TRANSFER = "gregory"
+
+
+    METERED_PHASES = Contest.METERED_PHASES + [
+        "_allocate_voters",
+        "_reallocate_voters",
+        "_sample_voters",
+        "_run_first_round",
+        "_run_winner_declaration_round",
+        "_run_winner_reallocation_round",
+        "_run_elimination_round",
+        "_write_current_round_to_spreadsheet",
+    ]
+
+
+    def __init__(
+        self,
+        verbose=True,
+        background_reports=True,
+        seed=None,
+        surplus_transfer=RANDOM_SURPLUS_TRANSFER,
+        metrics=None
+    ):
+        super().__init__(verbose, background_reports, metrics)
+
+        # how a winner's surplus votes are transferred:
+        # * with RANDOM_SURPLUS_TRANSFER, a random sample of the winner's Voters, as many as its
+        #     surplus, move to their next choices;
+        # * with GREGORY_SURPLUS_TRANSFER (the weighted inclusive Gregory method), all of the
+        #     winner's Voters move to their next choices, but each of their votes only carries the
+        #     fraction (surplus / the winner's votes) of its previous value. The winner with the
+        #     largest surplus transfers first, so only ties for last place are broken at random.
+        if surplus_transfer not in [
+            STVContest.RANDOM_SURPLUS_TRANSFER, STVContest.GREGORY_SURPLUS_TRANSFER
+        ]:
+            raise ValueError(f"Unknown surplus transfer method {surplus_transfer}.")
+        self.surplus_transfer = surplus_transfer
+
+        # the source of randomness for picking surplus Voters and breaking ties: a random.Random
+        # seeded with the given seed, or the random module itself (so random.seed applies) if no
+        # seed is given
+        self._random = random if seed is None else random.Random(seed)
+
+
     def _write_current_round_to_spreadsheet(self, output_file_name_prefix):
         """
         Write out the contest's current status to a spreadsheet at the path
@@ -38,155 +90,165 @@ class STVContest(Contest):
         Each of the remaining columns represents an Entry that's still in the running.
         Each cell in those columns represents a Voter who voted for that column's Entry.
         Those cells contain the Voter name, the rank they gave the Entry, and the round during
-        which they voted for the Entry
-        """
+        which they voted for the Entry, followed by the fraction of the Voter's vote that the Entry
+        holds if it's less than 1 (see GREGORY_SURPLUS_TRANSFER)
 
-        output_file_name = f"{output_file_name_prefix}-round{self._round_number}.csv"
-
-        if self.verbose:
-            print(f"Writing round {self._round_number} vote data to {output_file_name}...",
-                end="", flush=True)
+        The spreadsheet is written by self._report_sink, from a snapshot of the current round, so
+        counting can continue while it's written.
+        If output_file_name_prefix is None, then nothing is written.
+        """
 
-        with open(output_file_name, "w", newline="") as spreadsheet:
-            writer = csv.writer(spreadsheet, delimiter=",")
+        if output_file_name_prefix is None:
+            return
 
-            header = [
-                STVContest.INVALID_VOTER_COLUMN_NAME,
-                STVContest.ELIMINATED_VOTER_COLUMN_NAME,
-                *[entry.name for entry in self.entries]
-            ]
-            writer.writerow(header)
-
-            # construct a list for each entry column
-            entry_columns = []
-            for entry in self.entries:
-                # each column is filled with data on the user that voted for that Entry
-                # and which rank the user gave that Entry
-                entry_column = []
-                for voter in entry.instant_runoff_voters:
-                    voter_info_string = (
-                        f"{voter.name}: round {voter.round_when_last_moved}, "
-                        f"rank {voter.get_ranking_of_entry(entry)}"
-                    )
-                    entry_column.append(voter_info_string)
-
-                entry_columns.append(entry_column)
-
-            # rearrange the body of the spreadsheet into a list of rows (so each list passed in as
-            # an argument becomes a column in the final body)
-            body = itertools.zip_longest(
-                [voter.name for voter in self._voters_with_no_valid_votes],
-                [
-                    f"{voter.name}: round {voter.round_when_last_moved}"
-                    for voter in self._voters_with_no_remaining_valid_votes
-                ],
-                *entry_columns,
-                fillvalue=""
-            )
-            for row in body:
-                writer.writerow(row)
+        output_file_name = f"{output_file_name_prefix}-round{self._round_number}.csv"
 
         if self.verbose:
-            print(" done.")
+            print(f"Writing round {self._round_number} vote data to {output_file_name}.")
+
+        self._report_sink.submit(
+            _write_round_spreadsheet,
+            output_file_name,
+            tuple(
+                (entry, snapshot_ballot_groups(entry.instant_runoff_ballot_groups))
+                for entry in self.entries
+            ),
+            snapshot_ballot_groups(self._ballot_groups_with_no_valid_votes),
+            snapshot_ballot_groups(self._ballot_groups_with_no_remaining_valid_votes)
+        )
 
 
-    def _print_chart_to_console(self):
+    def _get_round_result(self):
         """
-        Output a chart of the current votes to the console.
+        Return a RoundResult recording the current round.
         """
 
-        longest_entry_name_length = max(len(entry.name) for entry in self.entries)
-
-        print()
-        for entry in self.entries:
-            # once entry has won or lost, we never actually removed its Voters (there's no need to)
-            # so len(entry.instant_runoff_voters) won't actually reflect entry's true number of Voters
-            if entry.has_won:
-                status_indicator = "WON"
-            elif entry.has_lost:
-                status_indicator = "LOST"
-            else:
-                status_indicator = ""
-
-            vote_fraction = len(entry.instant_runoff_voters) / self._num_valid_voters
-
-            # bar in chart showing vote count
-            num_chars_in_vote_bar = round(STVContest.NUM_CHARS_IN_FULL_VOTE_BAR * vote_fraction)
-            vote_bar = "\u25A0" * num_chars_in_vote_bar
-
-            # text showing percentage of voters voting for this entry
-            percentage_text = f"{round(100 * vote_fraction, 1)}%"
-
-            # text showing fraction of voters voting for this entry
-            fraction_text = f"{len(entry.instant_runoff_voters)}/{self._num_valid_voters}"
-
-            # text showing how much the count changed this round
-            change_text_sign = "+" if entry.num_voters_gained_in_current_instant_runoff_round >= 0 else ""
-            change_text = f"{change_text_sign}{entry.num_voters_gained_in_current_instant_runoff_round} this round"
-
-            entry_output = status_indicator.ljust(6)
-            entry_output += entry.name.ljust(longest_entry_name_length + 2)
-            entry_output += f"{vote_bar} {percentage_text} ({fraction_text}; {change_text})"
-            print(entry_output)
-
-        print()
+        statuses = self._get_entry_statuses()
+        changed_entry_ids = [
+            i for i, (status_before_round, status) in enumerate(zip(self._statuses_before_round, statuses))
+            if status != status_before_round
+        ]
 
-        # print info about unused voters
-        print(f"{STVContest.INVALID_VOTER_COLUMN_NAME}: {len(self._voters_with_no_valid_votes)}")
-        print(
-            f"{STVContest.ELIMINATED_VOTER_COLUMN_NAME}: "
-            f"{len(self._voters_with_no_remaining_valid_votes)}"
-            f" (+{self._num_voters_exhausted_in_current_round} this round)"
+        return RoundResult(
+            self._round_number,
+            statuses,
+            tallies=[entry.num_instant_runoff_voters for entry in self.entries],
+            tally_changes=[
+                entry.num_voters_gained_in_current_instant_runoff_round for entry in self.entries
+            ],
+            elected=[i for i in changed_entry_ids if statuses[i] == RoundResult.WON],
+            eliminated=[i for i in changed_entry_ids if statuses[i] == RoundResult.LOST],
+            transfers=self._round_transfers,
+            num_valid_voters=self._num_valid_voters,
+            num_voters_with_no_valid_votes=self._num_voters_with_no_valid_votes,
+            num_exhausted_voters=self._num_voters_with_no_remaining_valid_votes,
+            num_exhausted_voters_in_round=self._num_voters_exhausted_in_current_round
         )
 
 
-    def _allocate_voters(self, voters_to_allocate):
+    def _allocate_voters(self, ballot_groups_to_allocate):
         """
-        Allocate the given Voters to their first-choice entry.
-        If they don't have a first choice, add them to self._voters_with_no_valid_votes.
+        Allocate the Voters in the given BallotGroups to their first-choice entry.
+        If they don't have a first choice, add them to self._ballot_groups_with_no_valid_votes.
         """
 
-        for voter in voters_to_allocate:
-            # prepare voter to iterate through their valid votes
-            iter(voter)
+        for ballot_group in ballot_groups_to_allocate:
+            # prepare ballot_group to iterate through its valid votes
+            iter(ballot_group)
 
-            favorite_entry = next(voter)
+            favorite_entry = next(ballot_group)
             if favorite_entry is None:
-                # the voter cast no valid votes
-                self._voters_with_no_valid_votes.append(voter)
+                # the voters cast no valid votes
+                self._ballot_groups_with_no_valid_votes.append(ballot_group)
+                self._num_voters_with_no_valid_votes += ballot_group.num_votes
             else:
-                favorite_entry.instant_runoff_voters.append(voter)
-                favorite_entry.num_voters_gained_in_current_instant_runoff_round += 1
+                favorite_entry.instant_runoff_ballot_groups[ballot_group] = None
+                favorite_entry.num_instant_runoff_voters += ballot_group.num_votes
+                favorite_entry.num_voters_gained_in_current_instant_runoff_round += ballot_group.num_votes
 
-            voter.round_when_last_moved = self._round_number
+            ballot_group.round_when_last_moved = self._round_number
+            ballot_group.arrival_key = (self._round_number, 0)
 
+        if self.metrics is not None:
+            self.metrics.add("ballot_groups_allocated", len(ballot_groups_to_allocate))
 
-    def _reallocate_voters(self, current_entry, voters_to_reallocate):
+
+    def _reallocate_voters(self, current_entry, ballot_groups_to_reallocate):
         """
-        Reallocate the given Voters to their next-choice entry.
-        If they don't have a next choice, add them to self._voters_with_no_remaining_valid_votes.
+        Reallocate the Voters in the given BallotGroups to their next-choice entry.
+        If they don't have a next choice, add them to
+        self._ballot_groups_with_no_remaining_valid_votes.
         """
 
-        for voter in voters_to_reallocate:
-            next_favorite_entry = next(voter)
+        num_voters_to_reallocate = 0
+        num_voters_exhausted_before = self._num_voters_exhausted_in_current_round
+
+        for ballot_group in ballot_groups_to_reallocate:
+            # for bookkeeping purposes, remove the BallotGroup from the old Entry
+            # (this does nothing if the BallotGroup was just split off from one of the old Entry's)
+            current_entry.instant_runoff_ballot_groups.pop(ballot_group, None)
+
+            next_favorite_entry = next(ballot_group)
             if next_favorite_entry is None:
-                # the voter cast no valid votes
-                self._voters_with_no_remaining_valid_votes.append(voter)
-                self._num_voters_exhausted_in_current_round += 1
+                # the voters cast no valid votes
+                self._ballot_groups_with_no_remaining_valid_votes.append(ballot_group)
+                self._num_voters_with_no_remaining_valid_votes += ballot_group.num_votes
+                self._num_voters_exhausted_in_current_round += ballot_group.num_votes
             else:
-                next_favorite_entry.instant_runoff_voters.append(voter)
-                next_favorite_entry.num_voters_gained_in_current_instant_runoff_round += 1
+                next_favorite_entry.instant_runoff_ballot_groups[ballot_group] = None
+                next_favorite_entry.num_instant_runoff_voters += ballot_group.num_votes
+                next_favorite_entry.num_voters_gained_in_current_instant_runoff_round += ballot_group.num_votes
+
+            ballot_group.round_when_last_moved = self._round_number
+            # only one Entry's Voters move in each round
+            ballot_group.arrival_key = (self._round_number, 0) + ballot_group.arrival_key
+            num_voters_to_reallocate += ballot_group.num_votes
+
+        current_entry.num_instant_runoff_voters -= num_voters_to_reallocate
+        current_entry.num_voters_gained_in_current_instant_runoff_round -= num_voters_to_reallocate
+        self._round_transfers.append((current_entry.id, num_voters_to_reallocate))
+
+        if self.metrics is not None:
+            self.metrics.add("ballot_groups_moved", len(ballot_groups_to_reallocate))
+            self.metrics.add("voters_moved", num_voters_to_reallocate)
+            self.metrics.add(
+                "voters_exhausted",
+                self._num_voters_exhausted_in_current_round - num_voters_exhausted_before
+            )
 
-            voter.round_when_last_moved = self._round_number
 
-        # for bookkeeping purposes, remove all the Voters from the old Entry
-        # NOTE not the most efficient but doesn't really need to be
-        current_entry.instant_runoff_voters = [
-            voter for voter in current_entry.instant_runoff_voters
-            if voter not in voters_to_reallocate
-        ]
+    def _sample_voters(self, ballot_groups, num_voters):
+        """
+        Select num_voters Voters at random out of the given BallotGroups, with every Voter equally
+        likely to be picked. Return BallotGroups containing exactly the selected Voters.
+        A BallotGroup whose Voters were all selected is returned as-is; otherwise the selected Voters
+        are split off into a new BallotGroup.
+        """
+
+        # cumulative_weights[g] contains the number of Voters in ballot_groups[:g + 1], so
+        # Voter number v (indexed from 0) belongs to the first BallotGroup whose cumulative
+        # weight exceeds v
+        cumulative_weights = list(itertools.accumulate(
+            ballot_group.weight for ballot_group in ballot_groups
+        ))
+
+        selected_voter_indexes_by_group = {}
+        for v in self._random.sample(range(cumulative_weights[-1]), k=num_voters):
+            g = bisect.bisect_right(cumulative_weights, v)
+            first_voter_in_group = cumulative_weights[g - 1] if g > 0 else 0
+            if g not in selected_voter_indexes_by_group:
+                selected_voter_indexes_by_group[g] = []
+            selected_voter_indexes_by_group[g].append(v - first_voter_in_group)
+
+        selected_ballot_groups = []
+        for g, voter_indexes in sorted(selected_voter_indexes_by_group.items()):
+            ballot_group = ballot_groups[g]
+            if len(voter_indexes) == ballot_group.weight:
+                selected_ballot_groups.append(ballot_group)
+            else:
+                selected_ballot_groups.append(ballot_group.split(voter_indexes))
 
-        current_entry.num_voters_gained_in_current_instant_runoff_round -= len(voters_to_reallocate)
+        return selected_ballot_groups
 
 
     def _run_first_round(self):
@@ -202,7 +264,7 @@ class STVContest(Contest):
             entry.num_voters_gained_in_current_instant_runoff_round = 0
         self._num_voters_exhausted_in_current_round = 0
 
-        self._allocate_voters(self.voters)
+        self._allocate_voters(self.ballot_groups)
 
         # all Entries are still in the race; even if an Entry got no votes, we say it is still in,
         # and we'll just remove it in a later round
@@ -234,7 +296,7 @@ class STVContest(Contest):
             if self.verbose:
                 print(
                     f"* {winner.name} won"
-                    f" (earned {len(winner.instant_runoff_voters)} votes,"
+                    f" (earned {_format_num_votes(winner.num_instant_runoff_voters)} votes,"
                     f" needed {self._min_num_voters_to_win})"
                 )
 
@@ -253,16 +315,33 @@ class STVContest(Contest):
             entry.num_voters_gained_in_current_instant_runoff_round = 0
         self._num_voters_exhausted_in_current_round = 0
 
-        winner = random.choice(declared_winners_still_with_surplus)
-        num_surplus_voters = len(winner.instant_runoff_voters) - self._min_num_voters_to_win
-        surplus_voters = random.sample(winner.instant_runoff_voters, k=num_surplus_voters)
+        if self.surplus_transfer == STVContest.GREGORY_SURPLUS_TRANSFER:
+            winner = max(
+                declared_winners_still_with_surplus, key=lambda w: w.num_instant_runoff_voters
+            )
+        else:
+            winner = self._random.choice(declared_winners_still_with_surplus)
+        num_surplus_voters = winner.num_instant_runoff_voters - self._min_num_voters_to_win
+
+        if self.surplus_transfer == STVContest.GREGORY_SURPLUS_TRANSFER:
+            # every BallotGroup transfers the same fraction of its value
+            transfer_fraction = Fraction(num_surplus_voters) / winner.num_instant_runoff_voters
+            surplus_ballot_groups = [
+                ballot_group.split_transfer_value(transfer_fraction)
+                for ballot_group in winner.instant_runoff_ballot_groups
+            ]
+        else:
+            surplus_ballot_groups = self._sample_voters(
+                list(winner.instant_runoff_ballot_groups), num_surplus_voters
+            )
 
-        self._reallocate_voters(winner, surplus_voters)
+        self._reallocate_voters(winner, surplus_ballot_groups)
 
         if self.verbose:
             print(
                 f"* only {len(self._winners)}/{self._num_winners} winners have been found,"
-                f" so winner {winner.name} reallocated its {num_surplus_voters} surplus votes"
+                f" so winner {winner.name} reallocated its"
+                f" {_format_num_votes(num_surplus_voters)} surplus votes"
             )
 
 
@@ -282,61 +361,42 @@ class STVContest(Contest):
 
         # pick a loser at random out of all the bottom vote-getters
         num_voters_for_bottom_entry_still_in_race = min(
-            len(entry.instant_runoff_voters) for entry in self._entries_still_in_race
+            entry.num_instant_runoff_voters for entry in self._entries_still_in_race
         )
         bottom_entries_still_in_race = [
             entry for entry in self._entries_still_in_race
-            if len(entry.instant_runoff_voters) == num_voters_for_bottom_entry_still_in_race
+            if entry.num_instant_runoff_voters == num_voters_for_bottom_entry_still_in_race
         ]
-        loser = random.choice(bottom_entries_still_in_race)
+        loser = self._random.choice(bottom_entries_still_in_race)
 
         if self.verbose:
             print(
-                f"* {loser.name} was eliminated"
-                f" as it had the fewest votes ({num_voters_for_bottom_entry_still_in_race})"
+                f"* {loser.name} was eliminated as it had the fewest votes"
+                f" ({_format_num_votes(num_voters_for_bottom_entry_still_in_race)})"
             )
 
         self._entries_still_in_race.remove(loser)
         loser.has_lost = True
-        self._reallocate_voters(loser, loser.instant_runoff_voters)
+        self._reallocate_voters(loser, list(loser.instant_runoff_ballot_groups))
 
         if self.verbose:
             print(
                 f"* {loser.name} reallocated its"
-                f" {num_voters_for_bottom_entry_still_in_race} votes"
+                f" {_format_num_votes(num_voters_for_bottom_entry_still_in_race)} votes"
             )
 
 
-    def get_winners(self, num_winners, output_file_name_prefix):
+    def _run_all_rounds(self, output_file_name_prefix):
         """
-        Run the contest using multi-winner instant-runoff voting using the Droop quota and
-        random surplus allocation.
-        For every round of voting, output a spreadsheet whose columns are entries, with the rows
-        populated by users who voted for those entries.
-        The contest terminates once self._num_winners winners have won.
-        Return the Entry objects representing the winners.
+        Run rounds of the contest until self._num_winners winners have won, writing out a
+        spreadsheet for every round.
         """
 
-        if num_winners >= len(self.entries):
-            raise ValueError(
-                "A STVContest must have fewer winners then entries."
-                f" This STVContest seeks to produce {num_winners} winners"
-                f" but has only {len(self.entries)} entries."
-            )
-
-        self._num_winners = num_winners
-
-        # users who cast no valid votes
-        self._voters_with_no_valid_votes = []
-        # users who cast valid votes, but only for Entries that have been eliminated already
-        self._voters_with_no_remaining_valid_votes = []
-        # the amount of voters who have had all of their entries eliminated during this round
-        self._num_voters_exhausted_in_current_round = 0
-        self._entries_still_in_race = []
-        self._winners = []
-        self._round_number = 1
+        entry_names = [entry.name for entry in self.entries]
 
         # round 1: everyone votes for their top pick
+        self._statuses_before_round = self._get_entry_statuses()
+        self._round_transfers = []
         self._run_first_round()
 
         # Use the "Droop Quota" as the minimum vote threshold.
@@ -347,24 +407,27 @@ class STVContest(Contest):
         # If an Entry gets more than v/(w+1) votes, so at least (v/(w+1)) + 1 votes, then there's
         # no way for w other Entries to perform equally well, as that would imply at least
         # (w+1) * ((v/(w+1)) + 1) = v + w + 1 votes were cast, and that's more than v votes.
-        self._num_valid_voters = len(self.voters) - len(self._voters_with_no_valid_votes)
+        self._num_valid_voters = len(self.voters) - self._num_voters_with_no_valid_votes
         self._min_num_voters_to_win = math.floor(self._num_valid_voters / (self._num_winners + 1)) + 1
 
+        self.round_results.append(self._get_round_result())
         self._write_current_round_to_spreadsheet(output_file_name_prefix)
         if self.verbose:
-            self._print_chart_to_console()
+            _print_round_chart(self.round_results[-1], entry_names)
 
         while len(self._winners) < self._num_winners:
             self._round_number += 1
+            self._statuses_before_round = self._get_entry_statuses()
+            self._round_transfers = []
 
             undeclared_winners = [
                 entry for entry in self._entries_still_in_race
-                if len(entry.instant_runoff_voters) >= self._min_num_voters_to_win and not entry.has_won
+                if entry.num_instant_runoff_voters >= self._min_num_voters_to_win and not entry.has_won
             ]
 
             declared_winners_still_with_surplus = [
                 winner for winner in self._winners
-                if len(winner.instant_runoff_voters) > self._min_num_voters_to_win
+                if winner.num_instant_runoff_voters > self._min_num_voters_to_win
             ]
 
             if undeclared_winners:
@@ -383,9 +446,10 @@ class STVContest(Contest):
                 # remove one of the last-place entries from the race
                 self._run_elimination_round()
 
+            self.round_results.append(self._get_round_result())
             self._write_current_round_to_spreadsheet(output_file_name_prefix)
             if self.verbose:
-                self._print_chart_to_console()
+                _print_round_chart(self.round_results[-1], entry_names)
 
             # special case: if we still have to crown, say, 10 winners and there are only
             # 10 Entries left, then those 10 Entries are the winners
@@ -401,8 +465,54 @@ class STVContest(Contest):
                 for entry_still_in_race in self._entries_still_in_race:
                     self._winners.append(entry_still_in_race)
                     entry_still_in_race.has_won = True
+                # the remaining entries were crowned in this round, so record them as its winners
+                self.round_results[-1] = self._get_round_result()
                 break
 
+        self._flush_reports()
+
+
+    def get_winners(self, num_winners, output_file_name_prefix):
+        """
+        Run the contest using multi-winner instant-runoff voting using the Droop quota and
+        random or fractional surplus allocation (see self.surplus_transfer).
+        For every round of voting, output a spreadsheet whose columns are entries, with the rows
+        populated by users who voted for those entries (unless output_file_name_prefix is None).
+        The contest terminates once self._num_winners winners have won.
+        Return the Entry objects representing the winners.
+        """
+
+        if num_winners >= len(self.entries):
+            raise ValueError(
+                "A STVContest must have fewer winners then entries."
+                f" This STVContest seeks to produce {num_winners} winners"
+                f" but has only {len(self.entries)} entries."
+            )
+
+        self._num_winners = num_winners
+
+        # BallotGroups of users who cast no valid votes, and the number of those users
+        self._ballot_groups_with_no_valid_votes = []
+        self._num_voters_with_no_valid_votes = 0
+        # BallotGroups of users who cast valid votes, but only for Entries that have been eliminated
+        # already, and the number of those users
+        self._ballot_groups_with_no_remaining_valid_votes = []
+        self._num_voters_with_no_remaining_valid_votes = 0
+        # the amount of voters who have had all of their entries eliminated during this round
+        self._num_voters_exhausted_in_current_round = 0
+        self._entries_still_in_race = []
+        self._winners = []
+        self._round_number = 1
+        self.round_results = []
+
+        # spreadsheets are written by self._report_sink, which is closed (waiting for any
+        # spreadsheets still being written) once the contest is over
+        with ReportSink(
+            self.background_reports, track_output=self.metrics is not None
+        ) as self._report_sink:
+            self._run_all_rounds(output_file_name_prefix)
+        self._record_report_metrics(self._report_sink)
+
         if self.verbose:
             print()
             print(
@@ -411,3 +521,126 @@ class STVContest(Contest):
             )
             print(f"WINNERS: {[winner.name for winner in self._winners]}")
         return self._winners
+
+
+def _print_round_chart(round_result, entry_names):
+    """
+    Output a chart of the votes at the end of the given round (a RoundResult of an STVContest) to
+    the console, given the names of its Entries.
+    """
+
+    longest_entry_name_length = max(len(entry_name) for entry_name in entry_names)
+
+    print()
+    for i, entry_name in enumerate(entry_names):
+        # once an entry has won or lost, we never actually removed its Voters (there's no need to)
+        # so its tally won't actually reflect its true number of Voters
+        if round_result.statuses[i] == RoundResult.WON:
+            status_indicator = "WON"
+        elif round_result.statuses[i] == RoundResult.LOST:
+            status_indicator = "LOST"
+        else:
+            status_indicator = ""
+
+        num_votes = round_result.tallies[i]
+        num_votes_gained = round_result.tally_changes[i]
+
+        vote_fraction = float(num_votes / round_result.num_valid_voters)
+
+        # bar in chart showing vote count
+        num_chars_in_vote_bar = round(STVContest.NUM_CHARS_IN_FULL_VOTE_BAR * vote_fraction)
+        vote_bar = "\u25A0" * num_chars_in_vote_bar
+
+        # text showing percentage of voters voting for this entry
+        percentage_text = f"{round(100 * vote_fraction, 1)}%"
+
+        # text showing fraction of voters voting for this entry
+        fraction_text = f"{_format_num_votes(num_votes)}/{round_result.num_valid_voters}"
+
+        # text showing how much the count changed this round
+        change_text_sign = "+" if num_votes_gained >= 0 else ""
+        change_text = f"{change_text_sign}{_format_num_votes(num_votes_gained)} this round"
+
+        entry_output = status_indicator.ljust(6)
+        entry_output += entry_name.ljust(longest_entry_name_length + 2)
+        entry_output += f"{vote_bar} {percentage_text} ({fraction_text}; {change_text})"
+        print(entry_output)
+
+    print()
+
+    # print info about unused voters
+    print(f"{STVContest.INVALID_VOTER_COLUMN_NAME}: {round_result.num_voters_with_no_valid_votes}")
+    print(
+        f"{STVContest.ELIMINATED_VOTER_COLUMN_NAME}: "
+        f"{_format_num_votes(round_result.num_exhausted_voters)}"
+        f" (+{_format_num_votes(round_result.num_exhausted_voters_in_round)} this round)"
+    )
+
+
+def _write_round_spreadsheet(
+    output_file_name,
+    entry_ballot_groups,
+    ballot_groups_with_no_valid_votes,
+    ballot_groups_with_no_remaining_valid_votes
+):
+    """
+    Write the spreadsheet described in STVContest._write_current_round_to_spreadsheet.
+    entry_ballot_groups contains an (Entry, BallotGroup snapshot) tuple for every Entry, and the
+    other arguments are BallotGroup snapshots (see snapshot_ballot_groups).
+    """
+
+    with open(output_file_name, "w", newline="") as spreadsheet:
+        writer = csv.writer(spreadsheet, delimiter=",")
+
+        header = [
+            STVContest.INVALID_VOTER_COLUMN_NAME,
+            STVContest.ELIMINATED_VOTER_COLUMN_NAME,
+            *[entry.name for entry, _ in entry_ballot_groups]
+        ]
+        writer.writerow(header)
+
+        # construct a list for each entry column
+        entry_columns = []
+        for entry, ballot_groups in entry_ballot_groups:
+            # each column is filled with data on the user that voted for that Entry
+            # and which rank the user gave that Entry, in the order the users reached the Entry
+            entry_column = []
+            for voter, round_when_last_moved, transfer_value in get_snapshot_voters(ballot_groups):
+                voter_info_string = (
+                    f"{voter.name}: round {round_when_last_moved}, "
+                    f"rank {voter.get_ranking_of_entry(entry)}"
+                )
+                if transfer_value != 1:
+                    voter_info_string += f", weight {_format_num_votes(transfer_value)}"
+                entry_column.append(voter_info_string)
+
+            entry_columns.append(entry_column)
+
+        # rearrange the body of the spreadsheet into a list of rows (so each list passed in as
+        # an argument becomes a column in the final body)
+        body = itertools.zip_longest(
+            [voter.name for voter, _, _ in get_snapshot_voters(ballot_groups_with_no_valid_votes)],
+            [
+                f"{voter.name}: round {round_when_last_moved}" + (
+                    f", weight {_format_num_votes(transfer_value)}" if transfer_value != 1 else ""
+                )
+                for voter, round_when_last_moved, transfer_value
+                in get_snapshot_voters(ballot_groups_with_no_remaining_valid_votes)
+            ],
+            *entry_columns,
+            fillvalue=""
+        )
+        for row in body:
+            writer.writerow(row)
+
+
+def _format_num_votes(num_votes):
+    """
+    Return a string showing the given number of votes, which is a whole number unless some votes
+    were transferred fractionally (see STVContest.GREGORY_SURPLUS_TRANSFER).
+    """
+
+    if num_votes == int(num_votes):
+        return str(int(num_votes))
+
+    return f"{float(num_votes):.4f}"
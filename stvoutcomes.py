@@ -0,0 +1,379 @@
+import heapq
+import itertools
+import math
+from fractions import Fraction
+
+from montecarlo import estimate_stv_win_probabilities
+
+"""
+Helper functions for finding the exact probability of every possible outcome of an STVContest.
+
+An STVContest makes two kinds of random choices: which of the last-place Entries to eliminate (see
+STVContest._run_elimination_round), and which winner reallocates its surplus and which of its
+Voters make up that surplus (see STVContest._run_winner_reallocation_round). Every choice leads to a
+new count state, so the possible counts form a tree of states. Many branches converge on the same
+tally, though (for example, whenever the surplus Voters that were picked all have the same next
+choice), so get_stv_outcome_probabilities merges equivalent states and explores them as a DAG.
+
+A count state records, for each Entry, whether it's still in the race, has won, or has lost, along
+with the ballots backing it. Ballots are stored as (ballot, weight) pairs, where the ballot is a
+tuple of Entry ids: Voters with the same ballot backing the same Entry always move together, so
+nothing else about them matters. (Voters whose ballots are exhausted are dropped, since they can't
+affect the rest of the count.) Every round removes an Entry from the race or reallocates a winner's
+surplus, so the states can be explored in order of how much of the count is left, which guarantees
+that every path into a state has been explored by the time the state is.
+"""
+
+# the default number of count states to explore before giving up and estimating the outcome
+# probabilities with Monte Carlo trials instead
+DEFAULT_MAX_NUM_STATES = 100000
+
+# the default number of Monte Carlo trials to run if the exact search is abandoned
+DEFAULT_NUM_FALLBACK_TRIALS = 10000
+
+# the statuses of Entries in a count state
+_IN_RACE = 0
+_WON = 1
+_LOST = 2
+
+
+class STVOutcomeProbabilities():
+    """
+    STVOutcomeProbabilities record how likely each set of winners is for an STVContest.
+    The probabilities are exact Fractions if is_exact is True, and otherwise they're floats
+    estimated from the Monte Carlo trials in monte_carlo_results.
+    """
+
+
+    def __init__(self, entry_names, winner_set_probabilities, is_exact, monte_carlo_results=None):
+        self.entry_names = entry_names
+        # self.winner_set_probabilities[s] contains the probability that the winners are exactly
+        # the Entries named in s
+        self.winner_set_probabilities = winner_set_probabilities
+        self.is_exact = is_exact
+        # the MonteCarloResults the probabilities were estimated from, or None if they're exact
+        self.monte_carlo_results = monte_carlo_results
+
+
+    def get_win_probability(self, entry_name):
+        """
+        Return the probability that the Entry with the given name is one of the winners.
+        """
+
+        return sum(
+            probability for winner_set, probability in self.winner_set_probabilities.items()
+            if entry_name in winner_set
+        )
+
+
+    def print_summary(self):
+        """
+        Print the probability of each set of winners to the console, from most to least likely.
+        """
+
+        print()
+        if self.is_exact:
+            print("Exact probabilities of each set of winners:")
+        else:
+            print(
+                "The count had too many possible states to explore, so these probabilities were"
+                f" estimated from {self.monte_carlo_results.num_trials} trials:"
+            )
+        print()
+        for winner_set, probability in sorted(
+            self.winner_set_probabilities.items(), key=lambda item: item[1], reverse=True
+        ):
+            probability_text = f"{round(100 * float(probability), 3)}%"
+            if self.is_exact:
+                probability_text += f" ({probability})"
+            print(f"\t{sorted(winner_set)}: {probability_text}")
+
+
+def get_stv_outcome_probabilities(
+    contest,
+    num_winners,
+    max_num_states=DEFAULT_MAX_NUM_STATES,
+    num_fallback_trials=DEFAULT_NUM_FALLBACK_TRIALS,
+    num_processes=None,
+    seed=None
+):
+    """
+    Return STVOutcomeProbabilities giving the exact probability of each set of winners of the given
+    (populated, but not yet counted) STVContest, which must transfer surpluses at random.
+
+    If more than max_num_states count states (counting every branch into a state, even if the
+    state was reached before) would have to be explored, then the search is abandoned, and the
+    probabilities are estimated from num_fallback_trials Monte Carlo trials instead (see
+    montecarlo.estimate_stv_win_probabilities, which is passed num_processes and seed).
+    """
+
+    if num_winners >= len(contest.entries):
+        raise ValueError(
+            "A STVContest must have fewer winners then entries."
+            f" This STVContest seeks to produce {num_winners} winners"
+            f" but has only {len(contest.entries)} entries."
+        )
+    if sum(ballot_group.weight for ballot_group in contest.ballot_groups) != len(contest.voters):
+        raise ValueError("Outcome probabilities can only be found before the contest is counted.")
+    if contest.surplus_transfer != contest.RANDOM_SURPLUS_TRANSFER:
+        raise ValueError("Outcome probabilities can only be found for random surplus transfers.")
+
+    entry_names = [entry.name for entry in contest.entries]
+
+    if contest.verbose:
+        print("Exploring every possible count of the contest...", end="", flush=True)
+
+    winner_id_set_probabilities = _explore_counts(
+        len(contest.entries),
+        [
+            (tuple(entry.id for entry in ballot_group.ballot), ballot_group.weight)
+            for ballot_group in contest.ballot_groups
+        ],
+        num_winners,
+        max_num_states
+    )
+
+    if winner_id_set_probabilities is not None:
+        if contest.verbose:
+            print(" done.")
+
+        outcome_probabilities = STVOutcomeProbabilities(
+            entry_names,
+            {
+                frozenset(entry_names[i] for i in winner_ids): probability
+                for winner_ids, probability in winner_id_set_probabilities.items()
+            },
+            is_exact=True
+        )
+    else:
+        if contest.verbose:
+            print(f" gave up after {max_num_states} states.")
+
+        monte_carlo_results = estimate_stv_win_probabilities(
+            contest, num_winners, num_fallback_trials, num_processes=num_processes, seed=seed
+        )
+        outcome_probabilities = STVOutcomeProbabilities(
+            entry_names,
+            {
+                winner_set: num_trials / monte_carlo_results.num_trials
+                for winner_set, num_trials in monte_carlo_results.num_trials_by_winner_set.items()
+            },
+            is_exact=False,
+            monte_carlo_results=monte_carlo_results
+        )
+
+    if contest.verbose:
+        outcome_probabilities.print_summary()
+
+    return outcome_probabilities
+
+
+def _explore_counts(num_entries, weighted_ballots, num_winners, max_num_states):
+    """
+    Explore every possible count of an STVContest with the given number of Entries and the given
+    (ballot, weight) pairs. Return a dictionary mapping each possible frozenset of winning Entry ids
+    to its probability, or None if more than max_num_states states would have to be explored.
+    """
+
+    # round 1: every ballot backs its first choice
+    pools = [{} for _ in range(num_entries)]
+    num_valid_voters = 0
+    for ballot, weight in weighted_ballots:
+        if ballot:
+            pools[ballot[0]][ballot] = pools[ballot[0]].get(ballot, 0) + weight
+            num_valid_voters += weight
+
+    # the Droop quota (see STVContest.get_winners)
+    min_num_voters_to_win = math.floor(num_valid_voters / (num_winners + 1)) + 1
+
+    initial_state = _make_state([_IN_RACE] * num_entries, pools, min_num_voters_to_win)
+
+    # self-explanatory, except that probabilities_by_state only holds states that haven't been
+    # explored yet, and states_to_explore is a heap of (-(amount of count left), tiebreaker, state)
+    # tuples, so the state with the most count left is explored first
+    probabilities_by_state = {initial_state: Fraction(1)}
+    states_to_explore = [(-_get_amount_of_count_left(initial_state), 0, initial_state)]
+    tiebreakers = itertools.count(1)
+    winner_id_set_probabilities = {}
+    num_states = 1
+
+    while states_to_explore:
+        _, _, state = heapq.heappop(states_to_explore)
+        probability = probabilities_by_state.pop(state)
+
+        for next_state, transition_probability in _get_next_states(state, min_num_voters_to_win):
+            num_states += 1
+            if num_states > max_num_states:
+                return None
+
+            next_probability = probability * transition_probability
+            winner_ids = _get_winner_ids(next_state, num_winners)
+            if winner_ids is not None:
+                winner_id_set_probabilities[winner_ids] = (
+                    winner_id_set_probabilities.get(winner_ids, 0) + next_probability
+                )
+            elif next_state in probabilities_by_state:
+                probabilities_by_state[next_state] += next_probability
+            else:
+                probabilities_by_state[next_state] = next_probability
+                heapq.heappush(
+                    states_to_explore,
+                    (-_get_amount_of_count_left(next_state), next(tiebreakers), next_state)
+                )
+
+    return winner_id_set_probabilities
+
+
+def _make_state(statuses, pools, min_num_voters_to_win):
+    """
+    Return the hashable count state with the given Entry statuses, where pools[e] is a dictionary
+    mapping each ballot backing Entry e to its weight.
+    Only the pools of Entries still in the race and of winners with a surplus left to reallocate are
+    kept, since the other pools can't affect the rest of the count.
+    """
+
+    kept_pools = []
+    for status, pool in zip(statuses, pools):
+        if status == _IN_RACE or (
+            status == _WON and sum(pool.values()) > min_num_voters_to_win
+        ):
+            kept_pools.append(tuple(sorted(pool.items())))
+        else:
+            kept_pools.append(())
+
+    return (tuple(statuses), tuple(kept_pools))
+
+
+def _get_amount_of_count_left(state):
+    """
+    Return a number that every round of the count decreases: twice the number of Entries still in
+    the race, plus the number of winners whose surplus hasn't been reallocated.
+    """
+
+    statuses, pools = state
+    return sum(
+        2 if status == _IN_RACE else 1 if status == _WON and pool else 0
+        for status, pool in zip(statuses, pools)
+    )
+
+
+def _get_winner_ids(state, num_winners):
+    """
+    Return a frozenset of the ids of the winners if the count ends in the given state (as
+    STVContest.get_winners decides), or None if it continues.
+    """
+
+    statuses, _ = state
+    winner_ids = [e for e, status in enumerate(statuses) if status == _WON]
+    in_race_ids = [e for e, status in enumerate(statuses) if status == _IN_RACE]
+
+    if len(winner_ids) + len(in_race_ids) == num_winners:
+        return frozenset(winner_ids + in_race_ids)
+    if len(winner_ids) >= num_winners:
+        return frozenset(winner_ids)
+
+    return None
+
+
+def _get_next_states(state, min_num_voters_to_win):
+    """
+    Yield a (next state, probability) tuple for every way the next round of the count can go from
+    the given state, following the same rules as STVContest.get_winners.
+    """
+
+    statuses, pools = state
+    num_voters = [sum(weight for _, weight in pool) for pool in pools]
+
+    undeclared_winner_ids = [
+        e for e, status in enumerate(statuses)
+        if status == _IN_RACE and num_voters[e] >= min_num_voters_to_win
+    ]
+    winner_ids_with_surplus = [
+        e for e, status in enumerate(statuses)
+        if status == _WON and num_voters[e] > min_num_voters_to_win
+    ]
+
+    if undeclared_winner_ids:
+        # declare all new winners
+        next_statuses = list(statuses)
+        for e in undeclared_winner_ids:
+            next_statuses[e] = _WON
+        yield (
+            _make_state(next_statuses, [dict(pool) for pool in pools], min_num_voters_to_win),
+            Fraction(1)
+        )
+    elif winner_ids_with_surplus:
+        # a random winner reallocates a random sample of its surplus Voters
+        for winner_id in winner_ids_with_surplus:
+            pool = pools[winner_id]
+            num_surplus_voters = num_voters[winner_id] - min_num_voters_to_win
+            num_samples = math.comb(num_voters[winner_id], num_surplus_voters)
+
+            for num_voters_sampled, num_ways in _get_samples(pool, num_surplus_voters):
+                next_pools = [dict(p) for p in pools]
+                next_pools[winner_id] = {}
+                for (ballot, _), num_moved in zip(pool, num_voters_sampled):
+                    if num_moved:
+                        _move_voters(statuses, next_pools, winner_id, ballot, num_moved)
+                yield (
+                    _make_state(statuses, next_pools, min_num_voters_to_win),
+                    Fraction(num_ways, num_samples * len(winner_ids_with_surplus))
+                )
+    else:
+        # a random last-place Entry is eliminated
+        min_num_voters = min(
+            num_voters[e] for e, status in enumerate(statuses) if status == _IN_RACE
+        )
+        loser_ids = [
+            e for e, status in enumerate(statuses)
+            if status == _IN_RACE and num_voters[e] == min_num_voters
+        ]
+        for loser_id in loser_ids:
+            next_statuses = list(statuses)
+            next_statuses[loser_id] = _LOST
+            next_pools = [dict(pool) for pool in pools]
+            next_pools[loser_id] = {}
+            for ballot, weight in pools[loser_id]:
+                _move_voters(next_statuses, next_pools, loser_id, ballot, weight)
+            yield (
+                _make_state(next_statuses, next_pools, min_num_voters_to_win),
+                Fraction(1, len(loser_ids))
+            )
+
+
+def _get_samples(pool, num_voters_to_sample):
+    """
+    Yield a (tuple of how many Voters were sampled from each ballot in pool, number of ways to
+    sample them) tuple for every way to sample num_voters_to_sample Voters out of the given
+    ((ballot, weight) tuples) pool.
+    """
+
+    # num_voters_after[i] contains the total weight of pool[i + 1:]
+    num_voters_after = list(itertools.accumulate(weight for _, weight in reversed(pool)))[::-1]
+    num_voters_after = num_voters_after[1:] + [0]
+
+    def get_samples_from(i, num_voters_left):
+        if i == len(pool):
+            yield ((), 1)
+            return
+
+        weight = pool[i][1]
+        for num_sampled in range(
+            max(0, num_voters_left - num_voters_after[i]), min(weight, num_voters_left) + 1
+        ):
+            for rest, num_ways in get_samples_from(i + 1, num_voters_left - num_sampled):
+                yield ((num_sampled, *rest), math.comb(weight, num_sampled) * num_ways)
+
+    return get_samples_from(0, num_voters_to_sample)
+
+
+def _move_voters(statuses, pools, current_entry_id, ballot, num_voters):
+    """
+    Move num_voters Voters with the given ballot from the Entry with id current_entry_id to their
+    next choice that's still in the race (or drop them if they have none).
+    """
+
+    for entry_id in ballot[ballot.index(current_entry_id) + 1:]:
+        if statuses[entry_id] == _IN_RACE:
+            pools[entry_id][ballot] = pools[entry_id].get(ballot, 0) + num_voters
+            return
@@ -0,0 +1,192 @@
+import bisect
+import csv
+import heapq
+import itertools
+import random
+
+"""
+Helper functions for generating synthetic electorates to benchmark Contests with (see
+run_benchmarks.py).
+
+Each generator yields one ballot per voter: a tuple of entry indexes, from favorite to least
+favorite. Ballots rank every entry unless max_ballot_length is given, in which case only each voter's
+top max_ballot_length entries are ranked. Generators take a seed, so the same arguments always give
+the same electorate.
+
+write_electorate_spreadsheet writes the ballots in the format made by
+preprocessing.create_voter_spreadsheet, so they can be read like real voting data.
+"""
+
+# the kinds of electorates that generate_ballots can generate
+IMPARTIAL_CULTURE = "impartial"
+MALLOWS = "mallows"
+SPATIAL = "spatial"
+TOP_K = "top-k"
+ELECTORATE_KINDS = [IMPARTIAL_CULTURE, MALLOWS, SPATIAL, TOP_K]
+
+# by default, how close Mallows ballots are to the reference ranking: 0 makes every ballot the
+# reference ranking, and 1 makes them uniformly random (like impartial culture)
+DEFAULT_MALLOWS_DISPERSION = 0.8
+# by default, how many issues spatial electorates' voters and entries have positions on
+DEFAULT_NUM_SPATIAL_DIMENSIONS = 2
+# by default, the most entries that a top-k ballot ranks (our Google Forms polls ask for a top 5)
+DEFAULT_TOP_K = 5
+
+
+def generate_impartial_culture_ballots(num_voters, num_entries, max_ballot_length=None, seed=None):
+    """
+    Yield ballots in which every voter ranks the entries in a uniformly random order, independently
+    of every other voter. This is the hardest case for grouping ballots, since almost no two
+    ballots are the same.
+    """
+
+    rng = random.Random(seed)
+    ballot_length = _get_ballot_length(num_entries, max_ballot_length)
+
+    for _ in range(num_voters):
+        yield tuple(rng.sample(range(num_entries), ballot_length))
+
+
+def generate_mallows_ballots(
+    num_voters,
+    num_entries,
+    dispersion=DEFAULT_MALLOWS_DISPERSION,
+    max_ballot_length=None,
+    seed=None
+):
+    """
+    Yield ballots drawn from a Mallows model centered on the ranking (0, 1, ..., num_entries - 1):
+    a ballot that takes d swaps of adjacent entries to turn into that ranking is dispersion^d times
+    as likely as the ranking itself. Low dispersions make electorates that mostly agree.
+
+    Ballots are drawn with the repeated insertion model: entry i is inserted into the ballot so far
+    at position j (for j from 0 to i) with probability proportional to dispersion^(i - j).
+    """
+
+    if not 0 <= dispersion <= 1:
+        raise ValueError(f"A Mallows dispersion must be between 0 and 1, but {dispersion} was given.")
+
+    rng = random.Random(seed)
+    ballot_length = _get_ballot_length(num_entries, max_ballot_length)
+
+    # cumulative_insertion_weights[i][j] contains the total weight of inserting entry i at any of
+    # positions 0 through j
+    cumulative_insertion_weights = [
+        list(itertools.accumulate(dispersion ** (i - j) for j in range(i + 1)))
+        for i in range(num_entries)
+    ]
+
+    for _ in range(num_voters):
+        ballot = []
+        for i, cumulative_weights in enumerate(cumulative_insertion_weights):
+            position = bisect.bisect_right(cumulative_weights, rng.random() * cumulative_weights[-1])
+            ballot.insert(min(position, i), i)
+        yield tuple(ballot[:ballot_length])
+
+
+def generate_spatial_ballots(
+    num_voters,
+    num_entries,
+    num_dimensions=DEFAULT_NUM_SPATIAL_DIMENSIONS,
+    max_ballot_length=None,
+    seed=None
+):
+    """
+    Yield ballots from a spatial (Euclidean) model: every voter and entry gets a uniformly random
+    position in a num_dimensions-dimensional unit cube, and each voter ranks the entries from
+    nearest to farthest. Electorates like this have few cycles in their 1v1 matches.
+    """
+
+    rng = random.Random(seed)
+    ballot_length = _get_ballot_length(num_entries, max_ballot_length)
+
+    entry_positions = [
+        [rng.random() for _ in range(num_dimensions)] for _ in range(num_entries)
+    ]
+
+    for _ in range(num_voters):
+        voter_position = [rng.random() for _ in range(num_dimensions)]
+        squared_distances = [
+            sum((x - y) ** 2 for x, y in zip(voter_position, entry_position))
+            for entry_position in entry_positions
+        ]
+        yield tuple(heapq.nsmallest(
+            ballot_length, range(num_entries), key=squared_distances.__getitem__
+        ))
+
+
+def generate_top_k_ballots(num_voters, num_entries, k=DEFAULT_TOP_K, seed=None):
+    """
+    Yield truncated ballots like the ones cast in our Google Forms polls: each voter ranks between
+    1 and k entries, picked (without replacement) in proportion to each entry's popularity, so a
+    few favorites get most of the top rankings.
+    """
+
+    rng = random.Random(seed)
+    k = min(k, num_entries)
+
+    # entry i is 1/(i + 1) times as popular as entry 0, as in Zipf's law
+    popularities = [1 / (i + 1) for i in range(num_entries)]
+
+    for _ in range(num_voters):
+        ballot_length = rng.randint(1, k)
+        # weighted sampling without replacement: the entries with the largest random keys
+        # u^(1 / popularity) (with u uniform in [0, 1)) are a weighted sample
+        keys = [rng.random() ** (1 / popularity) for popularity in popularities]
+        yield tuple(heapq.nlargest(ballot_length, range(num_entries), key=keys.__getitem__))
+
+
+def generate_ballots(electorate_kind, num_voters, num_entries, seed=None):
+    """
+    Yield ballots from the generator for the given kind of electorate (one of ELECTORATE_KINDS),
+    with its default parameters.
+    """
+
+    if electorate_kind == IMPARTIAL_CULTURE:
+        return generate_impartial_culture_ballots(num_voters, num_entries, seed=seed)
+    if electorate_kind == MALLOWS:
+        return generate_mallows_ballots(num_voters, num_entries, seed=seed)
+    if electorate_kind == SPATIAL:
+        return generate_spatial_ballots(num_voters, num_entries, seed=seed)
+    if electorate_kind == TOP_K:
+        return generate_top_k_ballots(num_voters, num_entries, seed=seed)
+
+    raise ValueError(f"Unknown electorate kind {electorate_kind}.")
+
+
+def write_electorate_spreadsheet(output_file_name, num_entries, ballots):
+    """
+    Write the given ballots to a spreadsheet at the given path, in the format made by
+    preprocessing.create_voter_spreadsheet: every row is a voter (named "voter 1", "voter 2", and
+    so on), every column is an entry (named "entry 1", "entry 2", and so on), and each cell is the
+    ranking that the row's voter assigned to the column's entry.
+    Return the number of voters written.
+
+    The ballots are written as they're generated, so electorates too big to fit in memory can still
+    be written.
+    """
+
+    num_voters = 0
+
+    with open(output_file_name, "w", newline="") as spreadsheet:
+        writer = csv.writer(spreadsheet, delimiter=",")
+
+        writer.writerow(["user"] + [f"entry {i + 1}" for i in range(num_entries)])
+
+        for ballot in ballots:
+            num_voters += 1
+            rankings = [None] * num_entries
+            for ranking, entry_index in enumerate(ballot, start=1):
+                rankings[entry_index] = ranking
+
+            writer.writerow([f"voter {num_voters}"] + rankings)
+
+    return num_voters
+
+
+def _get_ballot_length(num_entries, max_ballot_length):
+    """
+    Return the number of entries that each ballot should rank.
+    """
+
+    return num_entries if max_ballot_length is None else min(num_entries, max_ballot_length)
@@ -0,0 +1,63 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ballotgroup import get_snapshot_voters, group_voters_by_ballot, snapshot_ballot_groups
+from entry import Entry
+from voter import Voter
+
+"""
+Tests for ballotgroup.py.
+"""
+
+
+class GetSnapshotVotersTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self.entries = [Entry(entry_name, i) for i, entry_name in enumerate(["A", "B", "C"])]
+        # voters alternate between ballots A > B and A > C
+        self.voters = []
+        for i in range(6):
+            voter = Voter(f"voter{i}", self.entries)
+            voter.rank(self.entries[0], 1)
+            voter.rank(self.entries[1 + i % 2], 2)
+            self.voters.append(voter)
+        self.ballot_groups = group_voters_by_ballot(self.voters)
+
+
+    def get_voter_names(self, ballot_groups):
+        return [
+            voter.name for voter, _, _ in get_snapshot_voters(snapshot_ballot_groups(ballot_groups))
+        ]
+
+
+    def test_voters_who_arrived_together_keep_their_original_order(self):
+        for ballot_group in self.ballot_groups:
+            ballot_group.arrival_key = (1, 0)
+
+        self.assertEqual(
+            self.get_voter_names(self.ballot_groups), [voter.name for voter in self.voters]
+        )
+
+
+    def test_voters_are_listed_in_the_order_they_arrived(self):
+        # the A > C voters arrived in round 1, and the A > B voters in round 2 (after arriving
+        # somewhere else in round 1)
+        self.ballot_groups[0].arrival_key = (2, 0, 1, 0)
+        self.ballot_groups[1].arrival_key = (1, 0)
+
+        # voter2 arrived in round 2 too, but from an Entry whose Voters moved after the others'
+        split_group = self.ballot_groups[0].split([1])
+        split_group.arrival_key = (2, 1, 1, 0)
+
+        self.assertEqual(
+            self.get_voter_names(self.ballot_groups + [split_group]),
+            ["voter1", "voter3", "voter5", "voter0", "voter4", "voter2"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
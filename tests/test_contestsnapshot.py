@@ -0,0 +1,71 @@
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import contestsnapshot
+from ballotmatrix import BallotMatrix
+from contestsnapshot import read_snapshot, write_snapshot
+
+"""
+Tests for contestsnapshot.py.
+"""
+
+
+class ContestSnapshotTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self.ballot_matrix = BallotMatrix(["A", "B", "C"], 2)
+        self.ballot_matrix.append_ballot([0, 2], voter_name="alice")
+        self.ballot_matrix.append_ballot([1], weight=3, voter_name="bob")
+        self.ballot_matrix.append_ballot([], voter_name="carol")
+        self.match_votes = [[0, 1, 1], [3, 0, 3], [0, 0, 0]]
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.snapshot_file_name = os.path.join(directory.name, "contest.snapshot")
+        write_snapshot(self.snapshot_file_name, self.ballot_matrix, self.match_votes)
+
+
+    def test_round_trip(self):
+        ballot_matrix, match_votes = read_snapshot(self.snapshot_file_name)
+
+        self.assertEqual(ballot_matrix.entry_names, self.ballot_matrix.entry_names)
+        self.assertEqual(ballot_matrix.num_ballots, self.ballot_matrix.num_ballots)
+        for b in range(ballot_matrix.num_ballots):
+            self.assertEqual(ballot_matrix.get_ballot(b), self.ballot_matrix.get_ballot(b))
+            self.assertEqual(ballot_matrix.get_weight(b), self.ballot_matrix.get_weight(b))
+            self.assertEqual(ballot_matrix.get_voter_name(b), self.ballot_matrix.get_voter_name(b))
+        self.assertEqual(match_votes, self.match_votes)
+
+
+    def corrupt(self, offset):
+        with open(self.snapshot_file_name, "r+b") as snapshot:
+            snapshot.seek(offset)
+            byte = snapshot.read(1)
+            snapshot.seek(offset)
+            snapshot.write(bytes([byte[0] ^ 1]))
+
+
+    def test_corrupted_header_fields_are_caught(self):
+        # the flags, the number of entries, slots, and ballots, and the first byte after the header
+        field_offsets = [
+            struct.calcsize(header_format)
+            for header_format in ["<8sI", "<8sII", "<8sIII", "<8sIIII"]
+        ] + [contestsnapshot._HEADER_SIZE]
+        for offset in field_offsets:
+            self.corrupt(offset)
+            with self.assertRaisesRegex(ValueError, "content hash"):
+                read_snapshot(self.snapshot_file_name)
+            # undo the corruption
+            self.corrupt(offset)
+
+        read_snapshot(self.snapshot_file_name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,298 @@
+import email.utils
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import create_voter_spreadsheet_discourse
+import discoursefetcher
+from discoursefetcher import DiscourseFetcher
+
+"""
+Tests for discoursefetcher.py and the fetching in create_voter_spreadsheet_discourse.py, run against
+a stub Discourse server on localhost.
+"""
+
+
+class StubDiscourseServer():
+    """
+    A StubDiscourseServer serves HTTP requests on localhost from a background thread. Every request
+    is answered by respond(request_index, path, params), which returns a (status code, headers,
+    JSON) tuple, and is recorded in self.requests.
+    """
+
+
+    def __init__(self, respond):
+        self.respond = respond
+        # self.requests[i] contains the (arrival time, path, params, client port) of request i
+        self.requests = []
+        # the most requests that have been in flight at once
+        self.max_num_requests_in_flight = 0
+
+        self._num_requests_in_flight = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep connections alive, so a pooled session can reuse them
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                params = dict(parse_qsl(url.query))
+                with server._lock:
+                    request_index = len(server.requests)
+                    server.requests.append(
+                        (time.monotonic(), url.path, params, self.client_address[1])
+                    )
+                    server._num_requests_in_flight += 1
+                    server.max_num_requests_in_flight = max(
+                        server.max_num_requests_in_flight, server._num_requests_in_flight
+                    )
+
+                try:
+                    status_code, headers, response_json = server.respond(
+                        request_index, url.path, params
+                    )
+                finally:
+                    with server._lock:
+                        server._num_requests_in_flight -= 1
+
+                body = json.dumps(response_json).encode()
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._http_server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._http_server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._http_server.server_address[1]}"
+        self._thread = threading.Thread(target=self._http_server.serve_forever, daemon=True)
+
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+
+    def __exit__(self, exception_type, exception, traceback):
+        self._http_server.shutdown()
+        self._http_server.server_close()
+
+
+def respond_with_page(request_index, path, params):
+    """
+    Answer every request with its page number, taking longer for earlier pages so that requests
+    finish out of order.
+    """
+
+    page = int(params["page"])
+    time.sleep(0.01 * (20 - page))
+    return (200, {}, {"page": page})
+
+
+class DiscourseFetcherTest(unittest.TestCase):
+
+
+    def get_fetcher(self, server, **kwargs):
+        # by default, don't rate limit the requests
+        kwargs.setdefault("max_requests_per_second", 1000)
+        kwargs.setdefault("max_request_burst", 1000)
+        fetcher = DiscourseFetcher(server.base_url, {"Api-Key": "key"}, **kwargs)
+        self.addCleanup(fetcher.close)
+        return fetcher
+
+
+    def test_concurrent_requests_keep_their_order(self):
+        with StubDiscourseServer(respond_with_page) as server:
+            fetcher = self.get_fetcher(server, num_concurrent_requests=4)
+            pages_finished = []
+            responses = fetcher.get_all_json(
+                [("/page.json", {"page": page}) for page in range(20)],
+                callback=lambda i, response_json: pages_finished.append(response_json["page"])
+            )
+
+        self.assertEqual(responses, [{"page": page} for page in range(20)])
+        self.assertCountEqual(pages_finished, range(20))
+        self.assertEqual(fetcher.num_requests, 20)
+        self.assertCountEqual(
+            [request[2]["page"] for request in server.requests], map(str, range(20))
+        )
+
+        # the requests ran concurrently, but no more than num_concurrent_requests at once, and they
+        # shared the session's pooled connections instead of opening one per request
+        self.assertGreater(server.max_num_requests_in_flight, 1)
+        self.assertLessEqual(server.max_num_requests_in_flight, 4)
+        self.assertLessEqual(len({request[3] for request in server.requests}), 4)
+
+
+    def test_token_bucket_paces_requests(self):
+        with StubDiscourseServer(lambda i, path, params: (200, {}, {})) as server:
+            fetcher = self.get_fetcher(
+                server, max_requests_per_second=20, max_request_burst=2, num_concurrent_requests=4
+            )
+            fetcher.get_all_json([("/page.json", {"page": page}) for page in range(12)])
+
+        # the first 2 requests are a burst, then the other 10 come 1/20 of a second apart (each
+        # request's arrival can be delayed a little, so only check how far along each one is)
+        arrival_times = sorted(request[0] for request in server.requests)
+        self.assertLess(arrival_times[1] - arrival_times[0], 0.04)
+        for i in range(2, len(arrival_times)):
+            self.assertGreater(arrival_times[i] - arrival_times[0], (i - 1) / 20 - 0.03)
+
+
+    def check_429_pauses_every_request(self, retry_after, min_num_seconds_paused):
+        def respond(request_index, path, params):
+            if request_index == 0:
+                return (429, {"Retry-After": retry_after()}, {})
+            return (200, {}, {"page": int(params["page"])})
+
+        with StubDiscourseServer(respond) as server:
+            # a token every 0.2 seconds, so the other workers are still waiting for tokens when the
+            # first request is rate limited
+            fetcher = self.get_fetcher(
+                server, max_requests_per_second=5, max_request_burst=1, num_concurrent_requests=4
+            )
+            responses = fetcher.get_all_json([("/page.json", {"page": page}) for page in range(4)])
+
+        self.assertEqual(responses, [{"page": page} for page in range(4)])
+        # the rate limited request was retried
+        self.assertEqual(len(server.requests), 5)
+        rate_limited_time = server.requests[0][0]
+        for request in server.requests[1:]:
+            self.assertGreater(request[0] - rate_limited_time, min_num_seconds_paused)
+
+
+    def test_429_with_retry_after_seconds_pauses_every_request(self):
+        self.check_429_pauses_every_request(lambda: "1", 0.9)
+
+
+    def test_429_with_retry_after_date_pauses_every_request(self):
+        # HTTP dates only have whole seconds, so this asks for a pause of between 1 and 2 seconds
+        self.check_429_pauses_every_request(
+            lambda: email.utils.formatdate(time.time() + 2, usegmt=True), 0.9
+        )
+
+
+    @mock.patch.object(discoursefetcher, "BASE_RETRY_DELAY_SECONDS", 0.1)
+    def test_server_errors_are_retried_with_backoff(self):
+        def respond(request_index, path, params):
+            if request_index < 3:
+                return (503, {}, {})
+            return (200, {}, {"ok": True})
+
+        with StubDiscourseServer(respond) as server:
+            fetcher = self.get_fetcher(server)
+            self.assertEqual(fetcher.get_json("/ok.json"), {"ok": True})
+
+        self.assertEqual(fetcher.num_requests, 4)
+        # retry n waits between half and all of 0.1 * 2^n seconds
+        arrival_times = [request[0] for request in server.requests]
+        for num_retries in range(3):
+            self.assertGreater(
+                arrival_times[num_retries + 1] - arrival_times[num_retries],
+                0.1 * 2 ** num_retries * 0.5 - 0.01
+            )
+
+
+    @mock.patch.object(discoursefetcher, "BASE_RETRY_DELAY_SECONDS", 0.01)
+    def test_server_errors_give_up_after_max_num_retries(self):
+        with StubDiscourseServer(lambda i, path, params: (502, {}, {})) as server:
+            fetcher = self.get_fetcher(server, max_num_retries=2)
+            with self.assertRaises(requests.HTTPError):
+                fetcher.get_json("/broken.json")
+
+        self.assertEqual(len(server.requests), 3)
+
+
+    def test_client_errors_are_not_retried(self):
+        with StubDiscourseServer(lambda i, path, params: (404, {}, {})) as server:
+            fetcher = self.get_fetcher(server)
+            with self.assertRaises(requests.HTTPError):
+                fetcher.get_json("/missing.json")
+
+        self.assertEqual(len(server.requests), 1)
+
+
+class GetVoterDictionaryTest(unittest.TestCase):
+
+
+    @mock.patch.object(create_voter_spreadsheet_discourse, "NUM_VOTES_PER_API_REQUEST", 2)
+    def test_voter_pages_are_fetched_from_the_server(self):
+        # voters_by_option[(p, o)] contains the voters for option o of poll p
+        voters_by_option = {
+            ("poll_1", "a"): ["u1", "u2", "u3", "u4", "u5"],
+            ("poll_1", "b"): ["u6"],
+            ("poll_1", "c"): ["u7", "u8", "u9"],
+            ("poll_2", "a"): ["u6"],
+            ("poll_2", "b"): ["u1", "u2", "u3", "u4"],
+            ("poll_2", "c"): [],
+        }
+        post = {"id": 1, "polls": [
+            {"name": poll_name, "options": [
+                {"id": option_id, "html": option_id.upper(), "votes": len(voters_by_option[
+                    (poll_name, option_id)
+                ])}
+                for option_id in ["a", "b", "c"]
+            ]}
+            for poll_name in ["poll_1", "poll_2"]
+        ]}
+
+        def respond(request_index, path, params):
+            self.assertEqual(path, create_voter_spreadsheet_discourse.DISCOURSE_VOTES_PATH)
+            page = int(params["page"])
+            limit = int(params["limit"])
+            if "option_id" in params:
+                option_ids = [params["option_id"]]
+            else:
+                option_ids = ["a", "b", "c"]
+            voters_json = {}
+            for option_id in option_ids:
+                voters = voters_by_option[(params["poll_name"], option_id)]
+                voters_json[option_id] = [
+                    {"username": username} for username in voters[(page - 1) * limit:page * limit]
+                ]
+            return (200, {}, {"voters": voters_json})
+
+        with StubDiscourseServer(respond) as server:
+            with DiscourseFetcher(
+                server.base_url, {}, max_requests_per_second=1000, max_request_burst=1000
+            ) as fetcher:
+                votes = create_voter_spreadsheet_discourse.get_voter_dictionary(
+                    post, fetcher, verbose=False
+                )
+
+        self.assertEqual(votes, {
+            "u1": {"A": 1, "B": 2},
+            "u2": {"A": 1, "B": 2},
+            "u3": {"A": 1, "B": 2},
+            "u4": {"A": 1, "B": 2},
+            "u5": {"A": 1},
+            "u6": {"B": 1, "A": 2},
+            "u7": {"C": 1},
+            "u8": {"C": 1},
+            "u9": {"C": 1},
+        })
+        # poll_1 needs pages 1 and 2 of every option, then page 3 of option a alone; poll_2 needs
+        # pages 1 and 2 of option b
+        self.assertEqual(len(server.requests), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
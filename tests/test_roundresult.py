@@ -0,0 +1,80 @@
+import copy
+import os
+import pickle
+import sys
+import unittest
+from fractions import Fraction
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from roundresult import RoundResult
+
+"""
+Tests for roundresult.py.
+"""
+
+
+def get_attributes(round_result):
+    """
+    Return a dictionary of the given RoundResult's attributes, with tallies as tuples.
+    """
+
+    return {
+        name: tuple(value) if isinstance(value, memoryview) else value
+        for name, value in ((name, getattr(round_result, name)) for name in RoundResult.__slots__)
+    }
+
+
+class RoundResultTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self.round_results = [
+            RoundResult(
+                3,
+                [RoundResult.WON, RoundResult.IN_RACE, RoundResult.LOST],
+                tallies=[7, 5, 0],
+                tally_changes=[2, 1, -3],
+                elected=[0],
+                eliminated=[2],
+                transfers=[(2, 3)],
+                num_valid_voters=12,
+                num_voters_with_no_valid_votes=1,
+                num_exhausted_voters=2,
+                num_exhausted_voters_in_round=1,
+                borda_counts=[(1, 9), (2, 4)],
+                remaining_1v1_match_wins=[0b110, 0b100, None],
+                dominating_set=[0]
+            ),
+            # fractional tallies are stored as tuples
+            RoundResult(1, [RoundResult.IN_RACE] * 2, tallies=[Fraction(1, 3), 2]),
+            # rounds that counted no votes have no tallies
+            RoundResult(2, [RoundResult.LOST]),
+        ]
+
+
+    def test_round_results_cant_be_changed(self):
+        round_result = self.round_results[0]
+        with self.assertRaises(AttributeError):
+            round_result.round_number = 4
+        with self.assertRaises(TypeError):
+            round_result.tallies[0] = 8
+
+
+    def test_copy_and_pickle_round_trip(self):
+        for round_result in self.round_results:
+            for round_result_copy in [
+                copy.copy(round_result),
+                copy.deepcopy(round_result),
+                pickle.loads(pickle.dumps(round_result)),
+            ]:
+                self.assertIsInstance(round_result_copy, RoundResult)
+                self.assertEqual(get_attributes(round_result_copy), get_attributes(round_result))
+                self.assertEqual(round_result_copy.to_dict(), round_result.to_dict())
+                self.assertEqual(type(round_result_copy.tallies), type(round_result.tallies))
+                with self.assertRaises(AttributeError):
+                    round_result_copy.round_number = 4
+
+
+if __name__ == "__main__":
+    unittest.main()
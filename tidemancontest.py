@@ -1,15 +1,22 @@
+import bisect
 import csv
 import heapq
 import itertools
 
+from ballotgroup import get_snapshot_voters, snapshot_ballot_groups
 from contest import Contest
+from dominatingset import get_smallest_dominating_set
 from entry import Entry
+from matchmatrix import count_1v1_match_votes, get_borda_counts
+from reportsink import ReportSink
+from roundresult import RoundResult, get_bitmask_ids
 from voter import Voter
 
 class TidemanContest(Contest):
     """
     A TidemanContest contains Voters who have assigned rankings (numbers) to various Entries.
     It also has a desired number of winners.
+    Votes are counted one BallotGroup at a time.
     """
 
 
@@ -34,7 +41,120 @@ class TidemanContest(Contest):
     REMAINING_1V1_MATCH_SUMMARY_SPREADSHEET_NUM_WINS_COLUMN_NAME = "number of wins"
 
 
+    # titles of the columns of the spreadsheet listing the changes to the remaining 1v1 matches
+    REMAINING_1V1_MATCH_CHANGES_SPREADSHEET_COLUMN_NAMES = ["entry", "opponent", "change"]
+
+
+    # report formats (see __init__)
+    COMPACT_REPORTS = "compact"
+    VERBOSE_REPORTS = "verbose"
+
+
+    METERED_PHASES = Contest.METERED_PHASES + [
+        "_run_all_1v1_matches",
+        "_prepare_instant_runoff",
+        "_eliminate_entries_outside_dominating_set",
+        "_reallocate_voters",
+        "_update_borda_counts",
+        "_eliminate_instant_runoff_last_place_entries",
+        "_write_all_1v1_match_votes_to_spreadsheet",
+        "_write_remaining_1v1_match_summary_to_spreadsheet",
+        "_write_instant_runoff_round_to_spreadsheet",
+    ]
+
+
+    def __init__(
+        self,
+        verbose=True,
+        use_numpy=True,
+        cross_check_dominating_set=False,
+        report_format=COMPACT_REPORTS,
+        background_reports=True,
+        metrics=None
+    ):
+        super().__init__(verbose, background_reports, metrics)
+
+        # the format of the 1v1 match spreadsheets written by get_winners:
+        # * with COMPACT_REPORTS, each Voter's ballot is written once, alongside a matrix of vote
+        #     counts for every 1v1 match, and each round only records how the remaining 1v1 matches
+        #     changed since the last round;
+        # * with VERBOSE_REPORTS, each Voter's vote in every 1v1 match is spelled out, and each round
+        #     gets a full matrix of the remaining 1v1 matches.
+        if report_format not in [TidemanContest.COMPACT_REPORTS, TidemanContest.VERBOSE_REPORTS]:
+            raise ValueError(f"Unknown report format {report_format}.")
+        self.report_format = report_format
+
+        # if True, tally 1v1 matches with NumPy when it's installed
+        # (see matchmatrix.count_1v1_match_votes)
+        self.use_numpy = use_numpy
+
+        # if True, every dominating set is found both directly from the graph of 1v1 match results
+        # (see dominatingset.get_smallest_dominating_set) and by the slower incremental search
+        # in _get_smallest_dominating_set_incrementally, and an error is raised if they disagree
+        self.cross_check_dominating_set = cross_check_dominating_set
+
+
     def _write_all_1v1_match_votes_to_spreadsheet(self, output_file_name_prefix):
+        """
+        Write out how every Voter voted in every 1v1 match, in the format given by
+        self.report_format. See _write_ballots_and_1v1_match_votes_to_spreadsheets and
+        _write_all_1v1_match_votes_to_verbose_spreadsheet.
+        If output_file_name_prefix is None, then nothing is written.
+        """
+
+        if output_file_name_prefix is None:
+            return
+
+        if self.report_format == TidemanContest.VERBOSE_REPORTS:
+            self._write_all_1v1_match_votes_to_verbose_spreadsheet(output_file_name_prefix)
+        else:
+            self._write_ballots_and_1v1_match_votes_to_spreadsheets(output_file_name_prefix)
+
+
+    def _write_ballots_and_1v1_match_votes_to_spreadsheets(self, output_file_name_prefix):
+        """
+        Write out the Voters' ballots to a spreadsheet at the path
+        {output_file_name_prefix}-ballots.csv
+        and the vote counts in every 1v1 match to a spreadsheet at the path
+        {output_file_name_prefix}-1v1-match-votes.csv
+
+        Each row of the ballots spreadsheet corresponds to a Voter. It contains the Voter's name,
+        followed by the names of the Entries they gave valid rankings to, from favorite to least
+        favorite. (Each Voter's vote in any 1v1 match follows from their ballot.)
+
+        Rows and columns of the 1v1 match votes spreadsheet correspond to Entries. Each cell contains
+        the number of Voters who prefer the row's Entry to the column's Entry.
+
+        Like every spreadsheet, these are written by self._report_sink.
+        """
+
+        ballots_file_name = f"{output_file_name_prefix}-ballots.csv"
+        match_votes_file_name = f"{output_file_name_prefix}-1v1-match-votes.csv"
+
+        if self.verbose:
+            print()
+            print(
+                f"Writing all ballots to {ballots_file_name}"
+                f" and all 1v1 match vote counts to {match_votes_file_name}."
+            )
+
+        self._report_sink.submit(
+            _write_ballots_spreadsheet,
+            ballots_file_name,
+            tuple(
+                (tuple(entry.name for entry in ballot_group.ballot), ballot_group.voters)
+                for ballot_group in self.ballot_groups
+            )
+        )
+        self._report_sink.submit(
+            _write_1v1_match_votes_spreadsheet,
+            match_votes_file_name,
+            tuple(entry.name for entry in self.entries),
+            tuple(tuple(votes) for votes in self._1v1_match_votes)
+        )
+
+
+    def _write_all_1v1_match_votes_to_verbose_spreadsheet(self, output_file_name_prefix):
         """
         Write out the contest's current status to a spreadsheet at the path
         {output_file_name_prefix}-all-1v1-match-votes.csv
@@ -42,54 +162,99 @@ class TidemanContest(Contest):
         Each row corresponds to a Voter and each column corresponds to a 1v1 matchup.
         Each cell indicates which Entry in the given matchup the given Voter prefers, along with
         the rankings that the Voter assigned each of the two Entries.
+
+        Like every spreadsheet, this is written by self._report_sink.
         """
 
         output_file_name = f"{output_file_name_prefix}-all-1v1-match-votes.csv"
 
         if self.verbose:
             print()
-            print(f"Writing all 1v1 match vote data to {output_file_name}...", end="", flush=True)
+            print(f"Writing all 1v1 match vote data to {output_file_name}.")
+
+        # Voters don't change while the TidemanContest is counting, so they need no snapshot
+        self._report_sink.submit(
+            _write_all_1v1_match_votes_spreadsheet,
+            output_file_name,
+            tuple(self.entries),
+            self.voters
+        )
 
-        with open(output_file_name, "w", newline="") as spreadsheet:
-            match_names_to_entries = {}
-            for i, entry1 in enumerate(self.entries):
-                for entry2 in self.entries[i+1:]:
-                    match_names_to_entries[f"{entry1.name} vs. {entry2.name}"] = (entry1, entry2)
 
-            header = [
-                self.ALL_1V1_MATCH_VOTES_SPREADSHEET_VOTER_COLUMN_NAME,
-                *[match_name for match_name in match_names_to_entries],
-            ]
-            writer = csv.DictWriter(spreadsheet, delimiter=",", fieldnames=header)
-            writer.writeheader()
+    def _write_remaining_1v1_match_summary_to_spreadsheet(self, output_file_name_prefix):
+        """
+        Write out a summary of the TidemanContest's remaining 1v1 matches, in the format given by
+        self.report_format. See _write_remaining_1v1_match_changes_to_spreadsheet and
+        _write_remaining_1v1_match_summary_to_verbose_spreadsheet.
+        If output_file_name_prefix is None, then nothing is written.
+        """
 
-            rows = []
-            for voter in self.voters:
-                row = {
-                    self.ALL_1V1_MATCH_VOTES_SPREADSHEET_VOTER_COLUMN_NAME: voter.name
-                }
-                for match_name, (entry1, entry2) in match_names_to_entries.items():
-                    entry1_ranking = voter.get_ranking_of_entry(entry1)
-                    entry2_ranking = voter.get_ranking_of_entry(entry2)
+        if output_file_name_prefix is None:
+            return
 
-                    if entry1_ranking < entry2_ranking:
-                        match_text = f"{entry1.name} (rankings: {entry1_ranking} vs. {entry2_ranking})"
-                    elif entry2_ranking < entry1_ranking:
-                        match_text = f"{entry2.name} (rankings: {entry1_ranking} vs. {entry2_ranking})"
-                    else:
-                        match_text = "N/A"
+        if self.report_format == TidemanContest.VERBOSE_REPORTS:
+            self._write_remaining_1v1_match_summary_to_verbose_spreadsheet(output_file_name_prefix)
+        else:
+            self._write_remaining_1v1_match_changes_to_spreadsheet(output_file_name_prefix)
 
-                    row[match_name] = match_text
 
-                rows.append(row)
+    def _write_remaining_1v1_match_changes_to_spreadsheet(self, output_file_name_prefix):
+        """
+        Write out how the TidemanContest's remaining 1v1 matches changed since the last time this
+        method was called to a spreadsheet at the path
+        {output_file_name_prefix}-round{self._round_number}-1v1-match-changes.csv
+
+        Each row represents one cell of the full matrix of remaining 1v1 matches (see
+        _write_remaining_1v1_match_summary_to_verbose_spreadsheet) that changed. It contains the
+        row's Entry, the column's Entry, and -1 if the row's Entry no longer beats the column's Entry
+        (because one of them left the race) or 1 if it now does.
+        The first time this method is called, the changes are relative to the results of every 1v1
+        match, as recorded in the {output_file_name_prefix}-1v1-match-votes.csv spreadsheet.
+
+        Like every spreadsheet, this is written by self._report_sink.
+        """
 
-            writer.writerows(rows)
+        output_file_name = (
+            f"{output_file_name_prefix}-round{self._round_number}-1v1-match-changes.csv"
+        )
 
         if self.verbose:
-            print(" done.")
+            print()
+            print(f"Writing changes to 1v1 matches to {output_file_name}.")
+
+        # the remaining 1v1 matches, as (winner id, loser id) tuples
+        remaining_1v1_match_results = {
+            (entry.id, opponent.id)
+            for entry in self.entries
+            for opponent in entry.remaining_beatable_1v1_match_opponents
+        }
+        if self._previous_1v1_match_results is None:
+            self._previous_1v1_match_results = {
+                (i, j)
+                for i in range(len(self.entries))
+                for j in range(len(self.entries))
+                if self._1v1_match_votes[i][j] > self._1v1_match_votes[j][i]
+            }
+
+        rows = tuple(
+            (self.entries[i].name, self.entries[j].name, change)
+            for change, results in [
+                (-1, self._previous_1v1_match_results - remaining_1v1_match_results),
+                (1, remaining_1v1_match_results - self._previous_1v1_match_results)
+            ]
+            for i, j in sorted(results)
+        )
+        self._previous_1v1_match_results = remaining_1v1_match_results
 
+        self._report_sink.submit(
+            _write_rows_spreadsheet,
+            output_file_name,
+            self.REMAINING_1V1_MATCH_CHANGES_SPREADSHEET_COLUMN_NAMES,
+            rows
+        )
 
-    def _write_remaining_1v1_match_summary_to_spreadsheet(self, output_file_name_prefix):
+
+    def _write_remaining_1v1_match_summary_to_verbose_spreadsheet(self, output_file_name_prefix):
         """
         Write out a summary of the TidemanContest's remaining 1v1 matches to a spreadsheet at the
         path {output_file_name_prefix}-round{self._round_number}-1v1-matches.csv
@@ -99,41 +264,24 @@ class TidemanContest(Contest):
         if the row's Entry would win the match.
 
         Finally, the rightmost column tallies up the wins of each row's Entry.
+
+        Like every spreadsheet, this is written by self._report_sink.
         """
 
         output_file_name = f"{output_file_name_prefix}-round{self._round_number}-1v1-matches.csv"
 
         if self.verbose:
             print()
-            print(f"Writing current 1v1 match summary to {output_file_name}...", end="", flush=True)
-
-        with open(output_file_name, "w", newline="") as spreadsheet:
-            header = [
-                "",
-                *[entry.name for entry in self.entries],
-                self.REMAINING_1V1_MATCH_SUMMARY_SPREADSHEET_NUM_WINS_COLUMN_NAME
-            ]
-            writer = csv.DictWriter(spreadsheet, delimiter=",", fieldnames=header)
-            writer.writeheader()
-
-            rows = []
-            for entry in self.entries:
-                row = {
-                    "": entry.name
-                }
-
-                for other_entry in self.entries:
-                    if other_entry in entry.remaining_beatable_1v1_match_opponents:
-                        row[other_entry.name] = 1
+            print(f"Writing current 1v1 match summary to {output_file_name}.")
 
-                row[self.REMAINING_1V1_MATCH_SUMMARY_SPREADSHEET_NUM_WINS_COLUMN_NAME] = len(entry.remaining_beatable_1v1_match_opponents)
-
-                rows.append(row)
-
-            writer.writerows(rows)
-
-        if self.verbose:
-            print(" done.")
+        self._report_sink.submit(
+            _write_remaining_1v1_match_summary_spreadsheet,
+            output_file_name,
+            tuple(
+                (entry, frozenset(entry.remaining_beatable_1v1_match_opponents))
+                for entry in self.entries
+            )
+        )
 
 
     def _write_instant_runoff_round_to_spreadsheet(self, output_file_name_prefix):
@@ -148,65 +296,34 @@ class TidemanContest(Contest):
         Each cell in those columns represents a Voter who voted for that column's Entry.
         Those cells contain the Voter name, the ranking they gave the Entry, and the Borda count
         they gave the Entry.
+
+        Like every spreadsheet, this is written by self._report_sink. If output_file_name_prefix is
+        None, then nothing is written.
         """
 
+        if output_file_name_prefix is None:
+            return
+
         output_file_name = f"{output_file_name_prefix}-round{self._round_number}-instant-runoff.csv"
 
         if self.verbose:
             print()
-            print(
-                f"Writing round {self._round_number} instant runoff data to {output_file_name}...",
-                end="",
-                flush=True
-            )
-
-        with open(output_file_name, "w", newline="") as spreadsheet:
-            writer = csv.writer(spreadsheet, delimiter=",")
-
-            entries_header = [
-                f"{entry.name} ({len(entry.instant_runoff_voters)} votes, Borda count {entry.borda_count})"
+            print(f"Writing round {self._round_number} instant runoff data to {output_file_name}.")
+
+        self._report_sink.submit(
+            _write_instant_runoff_round_spreadsheet,
+            output_file_name,
+            tuple(
+                (
+                    entry,
+                    f"{entry.name} ({entry.num_instant_runoff_voters} votes, Borda count {entry.borda_count})",
+                    snapshot_ballot_groups(entry.instant_runoff_ballot_groups)
+                )
                 for entry in self.entries
-            ]
-
-            header = [
-                TidemanContest.INSTANT_RUNOFF_ROUND_SPREADSHEET_INVALID_VOTER_COLUMN_NAME,
-                TidemanContest.INSTANT_RUNOFF_ROUND_SPREADSHEET_ELIMINATED_VOTER_COLUMN_NAME,
-                *entries_header
-            ]
-            writer.writerow(header)
-
-            # construct a list for each entry column
-            entry_columns = []
-            for entry in self.entries:
-                # each column is filled with data on the user that voted for that Entry
-                # and which rank the user gave that Entry
-                entry_column = []
-                for voter in entry.instant_runoff_voters:
-                    voter_info_string = (
-                        f"{voter.name}: assigned ranking {voter.get_ranking_of_entry(entry)}"
-                        f" (Borda count {voter.get_borda_count_of_entry(entry)}),"
-                        f" moved in round {voter.round_when_last_moved}"
-                    )
-                    entry_column.append(voter_info_string)
-
-                entry_columns.append(entry_column)
-
-            # rearrange the body of the spreadsheet into a list of rows (so each list passed in as
-            # an argument becomes a column in the final body)
-            body = itertools.zip_longest(
-                [voter.name for voter in self._voters_with_no_valid_votes],
-                [
-                    f"{voter.name}: round {voter.round_when_last_moved}"
-                    for voter in self._voters_with_no_remaining_valid_votes
-                ],
-                *entry_columns,
-                fillvalue=""
-            )
-            for row in body:
-                writer.writerow(row)
-
-        if self.verbose:
-            print(" done.")
+            ),
+            snapshot_ballot_groups(self._ballot_groups_with_no_valid_votes),
+            snapshot_ballot_groups(self._ballot_groups_with_no_remaining_valid_votes)
+        )
 
 
     def _print_round_name(self):
@@ -216,130 +333,79 @@ class TidemanContest(Contest):
         print("#" * TidemanContest.NUM_CHARS_IN_DIVIDER)
 
 
-    def _print_1v1_match_summary(self):
-        """
-        Print each Entry still in the race and its 1v1 win count to the console.
-        Note that this method assumes at least one Entry remains in the race.
-        """
-
-        print()
-        print("Entries still in the race:")
-        print()
-        sorted_entries = self._get_sorted_entries_still_in_race()
-        longest_entry_name_length = max(len(entry.name) for entry in self._entries_still_in_race)
-        longest_num_wins_length = len(str(len(sorted_entries[0].remaining_beatable_1v1_match_opponents)))
-        for entry in sorted_entries:
-            win_text = "win " if len(entry.remaining_beatable_1v1_match_opponents) == 1 else "wins"
-            beatable_entries_text = str([e.name for e in entry.remaining_beatable_1v1_match_opponents])[1:-1]
-
-            entry_text = f"\t{entry.name}: ".ljust(longest_entry_name_length + 3)
-            entry_text += str(len(entry.remaining_beatable_1v1_match_opponents)).ljust(longest_num_wins_length)
-            entry_text += f" 1v1 {win_text}"
-            if entry.remaining_beatable_1v1_match_opponents:
-                entry_text += f" (beats {beatable_entries_text})"
-
-            print(entry_text)
-
-
-    def _print_instant_runoff_chart(self):
-        """
-        Output a chart of the current instant runoff votes to the console.
-        """
-
-        longest_entry_name_length = max(len(entry.name) for entry in self.entries)
-
-        print()
-        print("Instant runoff results:")
-        print()
-        for entry in self._entries_still_in_race:
-
-            vote_fraction = len(entry.instant_runoff_voters) / len(self._voters_with_valid_votes)
-
-            # bar in chart showing vote count
-            num_chars_in_vote_bar = round(TidemanContest.NUM_CHARS_IN_FULL_VOTE_BAR * vote_fraction)
-            vote_bar = "\u25A0" * num_chars_in_vote_bar
-
-            # text showing percentage of Voters voting for this entry
-            percentage_text = f"{round(100 * vote_fraction, 1)}%"
-
-            # text showing number of Voters voting for this entry
-            vote_text = "vote" if len(entry.instant_runoff_voters) == 1 else "votes"
-            vote_count_text = f"{len(entry.instant_runoff_voters)} {vote_text}"
-
-            # text showing how much the number of Voters changed this round
-            change_text_sign = "+" if entry.num_instant_runoff_voters_gained_in_current_round >= 0 else ""
-            change_text = f"{change_text_sign}{entry.num_instant_runoff_voters_gained_in_current_round} this round"
-
-            # text showing the Borda count
-            borda_count_text = f"Borda count {entry.borda_count}"
-
-            entry_output = "\t" + entry.name.ljust(longest_entry_name_length + 2)
-            entry_output += f"{vote_bar} {percentage_text}"
-            entry_output += f" ({vote_count_text}, {change_text}; {borda_count_text})"
-            print(entry_output)
-
-        print()
-
-        # print info about unused voters
-        print(
-            f"\t{TidemanContest.INSTANT_RUNOFF_ROUND_SPREADSHEET_INVALID_VOTER_COLUMN_NAME}:"
-            f" {len(self._voters_with_no_valid_votes)}"
-        )
-        print(
-            f"\t{TidemanContest.INSTANT_RUNOFF_ROUND_SPREADSHEET_ELIMINATED_VOTER_COLUMN_NAME}: "
-            f"{len(self._voters_with_no_remaining_valid_votes)}"
-            f" (+{self._num_instant_runoff_voters_exhausted_in_current_round} this round)"
-        )
-
-
     def _run_all_1v1_matches(self):
         """
         Simulate 1v1 matches between every Entry and store the results in the Entries.
         Specifically, e.remaining_beatable_1v1_match_opponents contains all the Entries remaining
         in the TidemanContest that Entry e would defeat in a 1v1 match.
-        """
 
-        for i, entry1 in enumerate(self.entries):
-            for entry2 in self.entries[i+1:]:
-                entry1_num_votes = 0
-                entry2_num_votes = 0
-
-                for voter in self.voters:
-                    entry1_ranking = voter.get_ranking_of_entry(entry1)
-                    entry2_ranking = voter.get_ranking_of_entry(entry2)
+        The vote tallies are also kept in self._1v1_match_votes, where
+        self._1v1_match_votes[i][j] contains the number of Voters who prefer self.entries[i] to
+        self.entries[j].
+        """
 
-                    if entry1_ranking < entry2_ranking:
-                        entry1_num_votes += 1
-                    elif entry2_ranking < entry1_ranking:
-                        entry2_num_votes += 1
+        if self.precomputed_1v1_match_votes is not None:
+            # the tallies are already known: they were loaded from a snapshot, taken from a
+            # ContestTally (see Contest.populate_from_tally), or kept up to date as Voters were
+            # added (see Contest.add_voters)
+            self._1v1_match_votes = self.precomputed_1v1_match_votes
+        else:
+            self._1v1_match_votes = count_1v1_match_votes(
+                self.ballot_groups, self.entries, self.use_numpy
+            )
+            if self.metrics is not None:
+                # only pairs of Entries on the same ballot are compared
+                self.metrics.add(
+                    "1v1_match_comparisons",
+                    sum(
+                        len(ballot_group.ballot) * (len(ballot_group.ballot) - 1) // 2
+                        for ballot_group in self.ballot_groups
+                    )
+                )
 
-                if entry1_num_votes > entry2_num_votes:
+        for i, entry1 in enumerate(self.entries):
+            for j, entry2 in enumerate(self.entries):
+                if self._1v1_match_votes[i][j] > self._1v1_match_votes[j][i]:
                     entry1.remaining_beatable_1v1_match_opponents.add(entry2)
-                elif entry2_num_votes > entry1_num_votes:
-                    entry2.remaining_beatable_1v1_match_opponents.add(entry1)
 
 
     def _prepare_instant_runoff(self):
         """
-        Pre-process and store Voter data to prepare for the first round of instant runoff voting.
+        Pre-process and store BallotGroup data to prepare for the first round of instant runoff
+        voting.
         """
 
-        # Voters who did and did not cast valid votes
-        self._voters_with_valid_votes = []
-        self._voters_with_no_valid_votes = []
-        for voter in self.voters:
-            if voter.cast_valid_vote:
-                self._voters_with_valid_votes.append(voter)
-                # prepare Voter to iterate through their valid votes in future rounds
-                iter(voter)
+        # BallotGroups of Voters who did and did not cast valid votes, and the numbers of those
+        # Voters
+        self._ballot_groups_with_valid_votes = []
+        self._ballot_groups_with_no_valid_votes = []
+        self._num_voters_with_valid_votes = 0
+        self._num_voters_with_no_valid_votes = 0
+        for ballot_group in self.ballot_groups:
+            # forget any earlier count (see Contest.add_voters)
+            ballot_group.round_when_last_moved = 0
+            ballot_group.arrival_key = ()
+
+            if ballot_group.cast_valid_vote:
+                self._ballot_groups_with_valid_votes.append(ballot_group)
+                self._num_voters_with_valid_votes += ballot_group.weight
+                # prepare BallotGroup to iterate through its valid votes in future rounds
+                iter(ballot_group)
             else:
-                self._voters_with_no_valid_votes.append(voter)
-
-        # Voters who should vote for their favorite remaining Entry in the next round;
-        # in the first round, all eligible voters should vote for their favorite remaining Entry
-        self._voters_to_reallocate = self._voters_with_valid_votes.copy()
-        # Voters who only cast valid votes for Entries that have been eliminated
-        self._voters_with_no_remaining_valid_votes = []
+                self._ballot_groups_with_no_valid_votes.append(ballot_group)
+                self._num_voters_with_no_valid_votes += ballot_group.weight
+
+        # BallotGroups whose Voters should vote for their favorite remaining Entry in the next
+        # round; in the first round, all eligible voters should vote for their favorite remaining
+        # Entry
+        self._ballot_groups_to_reallocate = self._ballot_groups_with_valid_votes.copy()
+        # the index in self._ballot_groups_to_reallocate of the first BallotGroup from each Entry
+        # (or, in the first round, from the Voters' ballots) that they're moving away from
+        self._reallocation_source_starts = [0]
+        # BallotGroups of Voters who only cast valid votes for Entries that have been eliminated,
+        # and the number of those Voters
+        self._ballot_groups_with_no_remaining_valid_votes = []
+        self._num_voters_with_no_remaining_valid_votes = 0
 
         # the amount of Voters who have had all of their Entries eliminated during the current round
         self._num_instant_runoff_voters_exhausted_in_current_round = 0
@@ -352,6 +418,9 @@ class TidemanContest(Contest):
 
         entry.has_lost = True
         self._entries_still_in_race.remove(entry)
+        self._round_eliminated.append(entry.id)
+        if entry.num_instant_runoff_voters:
+            self._round_transfers.append((entry.id, entry.num_instant_runoff_voters))
 
         # remove the Entry from the records of remaining 1v1 matches
         for other_entry in self.entries:
@@ -359,14 +428,30 @@ class TidemanContest(Contest):
 
         # all Voters currently supporting the Entry as their favorite should now support their
         # next-favorite remaining Entry during the next instant-runoff round
-        self._voters_to_reallocate += entry.instant_runoff_voters
-        entry.instant_runoff_voters = []
+        self._reallocation_source_starts.append(len(self._ballot_groups_to_reallocate))
+        self._ballot_groups_to_reallocate += entry.instant_runoff_ballot_groups
+        entry.instant_runoff_ballot_groups = {}
+        entry.num_instant_runoff_voters = 0
 
         # at the beginning of the next round, self._prev_round_was_productive should be True to
         # indicate that this round had at least one elimination
         self._prev_round_was_productive = True
 
 
+    def _get_remaining_1v1_match_wins(self):
+        """
+        Return a tuple whose i-th element is a bitmask of the Entries that self.entries[i] would
+        beat in a 1v1 match, or None if it isn't in the race (see
+        RoundResult.remaining_1v1_match_wins).
+        """
+
+        return tuple(
+            sum(1 << opponent.id for opponent in entry.remaining_beatable_1v1_match_opponents)
+            if entry.still_in_race else None
+            for entry in self.entries
+        )
+
+
     def _get_sorted_entries_still_in_race(self):
         """
         Return the Entries still in the race, sorted from highest to lowest 1v1 win count.
@@ -413,14 +498,15 @@ class TidemanContest(Contest):
         return True
 
 
-    def _eliminate_entries_outside_dominating_set(self):
+    def _get_smallest_dominating_set_incrementally(self):
         """
         Of the remaining Entries, find the smallest dominating set of size at least
-        self._num_winners. Eliminate all Entries not in this set from the TidemanContest.
+        self._num_winners by growing a set one Entry at a time until it's dominating.
+        Return a tuple of the form
 
-        A dominating set is a non-empty subset of Entries still in the race with a special property:
-        if you take two Entries still in the race, one that's in the set and one that's not,
-        then the one in the set would win in a 1v1 match.
+        (inside_entries, outside_entries),
+
+        where both lists are sorted from most to fewest 1v1 wins.
         """
 
         # For every dominating set, there is a threshold T such that every Entry in the set has
@@ -432,12 +518,6 @@ class TidemanContest(Contest):
         # that each Entry outside the set will lose to each Entry in the set.)
 
         if self.verbose:
-            print()
-            print(
-                f"Because {self._num_winners} winners are desired,"
-                f" constructing the smallest dominating set of size >={self._num_winners}"
-                f" on the remaining entries."
-            )
             print(f"\t* Adding {self._num_winners} entries with the most wins to the set...", end="")
 
         sorted_entries = self._get_sorted_entries_still_in_race()
@@ -455,6 +535,45 @@ class TidemanContest(Contest):
                     end=""
                 )
 
+        return (inside_entries, outside_entries)
+
+
+    def _eliminate_entries_outside_dominating_set(self):
+        """
+        Of the remaining Entries, find the smallest dominating set of size at least
+        self._num_winners. Eliminate all Entries not in this set from the TidemanContest.
+
+        A dominating set is a non-empty subset of Entries still in the race with a special property:
+        if you take two Entries still in the race, one that's in the set and one that's not,
+        then the one in the set would win in a 1v1 match.
+        """
+
+        if self.verbose:
+            print()
+            print(
+                f"Because {self._num_winners} winners are desired,"
+                f" constructing the smallest dominating set of size >={self._num_winners}"
+                f" on the remaining entries."
+            )
+
+        dominating_set = get_smallest_dominating_set(self._entries_still_in_race, self._num_winners)
+
+        if self.cross_check_dominating_set:
+            inside_entries, _ = self._get_smallest_dominating_set_incrementally()
+            if set(inside_entries) != set(dominating_set):
+                raise RuntimeError(
+                    "The dominating set found from the graph of 1v1 match results,"
+                    f" {[entry.name for entry in dominating_set]}, does not match the one found by"
+                    f" incremental search, {[entry.name for entry in inside_entries]}."
+                )
+
+        # list the Entries from most to fewest 1v1 wins
+        sorted_entries = self._get_sorted_entries_still_in_race()
+        dominating_set = set(dominating_set)
+        inside_entries = [entry for entry in sorted_entries if entry in dominating_set]
+        outside_entries = [entry for entry in sorted_entries if entry not in dominating_set]
+        self._round_dominating_set = [entry.id for entry in inside_entries]
+
         # at this point, inside_entries is a dominating set of at least self._num_winners elements;
         # remove all the other elements
 
@@ -475,23 +594,41 @@ class TidemanContest(Contest):
 
     def _reallocate_voters(self):
         """
-        Reallocate the Voters in self._voters_to_reallocate to their next-choice Entry.
-        If they don't have a next choice, add them to self._voters_with_no_remaining_valid_votes.
+        Reallocate the Voters in self._ballot_groups_to_reallocate to their next-choice Entry.
+        If they don't have a next choice, add them to
+        self._ballot_groups_with_no_remaining_valid_votes.
         """
 
-        for voter in self._voters_to_reallocate:
-            next_favorite_entry = next(voter)
+        for i, ballot_group in enumerate(self._ballot_groups_to_reallocate):
+            # the BallotGroups from each Entry arrive after those from Entries eliminated before it
+            source = bisect.bisect_right(self._reallocation_source_starts, i) - 1
+
+            next_favorite_entry = next(ballot_group)
             if next_favorite_entry is None:
-                # the voter cast no more valid votes for Entries that are still in the race
-                self._voters_with_no_remaining_valid_votes.append(voter)
-                self._num_instant_runoff_voters_exhausted_in_current_round += 1
+                # the voters cast no more valid votes for Entries that are still in the race
+                self._ballot_groups_with_no_remaining_valid_votes.append(ballot_group)
+                self._num_voters_with_no_remaining_valid_votes += ballot_group.weight
+                self._num_instant_runoff_voters_exhausted_in_current_round += ballot_group.weight
             else:
-                next_favorite_entry.instant_runoff_voters.append(voter)
-                next_favorite_entry.num_instant_runoff_voters_gained_in_current_round += 1
-
-            voter.round_when_last_moved = self._round_number
+                next_favorite_entry.instant_runoff_ballot_groups[ballot_group] = None
+                next_favorite_entry.num_instant_runoff_voters += ballot_group.weight
+                next_favorite_entry.num_instant_runoff_voters_gained_in_current_round += ballot_group.weight
+
+            ballot_group.round_when_last_moved = self._round_number
+            ballot_group.arrival_key = (self._round_number, source) + ballot_group.arrival_key
+
+        if self.metrics is not None:
+            self.metrics.add("ballot_groups_moved", len(self._ballot_groups_to_reallocate))
+            self.metrics.add(
+                "voters_moved",
+                sum(ballot_group.weight for ballot_group in self._ballot_groups_to_reallocate)
+            )
+            self.metrics.add(
+                "voters_exhausted", self._num_instant_runoff_voters_exhausted_in_current_round
+            )
 
-        self._voters_to_reallocate = []
+        self._ballot_groups_to_reallocate = []
+        self._reallocation_source_starts = []
 
 
     def _update_borda_counts(self, last_place_entries):
@@ -504,14 +641,13 @@ class TidemanContest(Contest):
         for entry in self._entries_still_in_race:
             entry.borda_count = None
 
-        for last_place_entry in last_place_entries:
-            last_place_entry.borda_count = 0
-
-        for voter in self._voters_with_valid_votes:
-            entry_to_voter_borda_count = voter.get_borda_counts_of_entries(last_place_entries)
-            for last_place_entry, borda_count in entry_to_voter_borda_count.items():
-                last_place_entry.borda_count += borda_count
-
+        # the Borda counts follow directly from the 1v1 match votes tallied in
+        # _run_all_1v1_matches (see matchmatrix.get_borda_counts)
+        borda_counts = get_borda_counts(
+            self._1v1_match_votes, [entry.id for entry in last_place_entries]
+        )
+        for last_place_entry, borda_count in zip(last_place_entries, borda_counts):
+            last_place_entry.borda_count = borda_count
 
 
     def _get_instant_runoff_last_place_entries(self):
@@ -522,14 +658,6 @@ class TidemanContest(Contest):
         (borda_count, entries_with_borda_count).
         """
 
-        if self.verbose:
-            print()
-            print(
-                f"Because {len(self._entries_still_in_race)} entries remain"
-                f" but only {self._num_winners} winners are desired, identifying"
-                " last-place entries through instant-runoff voting."
-            )
-
         # Entries have not yet gained any Voters this round
         for entry in self.entries:
             entry.num_instant_runoff_voters_gained_in_current_round = 0
@@ -541,21 +669,13 @@ class TidemanContest(Contest):
         self._reallocate_voters()
 
         num_voters_for_last_place_entries = min(
-            len(entry.instant_runoff_voters) for entry in self._entries_still_in_race
+            entry.num_instant_runoff_voters for entry in self._entries_still_in_race
         )
         last_place_entries = [
             entry for entry in self._entries_still_in_race
-            if len(entry.instant_runoff_voters) == num_voters_for_last_place_entries
+            if entry.num_instant_runoff_voters == num_voters_for_last_place_entries
         ]
 
-        if self.verbose:
-            entry_text = "entry" if len(last_place_entries) == 1 else "entries"
-            print(
-                f"\t* Identified {len(last_place_entries)} last-place {entry_text}"
-                f" ({num_voters_for_last_place_entries} votes):"
-                f" {[entry.name for entry in last_place_entries]}."
-            )
-
         self._update_borda_counts(last_place_entries)
 
         # last_place_entries_by_borda_count[borda_count] contains a list of the last-place entries
@@ -579,37 +699,94 @@ class TidemanContest(Contest):
         favorite remaining Entry. Eliminate the last-place Entries in order from least to greatest
         Borda count until either all have been eliminated or eliminating more would prevent the
         TidemanContest from having enough winners.
+
+        The instant-runoff tallies are kept in self._round_instant_runoff_tallies, as the keyword
+        arguments of the round's RoundResult.
         """
 
         borda_counts_and_last_place_entries = self._get_instant_runoff_last_place_entries()
 
-        if self.verbose:
-            self._print_instant_runoff_chart()
-            print()
-            print("Eliminating last-place entries in order from least-to-greatest Borda count.")
-
+        self._round_instant_runoff_tallies = {
+            "tallies": [entry.num_instant_runoff_voters for entry in self.entries],
+            "tally_changes": [
+                entry.num_instant_runoff_voters_gained_in_current_round for entry in self.entries
+            ],
+            "num_exhausted_voters": self._num_voters_with_no_remaining_valid_votes,
+            "num_exhausted_voters_in_round": self._num_instant_runoff_voters_exhausted_in_current_round,
+            "borda_counts": [
+                (entry.id, entry.borda_count)
+                for entry in self._entries_still_in_race
+                if entry.borda_count is not None
+            ],
+        }
+
+        # (the console output for this is printed from the round's RoundResult; see
+        # _print_instant_runoff_round)
         while borda_counts_and_last_place_entries and \
             len(self._entries_still_in_race) > self._num_winners:
-            borda_count, entries_with_borda_count = heapq.heappop(borda_counts_and_last_place_entries)
+            _, entries_with_borda_count = heapq.heappop(borda_counts_and_last_place_entries)
 
             if len(self._entries_still_in_race) - len(entries_with_borda_count) < self._num_winners:
-                if self.verbose:
-                    print(
-                        f"\t* Because {[e.name for e in entries_with_borda_count]} have"
-                        f" the same Borda count ({borda_count}), eliminating more entries"
-                        " would produce"
-                        f" {len(self._entries_still_in_race) - len(entries_with_borda_count)} < {self._num_winners}"
-                        " winners."
-                    )
                 break
-            else:
+
+            for entry in entries_with_borda_count:
+                self._eliminate_entry(entry)
+
+
+    def _run_all_rounds(self, output_file_name_prefix):
+        """
+        Run rounds of the TidemanContest until all the winners are found or until a round
+        accomplishes nothing, writing out spreadsheets for every round.
+        """
+
+        # keep running rounds until all the winners are found or until a round accomplishes nothing
+        # (which can happen if too many winners were found, but none can be eliminated due to a tie)
+        entry_names = [entry.name for entry in self.entries]
+
+        while len(self._entries_still_in_race) > self._num_winners and self._prev_round_was_productive:
+            self._round_number += 1
+            if self.verbose:
+                self._print_round_name()
+
+            self._prev_round_was_productive = False
+            # what happened this round, for its RoundResult
+            self._round_eliminated = []
+            self._round_transfers = []
+            self._round_dominating_set = None
+            self._round_instant_runoff_tallies = None
+
+            remaining_1v1_match_wins = self._get_remaining_1v1_match_wins()
+            if self.verbose:
+                _print_1v1_match_summary(entry_names, remaining_1v1_match_wins)
+
+            self._write_remaining_1v1_match_summary_to_spreadsheet(output_file_name_prefix)
+            self._eliminate_entries_outside_dominating_set()
+
+            held_instant_runoff = len(self._entries_still_in_race) > self._num_winners
+            if held_instant_runoff:
+                self._eliminate_instant_runoff_last_place_entries()
+
+            round_result = RoundResult(
+                self._round_number,
+                self._get_entry_statuses(),
+                eliminated=self._round_eliminated,
+                transfers=self._round_transfers,
+                num_valid_voters=self._num_voters_with_valid_votes,
+                num_voters_with_no_valid_votes=self._num_voters_with_no_valid_votes,
+                remaining_1v1_match_wins=remaining_1v1_match_wins,
+                dominating_set=self._round_dominating_set,
+                **(self._round_instant_runoff_tallies or {
+                    "num_exhausted_voters": self._num_voters_with_no_remaining_valid_votes,
+                })
+            )
+            self.round_results.append(round_result)
+
+            if held_instant_runoff:
                 if self.verbose:
-                    print(
-                        f"\t* Eliminating last-place entries with Borda count {borda_count}:",
-                        [e.name for e in entries_with_borda_count]
-                    )
-                for entry in entries_with_borda_count:
-                    self._eliminate_entry(entry)
+                    _print_instant_runoff_round(round_result, entry_names, self._num_winners)
+                self._write_instant_runoff_round_to_spreadsheet(output_file_name_prefix)
+
+        self._flush_reports()
 
 
     def get_winners(self, num_winners, output_file_name_prefix):
@@ -621,13 +798,16 @@ class TidemanContest(Contest):
         * more than num_winners winners have won, but we cannot eliminate any Entries according to
             the contest rules.
 
-        During the simulation, output the following spreadsheets:
+        During the simulation, output the following spreadsheets (see self.report_format):
 
         * how the Voters would vote in every possible 1v1 match;
-        * for every round, a summary of the 1v1 matches involving the Entries still in the race;
+        * for every round, a summary of (or, in compact reports, the changes to) the 1v1 matches
+            involving the Entries still in the race;
         * for every round, if needed, the results of an IRV round of voting for those Entries that
             survived the round's 1v1 matches.
 
+        If output_file_name_prefix is None, then no spreadsheets are written.
+
         Return the Entry objects representing the winners.
         """
 
@@ -640,6 +820,14 @@ class TidemanContest(Contest):
 
         self._num_winners = num_winners
         self._round_number = 0
+        self.round_results = []
+        # the TidemanContest may have been counted before Voters were added to it (see
+        # Contest.add_voters), so start from a clean slate
+        for entry in self.entries:
+            entry.reset_count()
+        # the 1v1 match results as of the last call to
+        # _write_remaining_1v1_match_changes_to_spreadsheet
+        self._previous_1v1_match_results = None
         self._entries_still_in_race = self.entries.copy()
         # at the beginning of a round, self._prior_round_was_productive is True if the prior round
         # resulted in at least one elimination and False otherwise. At all other times, the
@@ -650,26 +838,15 @@ class TidemanContest(Contest):
         # determine the outcome of every 1v1 match, and prepare for instant-runoff voting
         self._run_all_1v1_matches()
         self._prepare_instant_runoff()
-        self._write_all_1v1_match_votes_to_spreadsheet(output_file_name_prefix)
 
-        # keep running rounds until all the winners are found or until a round accomplishes nothing
-        # (which can happen if too many winners were found, but none can be eliminated due to a tie)
-        while len(self._entries_still_in_race) > self._num_winners and self._prev_round_was_productive:
-            self._round_number += 1
-            if self.verbose:
-                self._print_round_name()
-
-            self._prev_round_was_productive = False
-
-            if self.verbose:
-                self._print_1v1_match_summary()
-
-            self._write_remaining_1v1_match_summary_to_spreadsheet(output_file_name_prefix)
-            self._eliminate_entries_outside_dominating_set()
-
-            if len(self._entries_still_in_race) > self._num_winners:
-                self._eliminate_instant_runoff_last_place_entries()
-                self._write_instant_runoff_round_to_spreadsheet(output_file_name_prefix)
+        # spreadsheets are written by self._report_sink, which is closed (waiting for any
+        # spreadsheets still being written) once the contest is over
+        with ReportSink(
+            self.background_reports, track_output=self.metrics is not None
+        ) as self._report_sink:
+            self._write_all_1v1_match_votes_to_spreadsheet(output_file_name_prefix)
+            self._run_all_rounds(output_file_name_prefix)
+        self._record_report_metrics(self._report_sink)
 
         if self.verbose:
             print()
@@ -688,4 +865,319 @@ class TidemanContest(Contest):
         print()
         print(f"WINNERS: {[winner.name for winner in self._entries_still_in_race]}")
         print()
-        return self._entries_still_in_race
\ No newline at end of file
+        return self._entries_still_in_race
+
+
+def _print_1v1_match_summary(entry_names, remaining_1v1_match_wins):
+    """
+    Print each Entry still in the race and its 1v1 win count to the console, given the Entries'
+    names and their remaining 1v1 match wins (see RoundResult.remaining_1v1_match_wins).
+    Note that this function assumes at least one Entry remains in the race.
+    """
+
+    print()
+    print("Entries still in the race:")
+    print()
+    # beaten_entry_ids[i] contains the ids of the Entries that Entry i would beat
+    beaten_entry_ids = {
+        i: get_bitmask_ids(wins)
+        for i, wins in enumerate(remaining_1v1_match_wins)
+        if wins is not None
+    }
+    sorted_entry_ids = sorted(beaten_entry_ids, key=lambda i: len(beaten_entry_ids[i]), reverse=True)
+    longest_entry_name_length = max(len(entry_names[i]) for i in beaten_entry_ids)
+    longest_num_wins_length = len(str(len(beaten_entry_ids[sorted_entry_ids[0]])))
+    for i in sorted_entry_ids:
+        num_wins = len(beaten_entry_ids[i])
+        win_text = "win " if num_wins == 1 else "wins"
+        beatable_entries_text = str([entry_names[j] for j in beaten_entry_ids[i]])[1:-1]
+
+        entry_text = f"\t{entry_names[i]}: ".ljust(longest_entry_name_length + 3)
+        entry_text += str(num_wins).ljust(longest_num_wins_length)
+        entry_text += f" 1v1 {win_text}"
+        if num_wins:
+            entry_text += f" (beats {beatable_entries_text})"
+
+        print(entry_text)
+
+
+def _print_instant_runoff_round(round_result, entry_names, num_winners):
+    """
+    Print the instant-runoff part of the given round (a RoundResult of a TidemanContest seeking
+    num_winners winners) to the console: the last-place Entries, a chart of the instant runoff
+    votes, and which last-place Entries were eliminated.
+    """
+
+    # the Entries that took part in the instant runoff, in the order they were entered
+    entry_ids = sorted(round_result.dominating_set)
+    tallies = round_result.tallies
+    borda_counts = dict(round_result.borda_counts)
+
+    print()
+    print(
+        f"Because {len(entry_ids)} entries remain"
+        f" but only {num_winners} winners are desired, identifying"
+        " last-place entries through instant-runoff voting."
+    )
+
+    num_voters_for_last_place_entries = min(tallies[i] for i in entry_ids)
+    last_place_entry_ids = [i for i in entry_ids if tallies[i] == num_voters_for_last_place_entries]
+    entry_text = "entry" if len(last_place_entry_ids) == 1 else "entries"
+    print(
+        f"\t* Identified {len(last_place_entry_ids)} last-place {entry_text}"
+        f" ({num_voters_for_last_place_entries} votes):"
+        f" {[entry_names[i] for i in last_place_entry_ids]}."
+    )
+
+    _print_instant_runoff_chart(round_result, entry_names, entry_ids, borda_counts)
+
+    print()
+    print("Eliminating last-place entries in order from least-to-greatest Borda count.")
+
+    # replay the eliminations in TidemanContest._eliminate_instant_runoff_last_place_entries
+    last_place_entry_ids_by_borda_count = {}
+    for i in last_place_entry_ids:
+        last_place_entry_ids_by_borda_count.setdefault(borda_counts[i], []).append(i)
+
+    num_entries_still_in_race = len(entry_ids)
+    for borda_count, entry_ids_with_borda_count in sorted(last_place_entry_ids_by_borda_count.items()):
+        if num_entries_still_in_race <= num_winners:
+            break
+
+        if num_entries_still_in_race - len(entry_ids_with_borda_count) < num_winners:
+            print(
+                f"\t* Because {[entry_names[i] for i in entry_ids_with_borda_count]} have"
+                f" the same Borda count ({borda_count}), eliminating more entries"
+                " would produce"
+                f" {num_entries_still_in_race - len(entry_ids_with_borda_count)} < {num_winners}"
+                " winners."
+            )
+            break
+
+        print(
+            f"\t* Eliminating last-place entries with Borda count {borda_count}:",
+            [entry_names[i] for i in entry_ids_with_borda_count]
+        )
+        num_entries_still_in_race -= len(entry_ids_with_borda_count)
+
+
+def _print_instant_runoff_chart(round_result, entry_names, entry_ids, borda_counts):
+    """
+    Output a chart of the given round's instant runoff votes for the Entries with the given ids to
+    the console. borda_counts[i] contains the Borda count of Entry i, if it was computed.
+    """
+
+    longest_entry_name_length = max(len(entry_name) for entry_name in entry_names)
+
+    print()
+    print("Instant runoff results:")
+    print()
+    for i in entry_ids:
+        num_votes = round_result.tallies[i]
+        num_votes_gained = round_result.tally_changes[i]
+
+        vote_fraction = num_votes / round_result.num_valid_voters
+
+        # bar in chart showing vote count
+        num_chars_in_vote_bar = round(TidemanContest.NUM_CHARS_IN_FULL_VOTE_BAR * vote_fraction)
+        vote_bar = "\u25A0" * num_chars_in_vote_bar
+
+        # text showing percentage of Voters voting for this entry
+        percentage_text = f"{round(100 * vote_fraction, 1)}%"
+
+        # text showing number of Voters voting for this entry
+        vote_text = "vote" if num_votes == 1 else "votes"
+        vote_count_text = f"{num_votes} {vote_text}"
+
+        # text showing how much the number of Voters changed this round
+        change_text_sign = "+" if num_votes_gained >= 0 else ""
+        change_text = f"{change_text_sign}{num_votes_gained} this round"
+
+        # text showing the Borda count
+        borda_count_text = f"Borda count {borda_counts.get(i)}"
+
+        entry_output = "\t" + entry_names[i].ljust(longest_entry_name_length + 2)
+        entry_output += f"{vote_bar} {percentage_text}"
+        entry_output += f" ({vote_count_text}, {change_text}; {borda_count_text})"
+        print(entry_output)
+
+    print()
+
+    # print info about unused voters
+    print(
+        f"\t{TidemanContest.INSTANT_RUNOFF_ROUND_SPREADSHEET_INVALID_VOTER_COLUMN_NAME}:"
+        f" {round_result.num_voters_with_no_valid_votes}"
+    )
+    print(
+        f"\t{TidemanContest.INSTANT_RUNOFF_ROUND_SPREADSHEET_ELIMINATED_VOTER_COLUMN_NAME}: "
+        f"{round_result.num_exhausted_voters}"
+        f" (+{round_result.num_exhausted_voters_in_round} this round)"
+    )
+
+
+def _write_ballots_spreadsheet(output_file_name, ballots):
+    """
+    Write the ballots spreadsheet described in
+    TidemanContest._write_ballots_and_1v1_match_votes_to_spreadsheets.
+    ballots contains a (tuple of Entry names, sequence of Voters) tuple for every BallotGroup.
+    """
+
+    with open(output_file_name, "w", newline="") as spreadsheet:
+        writer = csv.writer(spreadsheet, delimiter=",")
+        writer.writerow([TidemanContest.ALL_1V1_MATCH_VOTES_SPREADSHEET_VOTER_COLUMN_NAME])
+
+        # write rows as they're produced rather than holding them all in memory
+        for ballot, voters in ballots:
+            for voter in voters:
+                writer.writerow([voter.name, *ballot])
+
+
+def _write_1v1_match_votes_spreadsheet(output_file_name, entry_names, votes):
+    """
+    Write the 1v1 match votes spreadsheet described in
+    TidemanContest._write_ballots_and_1v1_match_votes_to_spreadsheets.
+    votes[i][j] contains the number of Voters who prefer Entry i to Entry j.
+    """
+
+    with open(output_file_name, "w", newline="") as spreadsheet:
+        writer = csv.writer(spreadsheet, delimiter=",")
+        writer.writerow(["", *entry_names])
+        for entry_name, entry_votes in zip(entry_names, votes):
+            writer.writerow([entry_name, *entry_votes])
+
+
+def _write_all_1v1_match_votes_spreadsheet(output_file_name, entries, voters):
+    """
+    Write the spreadsheet described in
+    TidemanContest._write_all_1v1_match_votes_to_verbose_spreadsheet.
+    """
+
+    with open(output_file_name, "w", newline="") as spreadsheet:
+        match_names_to_entries = {}
+        for i, entry1 in enumerate(entries):
+            for entry2 in entries[i+1:]:
+                match_names_to_entries[f"{entry1.name} vs. {entry2.name}"] = (entry1, entry2)
+
+        header = [
+            TidemanContest.ALL_1V1_MATCH_VOTES_SPREADSHEET_VOTER_COLUMN_NAME,
+            *[match_name for match_name in match_names_to_entries],
+        ]
+        writer = csv.DictWriter(spreadsheet, delimiter=",", fieldnames=header)
+        writer.writeheader()
+
+        # write rows as they're produced rather than holding them all in memory
+        for voter in voters:
+            row = {
+                TidemanContest.ALL_1V1_MATCH_VOTES_SPREADSHEET_VOTER_COLUMN_NAME: voter.name
+            }
+            for match_name, (entry1, entry2) in match_names_to_entries.items():
+                entry1_ranking = voter.get_ranking_of_entry(entry1)
+                entry2_ranking = voter.get_ranking_of_entry(entry2)
+
+                if entry1_ranking < entry2_ranking:
+                    match_text = f"{entry1.name} (rankings: {entry1_ranking} vs. {entry2_ranking})"
+                elif entry2_ranking < entry1_ranking:
+                    match_text = f"{entry2.name} (rankings: {entry1_ranking} vs. {entry2_ranking})"
+                else:
+                    match_text = "N/A"
+
+                row[match_name] = match_text
+
+            writer.writerow(row)
+
+
+def _write_rows_spreadsheet(output_file_name, header, rows):
+    """
+    Write a spreadsheet with the given header and rows.
+    """
+
+    with open(output_file_name, "w", newline="") as spreadsheet:
+        writer = csv.writer(spreadsheet, delimiter=",")
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def _write_remaining_1v1_match_summary_spreadsheet(output_file_name, remaining_1v1_matches):
+    """
+    Write the spreadsheet described in
+    TidemanContest._write_remaining_1v1_match_summary_to_verbose_spreadsheet.
+    remaining_1v1_matches contains an (Entry, frozenset of the Entries it would beat) tuple for
+    every Entry.
+    """
+
+    with open(output_file_name, "w", newline="") as spreadsheet:
+        header = [
+            "",
+            *[entry.name for entry, _ in remaining_1v1_matches],
+            TidemanContest.REMAINING_1V1_MATCH_SUMMARY_SPREADSHEET_NUM_WINS_COLUMN_NAME
+        ]
+        writer = csv.DictWriter(spreadsheet, delimiter=",", fieldnames=header)
+        writer.writeheader()
+
+        # write rows as they're produced rather than holding them all in memory
+        for entry, beatable_opponents in remaining_1v1_matches:
+            row = {
+                "": entry.name
+            }
+
+            for other_entry, _ in remaining_1v1_matches:
+                if other_entry in beatable_opponents:
+                    row[other_entry.name] = 1
+
+            row[TidemanContest.REMAINING_1V1_MATCH_SUMMARY_SPREADSHEET_NUM_WINS_COLUMN_NAME] = len(beatable_opponents)
+
+            writer.writerow(row)
+
+
+def _write_instant_runoff_round_spreadsheet(
+    output_file_name,
+    entry_ballot_groups,
+    ballot_groups_with_no_valid_votes,
+    ballot_groups_with_no_remaining_valid_votes
+):
+    """
+    Write the spreadsheet described in TidemanContest._write_instant_runoff_round_to_spreadsheet.
+    entry_ballot_groups contains an (Entry, column title, BallotGroup snapshot) tuple for every
+    Entry, and the other arguments are BallotGroup snapshots (see snapshot_ballot_groups).
+    """
+
+    with open(output_file_name, "w", newline="") as spreadsheet:
+        writer = csv.writer(spreadsheet, delimiter=",")
+
+        header = [
+            TidemanContest.INSTANT_RUNOFF_ROUND_SPREADSHEET_INVALID_VOTER_COLUMN_NAME,
+            TidemanContest.INSTANT_RUNOFF_ROUND_SPREADSHEET_ELIMINATED_VOTER_COLUMN_NAME,
+            *[column_title for _, column_title, _ in entry_ballot_groups]
+        ]
+        writer.writerow(header)
+
+        # construct a list for each entry column
+        entry_columns = []
+        for entry, _, ballot_groups in entry_ballot_groups:
+            # each column is filled with data on the user that voted for that Entry
+            # and which rank the user gave that Entry, in the order the users reached the Entry
+            entry_column = []
+            for voter, round_when_last_moved, _ in get_snapshot_voters(ballot_groups):
+                voter_info_string = (
+                    f"{voter.name}: assigned ranking {voter.get_ranking_of_entry(entry)}"
+                    f" (Borda count {voter.get_borda_count_of_entry(entry)}),"
+                    f" moved in round {round_when_last_moved}"
+                )
+                entry_column.append(voter_info_string)
+
+            entry_columns.append(entry_column)
+
+        # rearrange the body of the spreadsheet into a list of rows (so each list passed in as
+        # an argument becomes a column in the final body)
+        body = itertools.zip_longest(
+            [voter.name for voter, _, _ in get_snapshot_voters(ballot_groups_with_no_valid_votes)],
+            [
+                f"{voter.name}: round {round_when_last_moved}"
+                for voter, round_when_last_moved, _
+                in get_snapshot_voters(ballot_groups_with_no_remaining_valid_votes)
+            ],
+            *entry_columns,
+            fillvalue=""
+        )
+        for row in body:
+            writer.writerow(row)
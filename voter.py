@@ -1,40 +1,73 @@
 import math
+from array import array
 
 class Voter():
     """
     A Voter is identified by their name.
     They can vote for (assign rankings to) contest entries.
+
+    Contests can have millions of Voters, so Voters are stored compactly: only their valid votes are
+    kept, as small arrays of Entry ids and rankings. A record of every vote they cast, valid or not,
+    is only kept if requested.
     """
 
 
-    def __init__(self, name, num_distinct_rankings):
+    __slots__ = (
+        "name",
+        "_entries",
+        "_valid_entry_ids",
+        "_valid_rankings",
+        "_invalid_rankings",
+        "_blocked_entry_rankings",
+        "_all_votes",
+        "_next_ballot_index",
+    )
+
+
+    def __init__(self, name, entries, keep_all_votes=False):
+        """
+        entries is the list of all the Contest's Entries (so entries[i] is the Entry with id i).
+        If keep_all_votes is True, then every vote the Voter casts, valid or not, is recorded in
+        self.all_votes.
+        """
+
         self.name = name
 
-        self.num_distinct_rankings = num_distinct_rankings
-
-        # self._all_votes_by_ranking[r] contains a list of all Entries that the
-        # Voter has assigned ranking r.
-        # Note that arrays are indexed from 0, but rankings are indexed from 1.
-        # So, we make the array one element bigger than it needs to be and pretend the array is
-        # indexed from 1, ignoring index 0.
-        # Also, note that some of these rankings might be invalid. (See the docstring of rank
-        # for more information.)
-        self._all_votes_by_ranking = [[] for _ in range(num_distinct_rankings + 1)]
-        # self._all_votes_by_entry[e] contains a list of all the rankings that the
-        # Voter has assigned to Entry e.
-        # Note that some of these rankings might be invalid. (See the docstring of rank
-        # for more information.)
-        self._all_votes_by_entry = {}
-
-        # self._all_votes_by_ranking[r] contains the single Entry that the Voter has assigned the
-        # valid ranking r, or None if no such Entry exists.
-        self._valid_votes_by_ranking = [None for _ in range(num_distinct_rankings + 1)]
-        # self._valid_votes_by_entry[e] contains the single valid ranking that the Voter has
-        # assigned to entry e.
-        self._valid_votes_by_entry = {}
-
-        # the round when the Voter was last allocated to a new Entry
-        self.round_when_last_moved = 0
+        # shared between all of the Contest's Voters, so it costs each Voter nothing
+        self._entries = entries
+
+        # self._valid_entry_ids[i] contains the id of the Entry that the Voter has assigned the valid
+        # ranking self._valid_rankings[i].
+        # Both arrays are sorted from best (smallest) to worst (largest) ranking.
+        self._valid_entry_ids = array("H")
+        self._valid_rankings = array("H")
+
+        # the rankings that the Voter has used but that aren't valid (either because the same
+        # ranking was assigned to multiple Entries, or because the Entry it was assigned to has a
+        # better ranking), or None if there are no such rankings
+        self._invalid_rankings = None
+
+        # self._blocked_entry_rankings[i] contains the ranking that the Entry with id i held before
+        # it was given a better ranking that turned out to be invalid, or this is None if there are
+        # no such Entries. Those Entries have no valid ranking, and only rankings better than the
+        # ones recorded here can give them one.
+        self._blocked_entry_rankings = None
+
+        # a list of (Entry, ranking) tuples representing every vote the Voter has cast (in the
+        # order they were cast), or None if those votes aren't being recorded
+        self._all_votes = [] if keep_all_votes else None
+
+        # the index in self._valid_entry_ids of the next Entry that __next__ should consider
+        self._next_ballot_index = 0
+
+
+    @property
+    def num_distinct_rankings(self):
+        """
+        The number of distinct rankings the Voter can assign (one per Entry in the Contest).
+        """
+
+        return len(self._entries)
 
 
     @property
@@ -43,7 +76,17 @@ class Voter():
         True if the Voter cast at least one valid vote and False otherwise.
         """
 
-        return bool(self._valid_votes_by_entry)
+        return bool(self._valid_entry_ids)
+
+
+    @property
+    def all_votes(self):
+        """
+        A list of (Entry, ranking) tuples representing every vote the Voter has cast, valid or not,
+        in the order they were cast; or None if the Voter wasn't asked to keep those votes.
+        """
+
+        return self._all_votes
 
 
     def rank(self, entry, ranking):
@@ -55,44 +98,87 @@ class Voter():
         those Entries' rankings are invalid.
         """
 
+        if not 1 <= ranking <= self.num_distinct_rankings:
+            raise ValueError(
+                f"Voter {self.name} assigned ranking {ranking} to {entry.name},"
+                f" but rankings must be between 1 and {self.num_distinct_rankings}."
+            )
+
+        if self._all_votes is not None:
+            self._all_votes.append((entry, ranking))
+
         # only apply this ranking if it hasn't been used before and is an improvement for the
         # current Entry
         should_apply_ranking = True
 
         # a ranking shouldn't be used twice, so if it has been used before,
         # it shouldn't be applied to the new Entry, and it should be removed from the other Entry
-        if self._all_votes_by_ranking[ranking]:
+        if ranking in self._valid_rankings:
+            should_apply_ranking = False
+            self._remove_valid_vote(self._valid_rankings.index(ranking))
+        elif self._invalid_rankings is not None and ranking in self._invalid_rankings:
             should_apply_ranking = False
-
-            other_entry = self._valid_votes_by_ranking[ranking]
-            if other_entry is not None:
-                del self._valid_votes_by_entry[other_entry]
-                self._valid_votes_by_ranking[ranking] = None
 
         # if the entry has been ranked already, use the better of the two rankings
-        if entry in self._valid_votes_by_entry:
-            other_ranking = self._valid_votes_by_entry[entry]
+        if entry.id in self._valid_entry_ids:
+            i = self._valid_entry_ids.index(entry.id)
+            other_ranking = self._valid_rankings[i]
             if ranking < other_ranking:
-                self._valid_votes_by_ranking[other_ranking] = None
+                # the Entry's smallest ranking is this one, so its old ranking is no longer valid
+                self._remove_valid_vote(i)
+                if not should_apply_ranking:
+                    # this ranking isn't valid either, so the Entry is left without a valid ranking
+                    if self._blocked_entry_rankings is None:
+                        self._blocked_entry_rankings = {}
+                    self._blocked_entry_rankings[entry.id] = other_ranking
             else:  # the ranking isn't an improvement for the Entry
                 should_apply_ranking = False
-
-        self._all_votes_by_ranking[ranking].append(entry)
-        if entry not in self._all_votes_by_entry:
-            self._all_votes_by_entry[entry] = []
-        self._all_votes_by_entry[entry].append(ranking)
+        elif self._blocked_entry_rankings is not None and entry.id in self._blocked_entry_rankings:
+            if ranking >= self._blocked_entry_rankings[entry.id]:
+                should_apply_ranking = False
+            elif should_apply_ranking:
+                del self._blocked_entry_rankings[entry.id]
 
         if should_apply_ranking:
-            self._valid_votes_by_entry[entry] = ranking
-            self._valid_votes_by_ranking[ranking] = entry
+            # insert the vote so that the arrays stay sorted by ranking
+            i = 0
+            while i < len(self._valid_rankings) and self._valid_rankings[i] < ranking:
+                i += 1
+            self._valid_entry_ids.insert(i, entry.id)
+            self._valid_rankings.insert(i, ranking)
+        else:
+            self._add_invalid_ranking(ranking)
+
+
+    def _remove_valid_vote(self, i):
+        """
+        Invalidate the i-th valid vote (in order from best to worst ranking).
+        """
+
+        self._add_invalid_ranking(self._valid_rankings[i])
+        del self._valid_entry_ids[i]
+        del self._valid_rankings[i]
+
+
+    def _add_invalid_ranking(self, ranking):
+        """
+        Record that the given ranking has been used but isn't valid.
+        """
+
+        if self._invalid_rankings is None:
+            self._invalid_rankings = set()
+        self._invalid_rankings.add(ranking)
 
 
     def get_entry_with_ranking(self, ranking):
         """
-        Return the Entry with the given rank, or None if no such Entry exists.
+        Return the Entry with the given valid rank, or None if no such Entry exists.
         """
 
-        return self._all_votes_by_ranking.get(ranking)
+        if ranking in self._valid_rankings:
+            return self._entries[self._valid_entry_ids[self._valid_rankings.index(ranking)]]
+
+        return None
 
 
     def get_ranking_of_entry(self, entry):
@@ -100,7 +186,19 @@ class Voter():
         Return the valid ranking of the given Entry, or math.inf if no such ranking exists.
         """
 
-        return self._valid_votes_by_entry.get(entry, math.inf)
+        if entry.id in self._valid_entry_ids:
+            return self._valid_rankings[self._valid_entry_ids.index(entry.id)]
+
+        return math.inf
+
+
+    def get_ballot(self):
+        """
+        Return a tuple of the Entries that the Voter gave valid rankings to, sorted from favorite to
+        least favorite.
+        """
+
+        return tuple(self._entries[entry_id] for entry_id in self._valid_entry_ids)
 
 
     def get_borda_count_of_entry(self, entry):
@@ -108,8 +206,9 @@ class Voter():
         Return the valid Borda count of the given Entry.
         """
 
-        if entry in self._valid_votes_by_entry:
-            return 1 + self.num_distinct_rankings - self._valid_votes_by_entry[entry]
+        ranking = self.get_ranking_of_entry(entry)
+        if ranking is not math.inf:
+            return 1 + self.num_distinct_rankings - ranking
 
         return 0
 
@@ -128,18 +227,17 @@ class Voter():
         # counts are the unranked entries
 
         # unranked entries are preferred to exactly 0 entries
-        unranked_entries = [e for e in entries if e not in self._valid_votes_by_entry]
+        unranked_entries = [e for e in entries if e.id not in self._valid_entry_ids]
         for unranked_entry in unranked_entries:
             entry_to_borda_count[unranked_entry] = 0
 
-
         # worse-ranked Entries (with higher-number rankings) outperform fewer Entries and so have
-        # lower Borda counts
-        ranked_entries_worst_to_best = sorted(
-            [e for e in entries if e in self._valid_votes_by_entry],
-            key=lambda e: self._valid_votes_by_entry[e],
-            reverse=True
-        )
+        # lower Borda counts; self._valid_entry_ids is already sorted from best to worst ranking
+        entry_ids = {e.id for e in entries}
+        ranked_entries_worst_to_best = [
+            self._entries[entry_id] for entry_id in reversed(self._valid_entry_ids)
+            if entry_id in entry_ids
+        ]
         num_entries_outperformed = len(unranked_entries)
         for ranked_entry in ranked_entries_worst_to_best:
             entry_to_borda_count[ranked_entry] = num_entries_outperformed
@@ -156,10 +254,7 @@ class Voter():
         If multiple entries share the same rank, then those entries are skipped.
         """
 
-        # only iterate over those ranks that were assigned to exactly 1 entry
-        self._valid_votes = iter(
-            entry for entry in self._valid_votes_by_ranking if entry is not None
-        )
+        self._next_ballot_index = 0
         return self
 
 
@@ -168,11 +263,13 @@ class Voter():
         Return the Voter's next favorite Entry that's still in the race, or None if none remain.
         """
 
-        next_favorite_entry = next(self._valid_votes, None)
-
         # skip over Entries that have left the race already until we're either out of entries,
         # or we encounter one that is still in the race
-        while not ((next_favorite_entry is None) or next_favorite_entry.still_in_race):
-            next_favorite_entry = next(self._valid_votes, None)
+        while self._next_ballot_index < len(self._valid_entry_ids):
+            next_favorite_entry = self._entries[self._valid_entry_ids[self._next_ballot_index]]
+            self._next_ballot_index += 1
+
+            if next_favorite_entry.still_in_race:
+                return next_favorite_entry
 
-        return next_favorite_entry
\ No newline at end of file
+        return None